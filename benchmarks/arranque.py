@@ -0,0 +1,102 @@
+"""
+Benchmark de arranque en frío de los puntos de entrada.
+
+Cada escenario se ejecuta en un intérprete nuevo (sin cachés de importación
+en memoria) varias veces y se informa la mediana del tiempo hasta estar listo,
+el tiempo total del proceso y los hilos vivos tras el arranque.
+
+    python benchmarks/arranque.py --repeticiones 5 --json arranque.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Código que se mide en cada escenario; debe dejar el sistema listo para usarse.
+# Puntos de control explícitos (desactivados): con UNIETAXI_CHECKPOINTS se
+# mediría la restauración y el proceso escribiría en esa carpeta
+ESCENARIOS = {
+    "sistema_central": (
+        "from core.sistema import SistemaCentral\n"
+        "from core.puntos_control import PuntosControl\n"
+        "sistema = SistemaCentral(puntos_control=PuntosControl())\n"
+    ),
+    "batch_cli": (
+        "import main_terminal\n"
+        "from core.puntos_control import PuntosControl\n"
+        "main_terminal.preparar_lote(puntos_control=PuntosControl())\n"
+    ),
+    "web_importacion": (
+        "import main\n"
+    ),
+    "web_primera_peticion": (
+        "import main\n"
+        "main.app.test_client().get('/reportes')\n"
+    ),
+}
+
+PLANTILLA = """
+import io, json, sys, threading, time
+t0 = time.perf_counter()
+_salida = sys.stdout
+sys.stdout = io.StringIO()  # los prints del simulador no cuentan
+{codigo}
+t1 = time.perf_counter()
+sys.stdout = _salida
+print(json.dumps({{"listo_s": t1 - t0, "hilos": threading.active_count()}}))
+"""
+
+
+def medir(codigo, repeticiones):
+    """Ejecuta `codigo` en procesos nuevos y devuelve la lista de mediciones."""
+    mediciones = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        salida = subprocess.run(
+            [sys.executable, "-c", PLANTILLA.format(codigo=codigo)],
+            cwd=RAIZ, capture_output=True, text=True, check=True,
+        )
+        total = time.perf_counter() - inicio
+        resultado = json.loads(salida.stdout.strip().splitlines()[-1])
+        resultado["proceso_s"] = total
+        mediciones.append(resultado)
+    return mediciones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de arranque en frío")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--escenarios", nargs="*", default=list(ESCENARIOS))
+    parser.add_argument("--json", help="Archivo donde guardar los resultados")
+    args = parser.parse_args(argv)
+
+    resultados = {}
+    print(f"{'escenario':<24}{'listo (ms)':>12}{'proceso (ms)':>14}{'hilos':>7}")
+    for nombre in args.escenarios:
+        try:
+            mediciones = medir(ESCENARIOS[nombre], args.repeticiones)
+        except subprocess.CalledProcessError as e:
+            print(f"{nombre:<24}  ERROR: {e.stderr.strip().splitlines()[-1]}")
+            continue
+        resumen = {
+            "listo_ms": statistics.median(m["listo_s"] for m in mediciones) * 1000,
+            "proceso_ms": statistics.median(m["proceso_s"] for m in mediciones) * 1000,
+            "hilos": max(m["hilos"] for m in mediciones),
+            "repeticiones": args.repeticiones,
+        }
+        resultados[nombre] = resumen
+        print(f"{nombre:<24}{resumen['listo_ms']:>12.1f}{resumen['proceso_ms']:>14.1f}{resumen['hilos']:>7}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "resultados": resultados}, f, indent=2)
+        print(f"Resultados guardados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
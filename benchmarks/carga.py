@@ -0,0 +1,321 @@
+"""
+Benchmark de carga del motor de despacho.
+
+Construye una ciudad sintética (taxis, clientes, llegadas de Poisson y una
+distribución de longitudes de viaje) y llama directamente a
+SistemaCentral.procesar_solicitud_cliente, sin Flask ni hilos Cliente.
+Informa latencia de match p50/p95/p99, throughput, tasa de aceptación,
+distancia de recogida y memoria pico, y puede guardar los resultados en
+JSON para compararlos entre commits.
+
+    python benchmarks/carga.py --taxis 1000 --clientes 5000 --tasa 200 \\
+        --solicitudes 5000 --viaje exponencial:3 --json carga.json
+    python benchmarks/carga.py --comparar base.json carga.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+from core.sistema import SistemaCentral  # noqa: E402
+from core.taxi import Taxi, SolicitudServicio  # noqa: E402
+from core.trazas import Trazador  # noqa: E402
+from core.tarifa_zonal import TarifaZonal  # noqa: E402
+from core.viajes_compartidos import PlanificadorCompartido  # noqa: E402
+from core.rebalanceo import Rebalanceador  # noqa: E402
+from core.puntos_control import PuntosControl  # noqa: E402
+from core.libro_servicios import LibroServicios  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Métricas que se comparan entre ejecuciones: (clave, mayor es mejor)
+METRICAS_COMPARABLES = (
+    ("latencia_p50_ms", False),
+    ("latencia_p95_ms", False),
+    ("latencia_p99_ms", False),
+    ("throughput_rps", True),
+    ("tasa_aceptacion", True),
+    ("distancia_recogida_media_km", False),
+    ("viajes_por_taxi_hora", True),
+    ("memoria_pico_mb", False),
+)
+
+
+def parsear_distribucion(texto):
+    """
+    Distribución de longitud de viaje en km a partir de 'nombre:parametros':
+    exponencial:media, uniforme:min:max, lognormal:mu:sigma o fija:km.
+    """
+    nombre, *params = texto.split(":")
+    params = [float(p) for p in params]
+    if nombre == "exponencial":
+        media, = params
+        return lambda rng: rng.expovariate(1.0 / media)
+    if nombre == "uniforme":
+        minimo, maximo = params
+        return lambda rng: rng.uniform(minimo, maximo)
+    if nombre == "lognormal":
+        mu, sigma = params
+        return lambda rng: rng.lognormvariate(mu, sigma)
+    if nombre == "fija":
+        km, = params
+        return lambda rng: km
+    raise ValueError(f"Distribución de viaje desconocida: {texto}")
+
+
+def generar_ciudad(sistema, num_taxis, lado_km, rng):
+    """Reparte `num_taxis` taxis uniformemente por una ciudad cuadrada."""
+    for i in range(num_taxis):
+        taxi = Taxi(i + 1, f"Taxi{i + 1}", f"BEN{i + 1:05d}", rng.randint(30, 60), sistema,
+                    posicion_inicial=(rng.uniform(0, lado_km), rng.uniform(0, lado_km)))
+        taxi.calificacion_media = rng.uniform(3.0, 5.0)
+        sistema.taxis.append(taxi)
+
+
+def generar_solicitudes(num_solicitudes, num_clientes, lado_km, distribucion, rng, foco=0.0):
+    """
+    Solicitudes con origen uniforme y destino a la distancia sorteada. Con
+    `foco`, esa fracción de los orígenes sale de un punto caliente alrededor
+    de (lado/4, lado/4), así la demanda no coincide con los destinos.
+    """
+    solicitudes = []
+    for _ in range(num_solicitudes):
+        if rng.random() < foco:
+            origen = tuple(min(max(rng.gauss(lado_km / 4, lado_km / 12), 0.0), lado_km) for _ in range(2))
+        else:
+            origen = (rng.uniform(0, lado_km), rng.uniform(0, lado_km))
+        km = distribucion(rng)
+        angulo = rng.uniform(0, 2 * np.pi)
+        destino = (min(max(origen[0] + km * np.cos(angulo), 0.0), lado_km),
+                   min(max(origen[1] + km * np.sin(angulo), 0.0), lado_km))
+        id_cliente = str(10000 + rng.randrange(num_clientes))
+        solicitudes.append(SolicitudServicio(id_cliente, origen, destino))
+    return solicitudes
+
+
+def memoria_pico_mb():
+    """Memoria residente pico del proceso (None si no se puede medir)."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KiB y macOS en bytes
+    return round(pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024, 1)
+
+
+def commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ejecutar(args):
+    rng = random.Random(args.semilla)
+    random.seed(args.semilla)  # calificaciones que ponen los taxis
+    Taxi.ESCALA_TIEMPO = args.escala_tiempo
+
+    tarifa_zonal = (TarifaZonal(ancho_km=args.lado_km, alto_km=args.lado_km)
+                    if args.tarifa_zonal else None)
+    compartido = (PlanificadorCompartido(args.compartido, args.desvio)
+                  if args.compartido > 1 else None)
+    # Histórico y puntos de control en memoria: el benchmark no debe restaurar
+    # ni escribir el estado de UNIETAXI_CHECKPOINTS / UNIETAXI_HISTORICO
+    sistema = SistemaCentral(instrumentar_locks=args.perfil_locks,
+                             puntos_control=PuntosControl(),
+                             libro_servicios=LibroServicios(),
+                             trazador=Trazador(args.trazas, args.muestreo),
+                             tarifa_zonal=tarifa_zonal,
+                             viajes_compartidos=compartido,
+                             rebalanceo=Rebalanceador(args.rebalanceo or None, ventana=10 * args.rebalanceo,
+                                                      ancho_km=args.lado_km, alto_km=args.lado_km))
+    generar_ciudad(sistema, args.taxis, args.lado_km, rng)
+    solicitudes = generar_solicitudes(args.solicitudes, args.clientes, args.lado_km,
+                                      parsear_distribucion(args.viaje), rng, args.foco)
+
+    # Llegadas de Poisson: instante de llegada de cada solicitud (tasa 0 = sin pausas)
+    if args.tasa > 0:
+        llegadas = np.cumsum([rng.expovariate(args.tasa) for _ in solicitudes])
+    else:
+        llegadas = np.zeros(len(solicitudes))
+
+    # Distancia de recogida y multiplicador: se leen del evento 'asignado'
+    recogidas = {}
+    multiplicadores = []
+    notificar_original = sistema.notificar_evento
+
+    def notificar_evento(solicitud, tipo, datos=None):
+        if tipo == "asignado":
+            recogidas[id(solicitud)] = datos["distancia"]
+            multiplicadores.append(datos["multiplicador"])
+        notificar_original(solicitud, tipo, datos)
+
+    sistema.notificar_evento = notificar_evento
+
+    latencias = np.zeros(len(solicitudes))
+    retrasos = np.zeros(len(solicitudes))
+
+    def emisor(indices, inicio):
+        for i in indices:
+            espera = inicio + llegadas[i] - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+            retrasos[i] = max(0.0, -espera)
+            t0 = time.perf_counter()
+            sistema.procesar_solicitud_cliente(solicitudes[i])
+            latencias[i] = time.perf_counter() - t0
+
+    # Los prints del simulador no deben medir la velocidad de la terminal
+    with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+        sistema.iniciar()
+        inicio = time.perf_counter()
+        hilos = [threading.Thread(target=emisor, args=(range(h, len(solicitudes), args.hilos), inicio))
+                 for h in range(args.hilos)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        duracion = time.perf_counter() - inicio
+
+        # Esperar a que terminen los viajes en curso (contabilidad completa)
+        limite = time.monotonic() + args.espera_max
+        while sistema.servicios_activos > 0 and time.monotonic() < limite:
+            time.sleep(0.05)
+        duracion_total = time.perf_counter() - inicio
+    sistema.trazador.finalizar()
+
+    aceptadas = len(recogidas)
+    # Sin aceptaciones no hay distancia de recogida (None, no 0 km: parecería una mejora)
+    distancias = np.array(list(recogidas.values()))
+    p50, p95, p99 = np.percentile(latencias, [50, 95, 99]) * 1000
+    completados = sum(1 for s in sistema.servicios_control if s["aceptado"])
+    # Horas simuladas desde la primera llegada hasta el último viaje terminado
+    horas_simuladas = duracion_total / args.escala_tiempo / 3600
+    return {
+        "commit": commit_actual(),
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "parametros": {
+            "taxis": args.taxis, "clientes": args.clientes, "solicitudes": args.solicitudes,
+            "tasa": args.tasa, "viaje": args.viaje, "lado_km": args.lado_km,
+            "hilos": args.hilos, "escala_tiempo": args.escala_tiempo, "semilla": args.semilla,
+            "foco": args.foco,
+        },
+        "metricas": {
+            "latencia_p50_ms": round(float(p50), 3),
+            "latencia_p95_ms": round(float(p95), 3),
+            "latencia_p99_ms": round(float(p99), 3),
+            "latencia_max_ms": round(float(latencias.max()) * 1000, 3),
+            "throughput_rps": round(len(solicitudes) / duracion, 1),
+            "duracion_s": round(duracion, 3),
+            "retraso_llegada_p99_ms": round(float(np.percentile(retrasos, 99)) * 1000, 3),
+            "tasa_aceptacion": round(aceptadas / len(solicitudes), 4),
+            "distancia_recogida_media_km": round(float(distancias.mean()), 3) if aceptadas else None,
+            "distancia_recogida_p95_km": round(float(np.percentile(distancias, 95)), 3) if aceptadas else None,
+            "multiplicador_medio": round(float(np.mean(multiplicadores)), 3) if multiplicadores else 1.0,
+            "ingresos": round(sum(s["costo"] for s in sistema.servicios_control), 2),
+            "viajes_completados": completados,
+            "viajes_por_taxi_hora": (round(completados / (args.taxis * horas_simuladas), 3)
+                                     if args.taxis and horas_simuladas > 0 else None),
+            "viajes_pendientes": sistema.servicios_activos,
+            "reposicionamientos": sistema.rebalanceo.movimientos_totales,
+            "memoria_pico_mb": memoria_pico_mb(),
+        },
+        "locks": sistema.resumen_locks(),
+    }
+
+
+def imprimir(resultado):
+    p = resultado["parametros"]
+    print(f"Ciudad {p['lado_km']}x{p['lado_km']} km, {p['taxis']} taxis, {p['clientes']} clientes, "
+          f"{p['solicitudes']} solicitudes a {p['tasa'] or 'máx.'} /s, viaje {p['viaje']}")
+    for clave, valor in resultado["metricas"].items():
+        print(f"  {clave:<30}{valor}")
+
+
+def comparar(ruta_base, ruta_nueva):
+    """Imprime la variación de cada métrica entre dos ejecuciones guardadas."""
+    with open(ruta_base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(ruta_nueva, encoding="utf-8") as f:
+        nueva = json.load(f)
+    if base["parametros"] != nueva["parametros"]:
+        print("Aviso: las ejecuciones no usan los mismos parámetros")
+    print(f"{'métrica':<30}{base['commit'] or 'base':>12}{nueva['commit'] or 'nueva':>12}{'cambio':>10}")
+    for clave, mayor_mejor in METRICAS_COMPARABLES:
+        a, b = base["metricas"].get(clave), nueva["metricas"].get(clave)
+        if a is None or b is None:
+            continue
+        cambio = (b - a) / a * 100 if a else 0.0
+        peor = cambio < 0 if mayor_mejor else cambio > 0
+        marca = " !" if peor and abs(cambio) >= 5 else ""
+        print(f"{clave:<30}{a:>12}{b:>12}{cambio:>+9.1f}%{marca}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de carga del motor de despacho")
+    parser.add_argument("--taxis", type=int, default=500)
+    parser.add_argument("--clientes", type=int, default=2000)
+    parser.add_argument("--solicitudes", type=int, default=2000)
+    parser.add_argument("--tasa", type=float, default=200.0,
+                        help="Llegadas por segundo (0 = tan rápido como se pueda)")
+    parser.add_argument("--viaje", default="exponencial:3",
+                        help="Longitud de viaje: exponencial:media, uniforme:min:max, "
+                             "lognormal:mu:sigma o fija:km")
+    parser.add_argument("--lado-km", type=float, default=10.0)
+    parser.add_argument("--hilos", type=int, default=1, help="Hilos que emiten solicitudes")
+    parser.add_argument("--escala-tiempo", type=float, default=0.005,
+                        help="Segundos reales por segundo simulado de viaje")
+    parser.add_argument("--espera-max", type=float, default=60.0,
+                        help="Segundos máximos esperando a que terminen los viajes")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--perfil-locks", action="store_true",
+                        help="Medir espera y retención de los mutex del sistema "
+                             "(resumen al salir y en el JSON)")
+    parser.add_argument("--tarifa-zonal", action="store_true",
+                        help="Activar la tarifa dinámica por zona")
+    parser.add_argument("--compartido", type=int, default=0, metavar="PLAZAS",
+                        help="Viajes compartidos con hasta PLAZAS pasajeros por taxi (0 = desactivado)")
+    parser.add_argument("--desvio", type=float, default=0.5,
+                        help="Desvío máximo relativo por pasajero en viajes compartidos")
+    parser.add_argument("--rebalanceo", type=float, default=0.0, metavar="SEGUNDOS",
+                        help="Reposicionar taxis libres hacia la demanda cada SEGUNDOS (0 = desactivado)")
+    parser.add_argument("--foco", type=float, default=0.0,
+                        help="Fracción de orígenes concentrados en un punto caliente")
+    parser.add_argument("--trazas", help="Archivo JSONL para las trazas por solicitud "
+                                         "(analizar con python -m core.trazas)")
+    parser.add_argument("--muestreo", type=float, default=1.0,
+                        help="Fracción de solicitudes trazadas")
+    parser.add_argument("--json", help="Archivo donde guardar los resultados")
+    parser.add_argument("--comparar", nargs=2, metavar=("BASE", "NUEVA"),
+                        help="Comparar dos resultados guardados y salir")
+    args = parser.parse_args(argv)
+
+    if args.comparar:
+        comparar(*args.comparar)
+        return
+
+    resultado = ejecutar(args)
+    imprimir(resultado)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2)
+        print(f"Resultados guardados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+Barrido Monte Carlo de parámetros de tarifa y de asignación.
+
+Cada escenario es una combinación de valores de atributos de
+SistemaAsignacion (tarifas, hora de tarifa alta, pesos del score). Para
+cada escenario se simulan varios días independientes con semillas
+distintas, repartidos en un pool de procesos. La simulación es de eventos
+discretos en tiempo virtual: usa el SistemaAsignacion real para elegir
+conductor y cobrar, pero no crea hilos ni duerme, así que un día completo
+tarda décimas de segundo.
+
+    python benchmarks/escenarios.py --semillas 20 \\
+        --param tarifa_km_alta=1.5,2.0,2.5 \\
+        --param penalizacion_carga=0,1,2,4 \\
+        --param escala_senafiris=25,50,100 --csv barrido.csv
+"""
+import argparse
+import contextlib
+import csv
+import heapq
+import itertools
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+from core.sistema_asignacion import SistemaAsignacion  # noqa: E402
+from core.cliente_mejorado import ClienteMejorado  # noqa: E402
+
+# Parámetros de SistemaAsignacion que se pueden barrer
+PARAMETROS = (
+    "tarifa_base_normal", "tarifa_km_normal", "tarifa_base_alta", "tarifa_km_alta",
+    "hora_activacion_tarifa_alta", "penalizacion_carga", "escala_senafiris", "bonus_balance",
+)
+
+# Valores admitidos por parámetro: (mínimo, incluido); escala_senafiris es
+# divisor del score, así que tiene que ser estrictamente positiva
+MINIMOS = {
+    "tarifa_base_normal": (0.0, True), "tarifa_km_normal": (0.0, True),
+    "tarifa_base_alta": (0.0, True), "tarifa_km_alta": (0.0, True),
+    "hora_activacion_tarifa_alta": (0.0, True), "penalizacion_carga": (0.0, True),
+    "escala_senafiris": (0.0, False), "bonus_balance": (0.0, True),
+}
+
+# Peso relativo de la demanda por hora del día (se normaliza al total diario)
+PERFIL_DEMANDA = (
+    0.6, 0.4, 0.3, 0.2, 0.2, 0.3,     # 00-05
+    0.6, 1.2, 1.6, 1.2, 0.9, 0.9,     # 06-11
+    1.0, 1.1, 1.0, 0.9, 1.0, 1.3,     # 12-17
+    1.6, 1.5, 1.2, 1.1, 1.0, 0.8,     # 18-23
+)
+
+
+class ConductorSimulado:
+    """Lo que SistemaAsignacion lee de un Taxi, sin hilo."""
+    __slots__ = ("id_taxi", "nombre", "posicion", "disponible", "calificacion_media",
+                 "numero_viajes", "viajes_hoy", "tiempo_desde_ultimo_viaje",
+                 "ultima_actualizacion_tiempo", "velocidad_kph")
+
+    def __init__(self, id_taxi, posicion, velocidad_kph, calificacion):
+        self.id_taxi = id_taxi
+        self.nombre = f"Taxi{id_taxi}"
+        self.posicion = posicion
+        self.disponible = True
+        self.calificacion_media = calificacion
+        self.numero_viajes = 0
+        self.viajes_hoy = 0
+        self.tiempo_desde_ultimo_viaje = 3600
+        self.ultima_actualizacion_tiempo = 0.0
+        self.velocidad_kph = velocidad_kph
+
+
+def simular_dia(parametros, semilla, config):
+    """
+    Simula un día (24 h virtuales) con unos parámetros y una semilla.
+
+    Returns:
+        dict con ingresos, viajes, aceptación, desviación y rango de
+        viajes_hoy entre conductores y distancia media de recogida.
+    """
+    rng = random.Random(semilla)
+    lado = config["lado_km"]
+    ahora = 0.0  # segundos virtuales desde las 00:00
+
+    asignacion = SistemaAsignacion(iniciar_monitor=False)
+    for nombre, valor in parametros.items():
+        setattr(asignacion, nombre, valor)
+    asignacion.reloj = lambda: ahora
+
+    conductores = [
+        ConductorSimulado(i + 1, (rng.uniform(0, lado), rng.uniform(0, lado)),
+                          rng.randint(30, 60), rng.uniform(3.5, 5.0))
+        for i in range(config["taxis"])
+    ]
+    clientes = [ClienteMejorado(str(i), f"Cliente-{i}") for i in range(config["clientes"])]
+
+    # Llegadas de Poisson con tasa variable por hora
+    total_perfil = sum(PERFIL_DEMANDA)
+    llegadas = []
+    for hora, peso in enumerate(PERFIL_DEMANDA):
+        tasa = config["solicitudes_dia"] * peso / total_perfil / 3600
+        t = hora * 3600 + rng.expovariate(tasa)
+        while t < (hora + 1) * 3600:
+            llegadas.append(t)
+            t += rng.expovariate(tasa)
+
+    ocupados = []  # heap (instante de fin, id_taxi, conductor, destino)
+    ingresos = 0.0
+    aceptadas = 0
+    recogidas = []
+    for ahora in llegadas:
+        # Liberar los taxis que han terminado antes de esta llegada
+        while ocupados and ocupados[0][0] <= ahora:
+            fin, _, conductor, destino = heapq.heappop(ocupados)
+            conductor.posicion = destino
+            conductor.disponible = True
+            conductor.viajes_hoy += 1
+            conductor.tiempo_desde_ultimo_viaje = 0
+            conductor.ultima_actualizacion_tiempo = fin
+            conductor.numero_viajes += 1
+            nota = rng.randint(3, 5)
+            conductor.calificacion_media += (nota - conductor.calificacion_media) / conductor.numero_viajes
+
+        cliente = rng.choice(clientes)
+        cliente.posicion = (rng.uniform(0, lado), rng.uniform(0, lado))
+        km_viaje = min(rng.expovariate(1.0 / config["km_medio"]), lado)
+        angulo = rng.uniform(0, 2 * math.pi)
+        destino = (min(max(cliente.posicion[0] + km_viaje * math.cos(angulo), 0.0), lado),
+                   min(max(cliente.posicion[1] + km_viaje * math.sin(angulo), 0.0), lado))
+
+        asignacion.modo_tarifa_alta = ahora / 3600 >= asignacion.hora_activacion_tarifa_alta
+        resultado = asignacion.seleccionar_conductor_para_cliente(cliente, conductores)
+        if resultado is None:
+            continue
+
+        conductor = resultado["conductor"]
+        km = asignacion.calcular_distancia(cliente.posicion, destino)
+        tarifa = round(resultado["tarifa_base"] + resultado["tarifa_km"] * km, 2)
+        km_total = resultado["distancia"] + km
+        fin = ahora + km_total / conductor.velocidad_kph * 3600
+        conductor.disponible = False
+        heapq.heappush(ocupados, (fin, conductor.id_taxi, conductor, destino))
+
+        cliente.incrementar_frecuencia()
+        asignacion.registrar_viaje_completado(conductor, cliente, km, tarifa)
+        ingresos += tarifa
+        aceptadas += 1
+        recogidas.append(resultado["distancia"])
+
+    # Los viajes que siguen en curso a medianoche también cuentan
+    for _, _, conductor, _ in ocupados:
+        conductor.viajes_hoy += 1
+    viajes = [c.viajes_hoy for c in conductores]
+    return {
+        "ingresos": ingresos,
+        "viajes": aceptadas,
+        "aceptacion": aceptadas / len(llegadas) if llegadas else 0.0,
+        "desviacion_viajes": statistics.pstdev(viajes) if viajes else None,
+        "rango_viajes": max(viajes) - min(viajes) if viajes else None,
+        # Sin aceptaciones no hay recogida (None, no 0 km: parecería la mejor)
+        "recogida_km": statistics.fmean(recogidas) if recogidas else None,
+    }
+
+
+def _trabajo(tarea):
+    """Ejecuta en un proceso del pool una tanda de (escenario, semilla)."""
+    resultados = []
+    # SistemaAsignacion imprime los scores de cada selección
+    with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+        for indice, parametros, semilla, config in tarea:
+            resultados.append((indice, simular_dia(parametros, semilla, config)))
+    return resultados
+
+
+def _valor_parametro(nombre, texto):
+    """Valor de un eje de la rejilla; SystemExit si no es un número válido para `nombre`."""
+    try:
+        valor = float(texto)
+    except ValueError:
+        raise SystemExit(f"Valor no numérico para {nombre}: {texto!r}") from None
+    minimo, incluido = MINIMOS[nombre]
+    if not math.isfinite(valor) or valor < minimo or (valor == minimo and not incluido):
+        raise SystemExit(f"Valor fuera de rango para {nombre}: {texto} "
+                         f"(debe ser {'>=' if incluido else '>'} {minimo:g})")
+    return valor
+
+
+def construir_rejilla(especificaciones):
+    """Producto cartesiano de ['nombre=v1,v2', ...] como lista de dicts."""
+    ejes = []
+    for espec in especificaciones:
+        nombre, _, valores = espec.partition("=")
+        if nombre not in PARAMETROS:
+            raise SystemExit(f"Parámetro desconocido: {nombre} (válidos: {', '.join(PARAMETROS)})")
+        ejes.append([(nombre, _valor_parametro(nombre, v)) for v in valores.split(",")])
+    return [dict(combinacion) for combinacion in itertools.product(*ejes)] or [{}]
+
+
+def agregar(escenarios, resultados):
+    """
+    Media y desviación entre semillas de cada métrica por escenario. Las
+    corridas sin valor (None) no entran; si no queda ninguna, la métrica
+    vale None.
+    """
+    filas = []
+    for indice, parametros in enumerate(escenarios):
+        corridas = resultados[indice]
+        fila = dict(parametros)
+        for metrica in corridas[0]:
+            valores = [c[metrica] for c in corridas if c[metrica] is not None]
+            fila[metrica] = statistics.fmean(valores) if valores else None
+            fila[metrica + "_sd"] = statistics.pstdev(valores) if valores else None
+        filas.append(fila)
+    return filas
+
+
+def imprimir_tabla(filas, nombres, ordenar_por, limite):
+    # Las filas sin valor van al final
+    filas = sorted(filas, key=lambda f: (f[ordenar_por] is not None, f[ordenar_por] or 0), reverse=True)
+    columnas = list(nombres) + ["ingresos", "viajes", "aceptacion", "desviacion_viajes", "recogida_km"]
+    print("  ".join(f"{c[:18]:>18}" for c in columnas))
+    for fila in filas[:limite]:
+        celdas = []
+        for c in columnas:
+            if fila[c] is None:
+                celdas.append(f"{'—':>18}")
+                continue
+            texto = f"{fila[c]:.3f}" if isinstance(fila[c], float) else str(fila[c])
+            if c + "_sd" in fila and c not in nombres:
+                texto += f"±{fila[c + '_sd']:.2f}"
+            celdas.append(f"{texto:>18}")
+        print("  ".join(celdas))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Barrido Monte Carlo de parámetros de tarifa y asignación")
+    parser.add_argument("--param", action="append", default=[],
+                        help=f"nombre=v1,v2,... (repetible). Nombres: {', '.join(PARAMETROS)}")
+    parser.add_argument("--semillas", type=int, default=10, help="Simulaciones por escenario")
+    parser.add_argument("--taxis", type=int, default=40)
+    parser.add_argument("--clientes", type=int, default=500)
+    parser.add_argument("--solicitudes-dia", type=int, default=1500)
+    parser.add_argument("--km-medio", type=float, default=3.0)
+    parser.add_argument("--lado-km", type=float, default=10.0)
+    parser.add_argument("--procesos", type=int, default=os.cpu_count())
+    parser.add_argument("--ordenar-por", default="ingresos")
+    parser.add_argument("--top", type=int, default=30, help="Filas de la tabla a mostrar")
+    parser.add_argument("--csv", help="Guardar la tabla completa en CSV")
+    parser.add_argument("--json", help="Guardar la tabla completa en JSON")
+    args = parser.parse_args(argv)
+
+    config = {"taxis": args.taxis, "clientes": args.clientes, "solicitudes_dia": args.solicitudes_dia,
+              "km_medio": args.km_medio, "lado_km": args.lado_km}
+    escenarios = construir_rejilla(args.param)
+    nombres = [espec.partition("=")[0] for espec in args.param]
+
+    # La misma semilla en todos los escenarios (números aleatorios comunes):
+    # las diferencias entre escenarios se deben a los parámetros, no al azar
+    tareas = [(i, p, semilla, config) for i, p in enumerate(escenarios) for semilla in range(args.semillas)]
+    tanda = max(1, len(tareas) // (args.procesos * 4))
+    tandas = [tareas[i:i + tanda] for i in range(0, len(tareas), tanda)]
+
+    print(f"{len(escenarios)} escenarios x {args.semillas} semillas = {len(tareas)} simulaciones "
+          f"en {args.procesos} procesos")
+    inicio = time.perf_counter()
+    resultados = {i: [] for i in range(len(escenarios))}
+    with ProcessPoolExecutor(max_workers=args.procesos) as pool:
+        for lote in pool.map(_trabajo, tandas):
+            for indice, resultado in lote:
+                resultados[indice].append(resultado)
+    print(f"Completado en {time.perf_counter() - inicio:.1f} s\n")
+
+    filas = agregar(escenarios, resultados)
+    imprimir_tabla(filas, nombres, args.ordenar_por, args.top)
+
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            escritor = csv.DictWriter(f, fieldnames=list(filas[0]))
+            escritor.writeheader()
+            escritor.writerows(filas)
+        print(f"Tabla guardada en {args.csv}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "semillas": args.semillas, "escenarios": filas}, f, indent=2)
+        print(f"Tabla guardada en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Micro-benchmarks de las funciones calientes de SistemaAsignacion con
+umbrales de regresión.
+
+Cada función se mide con flotas de varios tamaños. Para las funciones de
+coste constante la operación medida es una pasada por toda la flota (una
+llamada por taxi), para seleccionar_conductor_para_cliente una selección.
+Se toma el mínimo de varias repeticiones (el menos afectado por ruido).
+
+    python benchmarks/micro.py --guardar-base            # fija la línea base
+    python benchmarks/micro.py --umbral 0.15             # falla si algo empeora >15 %
+
+La línea base depende de la máquina: se guarda en benchmarks/micro_base.json
+(ignorado por git) y solo tiene sentido compararla en el mismo equipo.
+No necesita Flask ni red: solo el núcleo del simulador y NumPy.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+from core.sistema_asignacion import SistemaAsignacion  # noqa: E402
+from core.cliente_mejorado import ClienteMejorado  # noqa: E402
+from core.taxi import Taxi  # noqa: E402
+
+BASE_DEFECTO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "micro_base.json")
+TAMANOS_DEFECTO = (10, 100, 1000, 10000, 100000)
+
+
+def crear_flota(n, rng):
+    flota = []
+    for i in range(n):
+        taxi = Taxi(i + 1, f"Taxi{i + 1}", f"MIC{i + 1:06d}", 50, None,
+                    posicion_inicial=(rng.uniform(0, 10), rng.uniform(0, 10)))
+        taxi.calificacion_media = rng.uniform(3.0, 5.0)
+        taxi.viajes_hoy = rng.randint(0, 8)
+        flota.append(taxi)
+    return flota
+
+
+def casos(n, rng):
+    """Operaciones a medir para una flota de tamaño n: {nombre: callable}."""
+    asignacion = SistemaAsignacion(iniciar_monitor=False)
+    flota = crear_flota(n, rng)
+    cliente = ClienteMejorado("1", "Cliente-1", frecuencia=5)
+    cliente.posicion = (5.0, 5.0)
+    posiciones = [t.posicion for t in flota]
+    kms = [rng.uniform(0.5, 15) for _ in range(n)]
+
+    def seleccionar():
+        asignacion.seleccionar_conductor_para_cliente(cliente, flota)
+
+    def senafiris():
+        for taxi in flota:
+            asignacion.calcular_puntuacion_senafiris(taxi)
+
+    def distancia():
+        for p in posiciones:
+            asignacion.calcular_distancia(cliente.posicion, p)
+
+    def tarifa():
+        for km in kms:
+            asignacion.calcular_tarifa(km)
+
+    def registrar():
+        for taxi, km in zip(flota, kms):
+            asignacion.registrar_viaje_completado(taxi, cliente, km, 1.0)
+
+    return {
+        "seleccionar_conductor_para_cliente": seleccionar,
+        "calcular_puntuacion_senafiris": senafiris,
+        "calcular_distancia": distancia,
+        "calcular_tarifa": tarifa,
+        "registrar_viaje_completado": registrar,
+    }
+
+
+def medir(funcion, repeticiones, objetivo_s):
+    """Segundos por ejecución: mínimo de `repeticiones` tandas de ~objetivo_s."""
+    vueltas = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(vueltas):
+            funcion()
+        transcurrido = time.perf_counter() - t0
+        if transcurrido >= objetivo_s / 2 or vueltas >= 1 << 20:
+            break
+        vueltas *= 2
+    mejor = transcurrido / vueltas
+    for _ in range(repeticiones - 1):
+        t0 = time.perf_counter()
+        for _ in range(vueltas):
+            funcion()
+        mejor = min(mejor, (time.perf_counter() - t0) / vueltas)
+    return mejor
+
+
+def formatear(segundos):
+    for unidad, factor in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if segundos >= factor:
+            return f"{segundos / factor:.2f} {unidad}"
+    return f"{segundos / 1e-9:.0f} ns"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks de SistemaAsignacion")
+    parser.add_argument("--tamanos", type=int, nargs="*", default=list(TAMANOS_DEFECTO))
+    parser.add_argument("--funciones", nargs="*", help="Subconjunto de funciones a medir")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--objetivo", type=float, default=0.2,
+                        help="Segundos aproximados por repetición")
+    parser.add_argument("--base", default=BASE_DEFECTO, help="Archivo de línea base")
+    parser.add_argument("--guardar-base", action="store_true",
+                        help="Guardar los resultados como nueva línea base")
+    parser.add_argument("--umbral", type=float, default=0.20,
+                        help="Empeoramiento relativo tolerado antes de fallar (0.20 = 20 %%)")
+    args = parser.parse_args(argv)
+
+    base = {}
+    if os.path.exists(args.base) and not args.guardar_base:
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)["resultados"]
+
+    resultados = {}
+    regresiones = []
+    print(f"{'función':<38}{'flota':>8}{'tiempo':>14}{'base':>14}{'cambio':>10}")
+    for n in args.tamanos:
+        # SistemaAsignacion imprime los scores de cada selección
+        with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+            operaciones = casos(n, random.Random(n))
+        for nombre, funcion in operaciones.items():
+            if args.funciones and nombre not in args.funciones:
+                continue
+            with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+                segundos = medir(funcion, args.repeticiones, args.objetivo)
+            clave = f"{nombre}@{n}"
+            resultados[clave] = segundos
+
+            linea = f"{nombre:<38}{n:>8}{formatear(segundos):>14}"
+            if clave in base:
+                cambio = segundos / base[clave] - 1
+                marca = " REGRESIÓN" if cambio > args.umbral else ""
+                linea += f"{formatear(base[clave]):>14}{cambio:>+9.1%}{marca}"
+                if marca:
+                    regresiones.append((clave, cambio))
+            print(linea, flush=True)
+
+    if args.guardar_base:
+        with open(args.base, "w", encoding="utf-8") as f:
+            json.dump({"maquina": platform.node(), "python": sys.version.split()[0],
+                       "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"), "resultados": resultados},
+                      f, indent=2)
+        print(f"Línea base guardada en {args.base}")
+        return 0
+
+    if regresiones:
+        print(f"\n{len(regresiones)} regresiones por encima del {args.umbral:.0%}:")
+        for clave, cambio in regresiones:
+            print(f"  {clave}: {cambio:+.1%}")
+        return 1
+    if base:
+        print(f"\nSin regresiones por encima del {args.umbral:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,405 @@
+"""
+Consultas analíticas vectorizadas sobre el histórico de servicios.
+
+`TablaServicios` guarda el control de servicios en columnas NumPy (una por
+campo) y resuelve agregaciones con filtro y agrupación sin bucles en Python:
+los filtros son máscaras booleanas, la agrupación combina los códigos de las
+claves en un único entero y las sumas/conteos salen de np.bincount. Los
+cuantiles agrupan las filas con una ordenación y seleccionan con np.partition.
+
+Las columnas de texto (taxi, cliente, zonas) se guardan como códigos enteros
+más su lista de etiquetas.
+
+Uso desde la terminal:
+    python -m core.analitica --control control_servicios_examen.txt --por dia --medida costo
+    python -m core.analitica --sintetico 10000000 --por hora --agregacion media --filtro dia=1:7
+"""
+import re
+import time
+
+import numpy as np
+
+# Columnas de texto (códigos + etiquetas), enteras y numéricas
+CATEGORICAS = ("id_taxi", "id_cliente", "zona_origen", "zona_destino")
+ENTERAS = ("dia", "hora")
+MEDIDAS = ("km", "costo", "calificacion", "aceptado", "tarifa_alta")
+# Medidas calculadas a partir de otras columnas
+DERIVADAS = {
+    "rechazado": lambda columnas: ~columnas["aceptado"],
+}
+AGREGACIONES = ("suma", "media", "conteo", "cuantil")
+
+_NUMERO = r"-?\d+(?:\.\d+)?"
+_PATRONES_CONTROL = {
+    "dia": re.compile(r"Día: (\d+) \| Estado: (\w+)"),
+    "taxi": re.compile(r"Taxi: (.*) \| Cliente: (.*)"),
+    "ruta": re.compile(rf"Origen: \(({_NUMERO}), ({_NUMERO})\) -> Destino: \(({_NUMERO}), ({_NUMERO})\)"),
+    "coste": re.compile(rf"Distancia: ({_NUMERO}) km \| Costo: ({_NUMERO})"),
+    "calificacion": re.compile(r"Calificación: (.*)"),
+}
+
+
+def _factorizar(valores):
+    """(códigos int32, etiquetas) de una secuencia de valores hashables."""
+    indice = {}
+    codigos = np.fromiter((indice.setdefault(v, len(indice)) for v in valores),
+                          dtype=np.int32, count=len(valores))
+    etiquetas = np.array(["" if v is None else str(v) for v in indice], dtype=object)
+    return codigos, etiquetas
+
+
+def _zonas_rejilla(puntos, lado_km):
+    """Códigos y etiquetas "(x, y)" de celdas de `lado_km`, como en las estadísticas top-K."""
+    celdas = np.floor(np.asarray(puntos, dtype=np.float64).reshape(-1, 2) / lado_km).astype(np.int64)
+    unicas, codigos = np.unique(celdas, axis=0, return_inverse=True)
+    etiquetas = np.array([f"({x}, {y})" for x, y in unicas], dtype=object)
+    return codigos.reshape(-1).astype(np.int32), etiquetas
+
+
+class TablaServicios:
+    """
+    Histórico de servicios en formato columnar.
+
+    Atributos:
+        columnas: {nombre: array} con una fila por servicio
+        categorias: {nombre: array de etiquetas} de las columnas de texto
+    """
+
+    def __init__(self, columnas, categorias):
+        self.columnas = columnas
+        self.categorias = categorias
+
+    def __len__(self):
+        return len(self.columnas["dia"])
+
+    # === Construcción ===
+
+    @classmethod
+    def desde_registros(cls, registros, zonas=None, lado_zona_km=1.0):
+        """
+        Tabla a partir de diccionarios como los de SistemaCentral.servicios_control.
+
+        Args:
+            zonas: MatrizZonas opcional; sin ella las zonas son celdas de `lado_zona_km`
+        """
+        n = len(registros)
+        origenes = np.array([r["origen"] for r in registros], dtype=np.float64).reshape(n, 2)
+        destinos = np.array([r["destino"] for r in registros], dtype=np.float64).reshape(n, 2)
+        columnas = {
+            "dia": np.fromiter((r["dia"] for r in registros), dtype=np.int32, count=n),
+            "hora": np.fromiter((r.get("hora", -1) for r in registros), dtype=np.int8, count=n),
+            "km": np.fromiter((r["km"] for r in registros), dtype=np.float64, count=n),
+            "costo": np.fromiter((r["costo"] for r in registros), dtype=np.float64, count=n),
+            "calificacion": np.fromiter(
+                (np.nan if r["calificacion"] is None else r["calificacion"] for r in registros),
+                dtype=np.float64, count=n),
+            "aceptado": np.fromiter((r["aceptado"] for r in registros), dtype=bool, count=n),
+            "tarifa_alta": np.fromiter((r.get("tarifa_alta", False) for r in registros), dtype=bool, count=n),
+        }
+        categorias = {}
+        for nombre in ("id_taxi", "id_cliente"):
+            columnas[nombre], categorias[nombre] = _factorizar([r[nombre] for r in registros])
+        for nombre, puntos in (("zona_origen", origenes), ("zona_destino", destinos)):
+            if zonas is not None:
+                columnas[nombre] = zonas.zonas_de(puntos).astype(np.int32)
+                categorias[nombre] = np.array([f"Z{z}" for z in range(zonas.num_zonas)], dtype=object)
+            else:
+                columnas[nombre], categorias[nombre] = _zonas_rejilla(puntos, lado_zona_km)
+        return cls(columnas, categorias)
+
+    @classmethod
+    def desde_control_servicios(cls, ruta, lado_zona_km=1.0):
+        """Tabla a partir del archivo de texto de ReportGenerator.generar_control_servicios."""
+        registros = []
+        actual = {}
+        with open(ruta, encoding="utf-8") as f:
+            for linea in f:
+                linea = linea.rstrip("\n")
+                if m := _PATRONES_CONTROL["dia"].match(linea):
+                    actual = {"dia": int(m[1]), "aceptado": m[2] == "ACEPTADA"}
+                elif m := _PATRONES_CONTROL["taxi"].match(linea):
+                    actual["id_taxi"] = None if m[1] == "None" else m[1]
+                    actual["id_cliente"] = m[2]
+                elif m := _PATRONES_CONTROL["ruta"].match(linea):
+                    actual["origen"] = (float(m[1]), float(m[2]))
+                    actual["destino"] = (float(m[3]), float(m[4]))
+                elif m := _PATRONES_CONTROL["coste"].match(linea):
+                    actual["km"], actual["costo"] = float(m[1]), float(m[2])
+                elif m := _PATRONES_CONTROL["calificacion"].match(linea):
+                    actual["calificacion"] = None if m[1] == "N/A" else float(m[1])
+                    registros.append(actual)
+        return cls.desde_registros(registros, lado_zona_km=lado_zona_km)
+
+    @classmethod
+    def sintetica(cls, n, semilla=0, dias=30, taxis=500, clientes=100_000, lado_km=10):
+        """Tabla aleatoria de `n` servicios para pruebas de rendimiento."""
+        rng = np.random.default_rng(semilla)
+        aceptado = rng.random(n) < 0.9
+        km = rng.exponential(4.0, n) * aceptado
+        hora = rng.integers(0, 24, n, dtype=np.int8)
+        tarifa_alta = aceptado & (hora >= 21)
+        costo = np.where(tarifa_alta, 1.0 + 1.5 * km, 0.5 + 1.0 * km) * aceptado
+        calificacion = np.where(aceptado, rng.integers(1, 6, n), np.nan)
+        zonas = lado_km * lado_km
+        columnas = {
+            "dia": rng.integers(1, dias + 1, n, dtype=np.int32),
+            "hora": hora,
+            "km": km,
+            "costo": costo,
+            "calificacion": calificacion,
+            "aceptado": aceptado,
+            "tarifa_alta": tarifa_alta,
+            "id_taxi": rng.integers(0, taxis, n, dtype=np.int32),
+            "id_cliente": rng.integers(0, clientes, n, dtype=np.int32),
+            "zona_origen": rng.integers(0, zonas, n, dtype=np.int32),
+            "zona_destino": rng.integers(0, zonas, n, dtype=np.int32),
+        }
+        celdas = np.array([f"({z % lado_km}, {z // lado_km})" for z in range(zonas)], dtype=object)
+        categorias = {
+            "id_taxi": np.array([str(1000 + i) for i in range(taxis)], dtype=object),
+            "id_cliente": np.array([str(10000 + i) for i in range(clientes)], dtype=object),
+            "zona_origen": celdas,
+            "zona_destino": celdas,
+        }
+        return cls(columnas, categorias)
+
+    def guardar(self, ruta):
+        """Guarda la tabla en un .npz (se recarga con cargar())."""
+        datos = dict(self.columnas)
+        for nombre, etiquetas in self.categorias.items():
+            datos[f"_etiquetas_{nombre}"] = etiquetas.astype(str)
+        np.savez(ruta, **datos)
+
+    @classmethod
+    def cargar(cls, ruta):
+        with np.load(ruta) as datos:
+            columnas = {k: datos[k] for k in datos.files if not k.startswith("_etiquetas_")}
+            categorias = {k[len("_etiquetas_"):]: datos[k].astype(object)
+                          for k in datos.files if k.startswith("_etiquetas_")}
+        return cls(columnas, categorias)
+
+    # === Consultas ===
+
+    def _columna(self, nombre):
+        if nombre in DERIVADAS:
+            return DERIVADAS[nombre](self.columnas)
+        if nombre not in self.columnas:
+            raise ValueError(f"Columna desconocida: {nombre}")
+        return self.columnas[nombre]
+
+    @staticmethod
+    def _filas(columna, mascara):
+        return columna if mascara is None else columna[mascara]
+
+    def _codigos_de(self, nombre, valores):
+        """Códigos de las etiquetas `valores` de una columna de texto."""
+        etiquetas = self.categorias[nombre]
+        buscadas = {str(v) for v in valores}
+        return np.flatnonzero(np.isin(etiquetas, list(buscadas)))
+
+    def mascara(self, filtro=None):
+        """
+        Máscara booleana de las filas que cumplen `filtro`.
+
+        Args:
+            filtro: {columna: valor | (mínimo, máximo) | [valores]}; los rangos
+                son inclusivos y en las columnas de texto se usan las etiquetas
+        """
+        mascara = np.ones(len(self), dtype=bool)
+        for nombre, condicion in (filtro or {}).items():
+            columna = self._columna(nombre)
+            if nombre in CATEGORICAS:
+                valores = condicion if isinstance(condicion, (list, set, tuple)) else [condicion]
+                mascara &= np.isin(columna, self._codigos_de(nombre, valores))
+            elif isinstance(condicion, tuple):
+                minimo, maximo = condicion
+                if minimo is not None:
+                    mascara &= columna >= minimo
+                if maximo is not None:
+                    mascara &= columna <= maximo
+            elif isinstance(condicion, (list, set)):
+                mascara &= np.isin(columna, list(condicion))
+            else:
+                mascara &= columna == condicion
+        return mascara
+
+    def consultar(self, medida="costo", agregacion="suma", por=(), filtro=None,
+                  cuantil=0.5, orden=None, limite=None):
+        """
+        Agregación de `medida` por los grupos de `por` sobre las filas del filtro.
+
+        Args:
+            medida: columna numérica (km, costo, calificacion, aceptado,
+                tarifa_alta, rechazado); los NaN se ignoran
+            agregacion: suma, media, conteo o cuantil
+            por: columnas de agrupación (dia, hora, id_taxi, id_cliente, zonas)
+            cuantil: fracción (0-1) para la agregación cuantil
+            orden: "valor" ordena de mayor a menor valor (por defecto, por grupo)
+            limite: número máximo de filas devueltas
+
+        Returns:
+            lista de {columna: grupo, ..., "valor": x, "n": filas}
+        """
+        if agregacion not in AGREGACIONES:
+            raise ValueError(f"Agregación desconocida: {agregacion}")
+        por = (por,) if isinstance(por, str) else tuple(por)
+        # Sin filtro no se copia ninguna columna
+        mascara = self.mascara(filtro) if filtro else None
+        valores = self._filas(self._columna(medida), mascara)
+        if valores.dtype.kind == "f":
+            nulos = np.isnan(valores)
+            if nulos.any():
+                if mascara is None:
+                    mascara = ~nulos
+                else:
+                    mascara[np.flatnonzero(mascara)[nulos]] = False
+                valores = valores[~nulos]
+        valores = valores.astype(np.float64, copy=False)
+
+        # Código de grupo combinado
+        claves = []
+        grupos = None
+        total = 1
+        for nombre in por:
+            columna = self._filas(self._columna(nombre), mascara)
+            base = int(columna.min()) if len(columna) else 0
+            cardinalidad = int(columna.max()) - base + 1 if len(columna) else 1
+            claves.append((nombre, base, cardinalidad))
+            codigo = columna if base == 0 and len(por) == 1 else columna.astype(np.int64) - base
+            grupos = codigo if grupos is None else grupos * cardinalidad + codigo
+            total *= cardinalidad
+        if grupos is None:
+            grupos = np.zeros(len(valores), dtype=np.intp)
+        if total > max(4 * len(valores), 1 << 20):
+            # Demasiados grupos posibles para un array denso: compactar
+            presentes, grupos = np.unique(grupos, return_inverse=True)
+            grupos = grupos.reshape(-1)
+        else:
+            presentes = None
+
+        conteos = np.bincount(grupos, minlength=1)
+        if agregacion == "conteo":
+            resultado = conteos.astype(np.float64)
+        elif agregacion in ("suma", "media"):
+            resultado = np.bincount(grupos, weights=valores, minlength=1)
+            if agregacion == "media":
+                resultado = resultado / np.maximum(conteos, 1)
+        elif len(valores) == 0:
+            resultado = np.zeros(len(conteos))
+        else:
+            inicios = np.cumsum(conteos) - conteos
+            rangos = np.floor(cuantil * np.maximum(conteos - 1, 0)).astype(np.int64)
+            if len(conteos) <= 1 << 16:
+                # Pocos grupos: ordenar solo por grupo (radix sort de 16 bits) y
+                # seleccionar el cuantil de cada tramo con np.partition
+                por_grupo = valores[np.argsort(grupos.astype(np.uint16), kind="stable")]
+                resultado = np.zeros(len(conteos))
+                for g in np.flatnonzero(conteos):
+                    tramo = por_grupo[inicios[g]:inicios[g] + conteos[g]]
+                    resultado[g] = np.partition(tramo, rangos[g])[rangos[g]]
+            else:
+                # Una ordenación por (grupo, valor); el cuantil de cada grupo es una posición
+                ordenados = valores[np.lexsort((valores, grupos))]
+                resultado = ordenados[inicios + rangos]
+
+        indices = np.flatnonzero(conteos)
+        if orden == "valor":
+            indices = indices[np.argsort(-resultado[indices], kind="stable")]
+        if limite is not None:
+            indices = indices[:limite]
+
+        filas = []
+        codigos_grupo = presentes[indices] if presentes is not None else indices
+        for i, codigo in zip(indices, codigos_grupo):
+            fila = {}
+            codigo = int(codigo)
+            for nombre, base, cardinalidad in reversed(claves):
+                codigo, resto = divmod(codigo, cardinalidad)
+                valor = resto + base
+                fila[nombre] = self.categorias[nombre][valor] if nombre in CATEGORICAS else valor
+            fila = {nombre: fila[nombre] for nombre, _, _ in claves}
+            fila["valor"] = round(float(resultado[i]), 4)
+            fila["n"] = int(conteos[i])
+            filas.append(fila)
+        return filas
+
+
+def formatear_resultado(filas):
+    """Tabla de texto con el resultado de TablaServicios.consultar()."""
+    if not filas:
+        return "(sin resultados)"
+    columnas = list(filas[0])
+    anchos = {c: max(len(c), *(len(str(f[c])) for f in filas)) + 2 for c in columnas}
+    lineas = ["".join(f"{c:>{anchos[c]}}" for c in columnas)]
+    for fila in filas:
+        lineas.append("".join(f"{str(fila[c]):>{anchos[c]}}" for c in columnas))
+    return "\n".join(lineas)
+
+
+def _leer_filtro(texto):
+    """'columna=valor', 'columna=min:max' o 'columna=a,b,c' -> (columna, condición)."""
+    nombre, _, valor = texto.partition("=")
+
+    def convertir(v):
+        if nombre in CATEGORICAS:
+            return v
+        if v.lower() in ("si", "sí", "true"):
+            return True
+        if v.lower() in ("no", "false"):
+            return False
+        return float(v) if "." in v else int(v)
+
+    if ":" in valor:
+        minimo, _, maximo = valor.partition(":")
+        return nombre, (convertir(minimo) if minimo else None, convertir(maximo) if maximo else None)
+    if "," in valor:
+        return nombre, [convertir(v) for v in valor.split(",")]
+    return nombre, convertir(valor)
+
+
+def _main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Consultas agregadas sobre el histórico de servicios")
+    origen = parser.add_mutually_exclusive_group(required=True)
+    origen.add_argument("--control", metavar="TXT", help="Archivo de control de servicios (texto)")
+    origen.add_argument("--tabla", metavar="NPZ", help="Tabla guardada con --guardar")
+    origen.add_argument("--historico", metavar="DIR", help="Directorio de días sellados (LibroServicios)")
+    origen.add_argument("--sintetico", type=int, metavar="N", help="Generar N servicios aleatorios")
+    parser.add_argument("--guardar", metavar="NPZ", help="Guardar la tabla cargada en formato columnar")
+    parser.add_argument("--medida", default="costo", help=f"{', '.join(MEDIDAS + tuple(DERIVADAS))}")
+    parser.add_argument("--agregacion", default="suma", choices=AGREGACIONES)
+    parser.add_argument("--cuantil", type=float, default=0.5)
+    parser.add_argument("--por", action="append", default=[], help="Columna de agrupación (repetible)")
+    parser.add_argument("--filtro", action="append", default=[],
+                        help="columna=valor, columna=min:max o columna=a,b (repetible)")
+    parser.add_argument("--orden", choices=("grupo", "valor"), default="grupo")
+    parser.add_argument("--limite", type=int)
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    if args.control:
+        tabla = TablaServicios.desde_control_servicios(args.control)
+    elif args.tabla:
+        tabla = TablaServicios.cargar(args.tabla)
+    elif args.historico:
+        from .libro_servicios import LibroServicios
+        tabla = TablaServicios.desde_registros(list(LibroServicios(args.historico)))
+    else:
+        tabla = TablaServicios.sintetica(args.sintetico)
+    print(f"{len(tabla)} servicios cargados en {time.perf_counter() - t0:.2f} s")
+    if args.guardar:
+        tabla.guardar(args.guardar)
+        print(f"Tabla guardada en {args.guardar}")
+
+    t0 = time.perf_counter()
+    filas = tabla.consultar(args.medida, args.agregacion, args.por,
+                            dict(_leer_filtro(f) for f in args.filtro),
+                            args.cuantil, args.orden, args.limite)
+    transcurrido = time.perf_counter() - t0
+    print(formatear_resultado(filas))
+    print(f"Consulta: {transcurrido * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    _main()
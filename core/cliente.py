@@ -2,6 +2,7 @@
 import threading
 import random
 from .taxi import SolicitudServicio
+from .trazas import marcar
 
 
 class Cliente(threading.Thread):
@@ -12,11 +13,12 @@ class Cliente(threading.Thread):
     def __init__(self, id_cliente, sistema_central,
                  origen=None, destino=None,
                  direccion_origen=None, direccion_destino=None,
-                 dia=1):
+                 dia=1, ticket=None):
         super().__init__(name=f"Cliente-{id_cliente}", daemon=True)
         self.id_cliente = id_cliente
         self.sistema_central = sistema_central
         self.dia = dia
+        self.ticket = ticket
 
         self.direccion_origen = direccion_origen
         self.direccion_destino = direccion_destino
@@ -43,8 +45,11 @@ class Cliente(threading.Thread):
             destino=self.destino,
             dia=self.dia,
             direccion_origen=self.direccion_origen,
-            direccion_destino=self.direccion_destino
+            direccion_destino=self.direccion_destino,
+            ticket=self.ticket
         )
+        self.sistema_central.trazador.iniciar(solicitud)
+        marcar(solicitud, "cliente")
         print(f"[{self.name}] Solicita taxi. Origen {self.direccion_origen or self.origen}, "
               f"destino {self.direccion_destino or self.destino}")
         self.sistema_central.procesar_solicitud_cliente(solicitud)
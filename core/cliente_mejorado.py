@@ -13,15 +13,30 @@ class ClienteMejorado:
         frecuencia: número de viajes realizados.
         estrellas: valoración de 1 a 5 estrellas basada en frecuencia.
         calificacion_promedio: promedio de calificaciones recibidas del cliente.
+        posicion: punto (x, y) de su última solicitud (None si no ha pedido).
+    
+    Usa __slots__ (sin __dict__ por objeto) porque el registro puede tener
+    millones de clientes. Si no se da nombre, se deriva del id al leerlo.
     """
+    __slots__ = ("id_cliente", "_nombre", "frecuencia", "calificacion_promedio",
+                 "estrellas", "posicion")
 
     def __init__(self, id_cliente, nombre="Cliente", frecuencia=0, calificacion_promedio=5.0):
         self.id_cliente = id_cliente
-        self.nombre = nombre
+        self._nombre = nombre
         self.frecuencia = frecuencia
         self.calificacion_promedio = calificacion_promedio
+        self.posicion = None
         self._actualizar_estrellas()
 
+    @property
+    def nombre(self):
+        return self._nombre if self._nombre is not None else f"Cliente-{self.id_cliente}"
+
+    @nombre.setter
+    def nombre(self, valor):
+        self._nombre = valor
+
     def _actualizar_estrellas(self):
         """
         Calcula estrellas basado en la frecuencia:
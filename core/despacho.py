@@ -0,0 +1,251 @@
+"""
+Fachada de despacho compartida entre trabajadores web.
+
+`ServicioDespacho` expone las operaciones que necesita la web sobre un
+`SistemaCentral` devolviendo solo datos simples (dict, list, float), de modo
+que puede usarse en el mismo proceso o servirse desde un único proceso motor
+por un socket Unix local. Así varios trabajadores WSGI comparten una única
+flota, un único registro de clientes y una única contabilidad.
+
+Motor:      python motor.py --socket /tmp/unietaxi.sock
+Trabajador: UNIETAXI_MOTOR=/tmp/unietaxi.sock gunicorn -w 4 main:app
+
+El canal usa pickle, así que la clave de autenticación no puede ser pública:
+se toma de UNIETAXI_AUTHKEY o, si no está, el motor genera una aleatoria y
+la deja en `<socket>.key` (permisos 0600), de donde la leen los
+trabajadores del mismo usuario.
+"""
+import os
+import secrets
+import stat
+import threading
+from multiprocessing.managers import BaseManager
+
+VARIABLE_AUTHKEY = "UNIETAXI_AUTHKEY"
+
+# NumPy y el núcleo del simulador se importan dentro de los métodos que los
+# usan: importar este módulo (y por tanto main.py) no los carga.
+
+
+class ServicioDespacho:
+    """Operaciones de la web sobre el sistema central (resultados serializables)."""
+
+    def __init__(self, sistema_central):
+        self.sistema = sistema_central
+
+    # === Solicitudes y tickets ===
+
+    def solicitar_viaje(self, cliente_id, direccion_origen=None, direccion_destino=None,
+                        origen=None, destino=None):
+        """Crea un ticket y lanza el hilo Cliente sin esperar a la asignación."""
+        from .cliente import Cliente
+
+        ticket = self.sistema.tickets.crear_ticket(cliente_id)
+        cliente = Cliente(
+            id_cliente=cliente_id,
+            sistema_central=self.sistema,
+            origen=origen,
+            destino=destino,
+            direccion_origen=direccion_origen,
+            direccion_destino=direccion_destino,
+            dia=self.sistema.dia_actual,
+            ticket=ticket
+        )
+        cliente.start()
+        return ticket
+
+    def existe_ticket(self, ticket):
+        return self.sistema.tickets.existe(ticket)
+
+    def esperar_eventos(self, ticket, desde=0, timeout=25.0):
+        return self.sistema.tickets.esperar_eventos(ticket, desde, timeout)
+
+    # === Clientes, tarifas y cotizaciones ===
+
+    def info_cliente(self, cliente_id):
+        cliente = self.sistema._obtener_cliente_mejorado(cliente_id)
+        return {
+            "id": cliente.id_cliente,
+            "nombre": cliente.nombre,
+            "frecuencia": cliente.frecuencia,
+            "estrellas": cliente.estrellas,
+        }
+
+    def convertir_direccion(self, direccion):
+        return self.sistema.convertir_direccion_a_coordenadas(direccion)
+
+    def modo_tarifa_alta(self):
+        return self.sistema.sistema_asignacion.modo_tarifa_alta
+
+    def multiplicador(self, origen):
+        return self.sistema.sistema_asignacion.obtener_multiplicador(origen)
+
+    def calcular_tarifa(self, km, modo_tarifa_alta=None, origen=None):
+        """Tarifa de `km`; con `origen` (plano del simulador) aplica su multiplicador zonal."""
+        return self.sistema.sistema_asignacion.calcular_tarifa(km, modo_tarifa_alta=modo_tarifa_alta,
+                                                              origen=origen)
+
+    def cotizar_lote(self, origenes, destinos, coordenadas="plano", modo_tarifa_alta=None):
+        """
+        Cotiza pares origen[i] -> destino[i] sin despachar.
+
+        Args:
+            origenes, destinos: listas de pares (x, y) o (lat, lon)
+            coordenadas: "plano" o "latlon"
+            modo_tarifa_alta: True/False para forzar un modo; None usa el actual
+
+        Returns:
+            dict con tarifa, tarifa_base, tarifa_km y listas km, precios y
+            segundos (None si no hay matriz de zonas). Con "plano" los precios
+            incluyen el multiplicador de tarifa zonal del origen si está
+            activa; con "latlon" no (la tarifa zonal se define sobre el plano).
+        """
+        import numpy as np
+        from .distancias import distancias_haversine_pares
+
+        asignacion = self.sistema.sistema_asignacion
+        segundos = None
+        if coordenadas == "latlon":
+            kms = distancias_haversine_pares(origenes, destinos)
+        else:
+            kms, segundos = asignacion.estimar_km_lote(origenes, destinos)
+        kms = np.round(kms, 2)
+        # Se lee una vez: el monitor puede cambiar de tarifa entre los precios y la respuesta
+        if modo_tarifa_alta is None:
+            modo_tarifa_alta = asignacion.modo_tarifa_alta
+        # La tarifa zonal se define sobre el plano del simulador
+        precios = asignacion.calcular_tarifas_lote(
+            kms, modo_tarifa_alta, origenes if coordenadas == "plano" else None)
+        tarifa_base, tarifa_km = asignacion.obtener_tarifas(modo_tarifa_alta)
+        return {
+            "tarifa": "alta" if modo_tarifa_alta else "normal",
+            "tarifa_base": tarifa_base,
+            "tarifa_km": tarifa_km,
+            "km": kms.tolist(),
+            "precios": precios.tolist(),
+            "segundos": None if segundos is None else np.round(segundos, 0).tolist(),
+        }
+
+    # === Reportes y flota ===
+
+    def snapshot_reportes(self):
+        return self.sistema.obtener_snapshot_reportes()
+
+    def hora_virtual(self):
+        """Hora virtual al minuto (la resolución con la que se muestra y se cachea)."""
+        return self.sistema.sistema_asignacion.obtener_hora_virtual().strftime("%H:%M")
+
+    def esperar_flota(self, visto=None, timeout=15.0):
+        return self.sistema.difusor_flota.esperar_mensaje(visto, timeout)
+
+    def tick_flota(self):
+        return self.sistema.difusor_flota.tick
+
+    def resumen_locks(self):
+        return self.sistema.resumen_locks()
+
+    def metricas_prometheus(self):
+        return self.sistema.metricas.exportar_prometheus()
+
+
+class DespachoPerezoso:
+    """
+    Crea el despacho real (local o conexión al motor) en el primer acceso a
+    cualquiera de sus métodos, de modo que importar la aplicación no arranca
+    el sistema.
+    """
+
+    def __init__(self, fabrica):
+        self._fabrica = fabrica
+        self._despacho = None
+        self._mutex = threading.Lock()
+
+    def _obtener(self):
+        if self._despacho is None:
+            with self._mutex:
+                if self._despacho is None:
+                    self._despacho = self._fabrica()
+        return self._despacho
+
+    def __getattr__(self, nombre):
+        return getattr(self._obtener(), nombre)
+
+
+class _GestorMotor(BaseManager):
+    """Gestor de multiprocessing que publica el ServicioDespacho."""
+
+
+def ruta_clave(direccion):
+    """Fichero con la clave generada por el motor, junto al socket."""
+    return f"{direccion}.key"
+
+
+def clave_motor(direccion, crear=False):
+    """
+    Clave de autenticación del socket `direccion`.
+
+    Args:
+        crear: en el motor, generar una clave nueva y guardarla en
+            ruta_clave(direccion) si no hay UNIETAXI_AUTHKEY
+
+    Raises:
+        RuntimeError: en un trabajador, si no hay variable ni fichero de clave
+    """
+    if os.environ.get(VARIABLE_AUTHKEY):
+        return os.environ[VARIABLE_AUTHKEY].encode()
+    ruta = ruta_clave(direccion)
+    if crear:
+        clave = secrets.token_bytes(32)
+        fd = os.open(ruta, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            os.fchmod(f.fileno(), 0o600)  # por si el fichero ya existía con otros permisos
+            f.write(clave)
+        return clave
+    try:
+        with open(ruta, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        raise RuntimeError(f"Sin clave para {direccion}: defina {VARIABLE_AUTHKEY} "
+                           f"o arranque antes el motor (crea {ruta})") from None
+
+
+def servir(servicio, direccion, authkey=None):
+    """
+    Sirve `servicio` en `direccion` (ruta de socket Unix) hasta que el proceso
+    termine. Cada conexión se atiende en su propio hilo del motor.
+
+    Args:
+        authkey: clave del canal; None usa clave_motor(direccion, crear=True)
+    """
+    if isinstance(direccion, str):
+        try:
+            modo = os.lstat(direccion).st_mode
+        except FileNotFoundError:
+            pass
+        else:
+            if not stat.S_ISSOCK(modo):
+                raise FileExistsError(f"{direccion} existe y no es un socket")
+            os.unlink(direccion)  # socket huérfano de una ejecución anterior
+    if authkey is None:
+        authkey = clave_motor(direccion, crear=True)
+    _GestorMotor.register("despacho", callable=lambda: servicio)
+    gestor = _GestorMotor(address=direccion, authkey=authkey)
+    servidor = gestor.get_server()
+    print(f"[Motor] Despacho disponible en {direccion}")
+    servidor.serve_forever()
+
+
+def conectar(direccion, authkey=None):
+    """
+    Conecta con un motor y devuelve un proxy con la misma interfaz que
+    ServicioDespacho. El proxy abre una conexión por hilo del trabajador.
+
+    Args:
+        authkey: clave del canal; None usa clave_motor(direccion)
+    """
+    if authkey is None:
+        authkey = clave_motor(direccion)
+    _GestorMotor.register("despacho")
+    gestor = _GestorMotor(address=direccion, authkey=authkey)
+    gestor.connect()
+    return gestor.despacho()
@@ -0,0 +1,242 @@
+"""
+Simulación batch por días en procesos separados.
+
+Cada día del archivo de taxis es independiente en la entrada (su turno y
+sus solicitudes), así que se puede simular en su propio proceso con un
+SistemaCentral nuevo: los días se reparten entre `procesos` trabajadores y
+el lote tarda más o menos días / núcleos en vez de la suma de todos.
+
+Estado que pasa de un día a otro y cómo se trata:
+
+- Clientes (frecuencia, estrellas, calificación media), taxis (número de
+  viajes, viajes_hoy, calificación media, ganancia acumulada,
+  ganancia_por_taxi) y contadores y top-K de SistemaAsignacion: cada día
+  parte del estado inicial del lote y el proceso principal hace una pasada
+  secuencial de arreglo, repitiendo en orden de día los viajes terminados
+  de cada uno por el mismo camino que la simulación secuencial.
+- Métricas (contadores e histogramas de sistema.metricas): cada trabajador
+  devuelve una instantánea de las suyas y se suman a las del proceso
+  principal.
+- Datos del taxista (nombre, placa, marca, modelo): se aplican los turnos en
+  orden en el proceso principal, así que manda el último archivo.
+- Posición de los taxis: no se arrastra; cada día empiezan en (0, 0).
+
+Diferencias con la simulación secuencial: dentro de un día la prioridad por
+estrellas usa las del inicio del lote, y cada trabajador devuelve su día al
+cabo de `espera_reporte`, el mismo corte que el bucle secuencial. Los viajes
+que siguen en curso en ese momento (que en la secuencial acaban ya dentro
+del día siguiente) no llegan al proceso principal: se avisan como
+`pendientes` y no cuentan en el mensual ni en control de servicios. Con
+`espera_maxima` > 0 el trabajador los espera hasta ese límite.
+
+Los reportes (diario, mensual y control de servicios) se escriben en orden
+de día a medida que llegan los resultados.
+"""
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .cliente import Cliente
+from .cliente_mejorado import ClienteMejorado
+from .libro_servicios import LibroServicios
+from .puntos_control import PuntosControl
+from .registro_clientes import RegistroClientes
+from .report_generator import ReportGenerator
+from .sistema import SistemaCentral
+from .trazas import Trazador
+
+
+def afiliar_clientes(sistema, lista_clientes, mostrar=True):
+    """Registra los clientes del archivo ("Afiliación") en `sistema`."""
+    for c_data in lista_clientes:
+        c_mejorado = ClienteMejorado(
+            id_cliente=c_data["cedula"],
+            nombre=f"{c_data['nombre']} {c_data['apellido']}",
+            frecuencia=0
+        )
+        sistema.clientes_mejorados[c_data["cedula"]] = c_mejorado
+        if mostrar:
+            print(f"  - Cliente afiliado: {c_mejorado.nombre} (ID: {c_mejorado.id_cliente})")
+
+
+def generar_solicitudes(sistema, dia, lista_clientes, num_solicitudes, pausa=0.5):
+    """
+    Lanza `num_solicitudes` hilos Cliente con clientes afiliados al azar y
+    coordenadas aleatorias (0-10 km), con una pausa entre solicitudes.
+    """
+    hilos_clientes = []
+    for _ in range(num_solicitudes):
+        if not lista_clientes:
+            break
+        c_data = random.choice(lista_clientes)
+        origen = (random.uniform(0, 10), random.uniform(0, 10))
+        destino = (random.uniform(0, 10), random.uniform(0, 10))
+        cliente_thread = Cliente(
+            id_cliente=c_data["cedula"],
+            sistema_central=sistema,
+            origen=origen,
+            destino=destino,
+            dia=dia
+        )
+        hilos_clientes.append(cliente_thread)
+        cliente_thread.start()
+        time.sleep(pausa)
+    return hilos_clientes
+
+
+def simular_dia(parametros):
+    """
+    Simula un día completo en un SistemaCentral propio (se ejecuta en un
+    proceso trabajador).
+
+    Args:
+        parametros: dict con dia, registros (turno del día), lista_clientes,
+            num_solicitudes, pausa, espera_reporte, espera_maxima (segundos
+            esperando a los viajes en curso tras el reporte; 0 por defecto)
+            y semilla
+
+    Returns:
+        dict con dia, ganancia_total y servicios_seguimiento (al tomar el
+        reporte diario), servicios (registros de control del día), metricas
+        (instantánea de sistema.metricas), pendientes (viajes sin terminar al
+        devolver el día) y segundos
+    """
+    t0 = time.perf_counter()
+    dia = parametros["dia"]
+    semilla = parametros.get("semilla")
+    random.seed(None if semilla is None else f"{semilla}-{dia}")
+
+    # Todo en memoria: varios procesos no pueden compartir histórico, base de
+    # clientes ni puntos de control
+    sistema = SistemaCentral(
+        registro_clientes=RegistroClientes(),
+        libro_servicios=LibroServicios(),
+        puntos_control=PuntosControl(),
+        trazador=Trazador(),
+    )
+    sistema.dia_actual = dia
+    afiliar_clientes(sistema, parametros["lista_clientes"], mostrar=False)
+    turno = sistema.turnos.aplicar_turno(parametros["registros"])
+    print(f"[Día {dia}] De turno: {turno['en_turno']}")
+
+    generar_solicitudes(sistema, dia, parametros["lista_clientes"],
+                        parametros["num_solicitudes"], parametros.get("pausa", 0.5))
+    time.sleep(parametros.get("espera_reporte", 5))
+    with sistema.mutex_servicio:
+        ganancia_total = sistema.ganancia_total_diaria
+        seguimiento = [dict(s) for s in sistema.servicios_seguimiento]
+
+    # Opcional: esperar a los viajes en curso (en la secuencial acabarían al día siguiente)
+    limite = time.monotonic() + parametros.get("espera_maxima", 0)
+    while time.monotonic() < limite:
+        with sistema.mutex_findeldia:
+            if sistema.servicios_activos == 0:
+                break
+        time.sleep(0.2)
+    # Servicios y métricas en el mismo instante: un viaje que acabe entre
+    # medias no debe contar en unos y no en otras
+    with sistema.mutex_servicio:
+        with sistema.mutex_findeldia:
+            pendientes = sistema.servicios_activos
+        with sistema.mutex_control_servicios:
+            servicios = sistema.servicios_control.leer_dia(dia)
+        metricas = sistema.metricas.instantanea()
+    sistema.sistema_asignacion.detener_monitor()
+
+    return {
+        "dia": dia,
+        "ganancia_total": ganancia_total,
+        "servicios_seguimiento": seguimiento,
+        "servicios": servicios,
+        "metricas": metricas,
+        "pendientes": pendientes,
+        "segundos": time.perf_counter() - t0,
+    }
+
+
+def aplicar_resultado(sistema, resultado):
+    """
+    Pasada de arreglo de un día: añade sus servicios al libro del sistema,
+    repite sus viajes terminados, en orden, sobre taxis, clientes y
+    SistemaAsignacion (como SistemaCentral.registrar_final_viaje) y suma sus
+    métricas.
+    """
+    with sistema.mutex_servicio:
+        for servicio in resultado["servicios"]:
+            if servicio["aceptado"]:
+                taxi = sistema.turnos.obtener(servicio["id_taxi"])
+                taxi.actualizar_calificacion(servicio["calificacion"])
+                taxi.acumular_ganancia(servicio["costo"])
+                taxi.viajes_hoy += 1
+                sistema.ganancia_por_taxi[taxi.id_taxi] = (
+                    sistema.ganancia_por_taxi.get(taxi.id_taxi, 0.0) + servicio["costo"]
+                )
+                cliente = sistema.clientes_mejorados.obtener(servicio["id_cliente"])
+                cliente.incrementar_frecuencia()
+                cliente.actualizar_calificacion(servicio["calificacion"])
+                sistema.sistema_asignacion.registrar_viaje_completado(
+                    conductor=taxi,
+                    cliente=cliente,
+                    km=servicio["km"],
+                    tarifa=servicio["costo"],
+                    origen=servicio["origen"],
+                    destino=servicio["destino"],
+                    tarifa_alta=servicio["tarifa_alta"],
+                )
+        sistema.metricas.fusionar(resultado["metricas"])
+        sistema.version_reportes += 1
+    with sistema.mutex_control_servicios:
+        for servicio in resultado["servicios"]:
+            sistema.servicios_control.append(servicio)
+
+
+def ejecutar_dias_en_paralelo(sistema, datos_taxis, lista_clientes, procesos, num_solicitudes=5,
+                              filepath_diario="reportes_examen.txt", **opciones):
+    """
+    Simula todos los días del lote en `procesos` procesos y los integra en
+    `sistema` en orden de día, escribiendo el reporte diario de cada uno.
+
+    Args:
+        sistema: SistemaCentral del proceso principal (recibe el estado final)
+        datos_taxis: resultado de DataLoader.leer_archivo_taxis
+        lista_clientes: resultado de DataLoader.leer_archivo_clientes
+        procesos: número de procesos trabajadores
+        opciones: pausa, espera_reporte, espera_maxima, semilla (ver simular_dia)
+    """
+    # Monitor de hora (tarifa alta, resumen diario) como en la secuencial,
+    # donde lo arranca la primera solicitud
+    sistema.iniciar()
+    total_dias = datos_taxis["dias"]
+    tareas = [
+        {
+            "dia": dia,
+            "registros": datos_taxis["registros_por_dia"].get(dia, []),
+            "lista_clientes": lista_clientes,
+            "num_solicitudes": num_solicitudes,
+            **opciones,
+        }
+        for dia in range(1, total_dias + 1)
+    ]
+    t0 = time.perf_counter()
+    # spawn y no fork: el proceso principal puede tener hilos con locks tomados
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as ejecutor:
+        # map entrega en orden: el día d se integra en cuanto él y los anteriores terminan
+        for tarea, resultado in zip(tareas, ejecutor.map(simular_dia, tareas)):
+            dia = resultado["dia"]
+            sistema.dia_actual = dia
+            sistema.turnos.aplicar_turno(tarea["registros"])
+            aplicar_resultado(sistema, resultado)
+            print(f"[Batch] Día {dia} integrado: {len(resultado['servicios'])} servicios "
+                  f"en {resultado['segundos']:.1f}s")
+            if resultado["pendientes"]:
+                print(f"[Batch] Aviso: {resultado['pendientes']} viajes del día {dia} sin terminar")
+            ReportGenerator.generar_reporte_diario(
+                dia=dia,
+                ganancia_total=resultado["ganancia_total"],
+                servicios_seguimiento=resultado["servicios_seguimiento"],
+                filepath=filepath_diario
+            )
+            sistema.cerrar_dia(dia)
+    print(f"[Batch] {total_dias} días en {procesos} procesos: {time.perf_counter() - t0:.1f}s")
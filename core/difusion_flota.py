@@ -0,0 +1,152 @@
+"""
+Difusión del estado de la flota en vivo con codificación por deltas.
+
+Un único hilo recorre la flota cada `tick` segundos, calcula qué campos de
+cada taxi han cambiado desde la pasada anterior y guarda ese delta en un
+búfer circular. Todos los suscriptores comparten el mismo cálculo: al
+conectarse reciben una foto completa y después solo los cambios, fusionados
+si piden un intervalo más lento que el tick base.
+"""
+import threading
+import time
+from collections import deque
+
+# Campos del taxi que se difunden
+CAMPOS_FLOTA = ("posicion", "disponible", "viajes_hoy")
+
+
+def estado_taxi(taxi):
+    """Estado difundible de un taxi (valores serializables a JSON)."""
+    x, y = taxi.posicion
+    return {
+        "posicion": [round(float(x), 4), round(float(y), 4)],
+        "disponible": bool(taxi.disponible),
+        "viajes_hoy": taxi.viajes_hoy,
+    }
+
+
+def calcular_delta(anterior, actual):
+    """
+    Cambios entre dos estados de flota {id_taxi: estado}.
+
+    Returns:
+        (cambios, bajas): cambios es {id_taxi: {campo: valor}} solo con los
+        campos modificados (o todos si el taxi es nuevo); bajas es la lista
+        de ids que ya no están.
+    """
+    cambios = {}
+    for id_taxi, estado in actual.items():
+        previo = anterior.get(id_taxi)
+        if previo is None:
+            cambios[id_taxi] = estado
+            continue
+        diff = {c: v for c, v in estado.items() if previo.get(c) != v}
+        if diff:
+            cambios[id_taxi] = diff
+    bajas = [id_taxi for id_taxi in anterior if id_taxi not in actual]
+    return cambios, bajas
+
+
+def fusionar_deltas(deltas):
+    """Combina varios deltas consecutivos en uno solo."""
+    cambios, bajas = {}, set()
+    for delta in deltas:
+        for id_taxi in delta["bajas"]:
+            cambios.pop(id_taxi, None)
+            bajas.add(id_taxi)
+        for id_taxi, diff in delta["cambios"].items():
+            bajas.discard(id_taxi)
+            cambios.setdefault(id_taxi, {}).update(diff)
+    return cambios, sorted(bajas)
+
+
+class DifusorFlota:
+    """
+    Productor único de deltas de flota con suscriptores concurrentes.
+
+    El hilo productor arranca con la primera consulta y solo trabaja
+    mientras alguien haya consultado en los últimos `inactividad` segundos.
+    """
+
+    def __init__(self, sistema_central, tick=0.25, historial=256, inactividad=30.0):
+        self.sistema_central = sistema_central
+        self.tick = tick
+        self.inactividad = inactividad
+        self._estado = {}              # último estado completo {id: estado}
+        self._seq = 0                  # secuencia del último delta
+        self._deltas = deque(maxlen=historial)
+        self._condicion = threading.Condition()
+        self._ultimo_interes = 0.0
+        self._hilo = None
+
+    def _leer_flota(self):
+        return {str(t.id_taxi): estado_taxi(t) for t in list(self.sistema_central.taxis)}
+
+    def _iniciar(self):
+        """Arranca el hilo productor si no está en marcha (con el lock tomado)."""
+        self._ultimo_interes = time.monotonic()
+        if self._hilo is None or not self._hilo.is_alive():
+            self._estado = self._leer_flota()
+            self._hilo = threading.Thread(target=self._bucle, name="DifusorFlota", daemon=True)
+            self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            time.sleep(self.tick)
+            if time.monotonic() - self._ultimo_interes > self.inactividad:
+                continue
+            actual = self._leer_flota()
+            cambios, bajas = calcular_delta(self._estado, actual)
+            if not cambios and not bajas:
+                continue
+            with self._condicion:
+                self._estado = actual
+                self._seq += 1
+                self._deltas.append({"seq": self._seq, "cambios": cambios, "bajas": bajas})
+                self._condicion.notify_all()
+
+    def esperar_mensaje(self, visto=None, timeout=15.0):
+        """
+        Siguiente mensaje para un suscriptor que ya ha visto hasta `visto`.
+
+        Returns:
+            {"tipo": "completo", "seq", "taxis"} si visto es None o se quedó
+            atrás del búfer; {"tipo": "delta", "seq", "cambios", "bajas"} con
+            los cambios fusionados desde `visto`; o None si no hubo cambios
+            en `timeout` segundos.
+        """
+        with self._condicion:
+            self._iniciar()
+            if visto is None:
+                return {"tipo": "completo", "seq": self._seq, "taxis": dict(self._estado)}
+            self._condicion.wait_for(lambda: self._seq > visto, timeout=timeout)
+            if self._seq == visto:
+                return None
+            if not self._deltas or self._deltas[0]["seq"] > visto + 1:
+                return {"tipo": "completo", "seq": self._seq, "taxis": dict(self._estado)}
+            pendientes = [d for d in self._deltas if d["seq"] > visto]
+            cambios, bajas = fusionar_deltas(pendientes)
+            return {"tipo": "delta", "seq": self._seq, "cambios": cambios, "bajas": bajas}
+
+
+def suscribir(esperar_mensaje, intervalo=0.25, keep_alive=15.0):
+    """
+    Generador de mensajes para un suscriptor: una foto completa y después
+    deltas como mucho una vez por `intervalo` segundos. Produce None cada
+    `keep_alive` segundos sin cambios.
+
+    Args:
+        esperar_mensaje: DifusorFlota.esperar_mensaje, local o remoto
+    """
+    visto = None
+    while True:
+        proximo = time.monotonic() + intervalo
+        mensaje = esperar_mensaje(visto, keep_alive)
+        yield mensaje
+        if mensaje is None:
+            continue
+        visto = mensaje["seq"]
+        # Agrupar cambios: no enviar más de un mensaje por intervalo
+        espera = proximo - time.monotonic()
+        if espera > 0:
+            time.sleep(espera)
@@ -0,0 +1,167 @@
+"""
+Cálculo de distancias escalar y vectorizado (NumPy).
+
+El sistema trabaja con dos tipos de coordenadas:
+- Plano ficticio (x, y) en km, usado por la simulación interna.
+- Coordenadas geográficas (lat, lon), usadas por la versión web.
+
+Las funciones escalares sirven para un único par de puntos. Las funciones
+por lotes devuelven matrices de distancias uno-a-muchos y muchos-a-muchos
+sin bucles en Python.
+"""
+from math import sqrt, radians, sin, cos, asin
+
+import numpy as np
+
+RADIO_TIERRA_KM = 6371.0
+
+
+# === Funciones escalares ===
+
+def distancia_euclidiana(origen, destino):
+    """
+    Distancia euclidiana entre dos puntos (x, y) del plano ficticio.
+
+    Returns:
+        Distancia en km, o inf si alguno de los puntos es None.
+    """
+    if origen is None or destino is None:
+        return float("inf")
+
+    dx = destino[0] - origen[0]
+    dy = destino[1] - origen[1]
+    return sqrt(dx * dx + dy * dy)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Distancia de gran círculo en km entre dos puntos lat/lon.
+
+    Returns:
+        Distancia en km, o None si falta alguna coordenada.
+    """
+    if None in (lat1, lon1, lat2, lon2):
+        return None
+
+    phi1 = radians(lat1)
+    phi2 = radians(lat2)
+    dphi = radians(lat2 - lat1)
+    dlambda = radians(lon2 - lon1)
+
+    a = sin(dphi / 2) ** 2 + cos(phi1) * cos(phi2) * sin(dlambda / 2) ** 2
+    # min() evita errores de dominio por redondeo en puntos antipodales
+    return 2 * RADIO_TIERRA_KM * asin(min(1.0, sqrt(a)))
+
+
+# === Funciones por lotes (NumPy) ===
+
+def _como_puntos(puntos):
+    """Convierte una secuencia de pares en un array float64 de forma (n, 2)."""
+    arr = np.asarray(puntos, dtype=np.float64)
+    if arr.ndim == 1:
+        arr = arr.reshape(-1, 2)
+    if arr.ndim != 2 or arr.shape[1] != 2:
+        raise ValueError(f"Se esperaban puntos de forma (n, 2), recibido {arr.shape}")
+    return arr
+
+
+def distancias_euclidianas(origen, destinos):
+    """
+    Distancias euclidianas uno-a-muchos.
+
+    Args:
+        origen: punto (x, y)
+        destinos: secuencia de n puntos (x, y) o array (n, 2)
+
+    Returns:
+        Array (n,) con la distancia desde origen a cada destino; inf donde
+        el origen o el destino es None, como distancia_euclidiana.
+    """
+    if not isinstance(destinos, np.ndarray) and any(p is None for p in destinos):
+        destinos = [(np.inf, np.inf) if p is None else p for p in destinos]
+    d = _como_puntos(destinos)
+    if origen is None:
+        return np.full(len(d), np.inf)
+    o = np.asarray(origen, dtype=np.float64)
+    return np.hypot(d[:, 0] - o[0], d[:, 1] - o[1])
+
+
+def matriz_distancias_euclidianas(origenes, destinos=None):
+    """
+    Matriz de distancias euclidianas muchos-a-muchos.
+
+    Args:
+        origenes: n puntos (x, y)
+        destinos: m puntos (x, y); si es None se usan los orígenes
+
+    Returns:
+        Array (n, m) donde [i, j] es la distancia de origenes[i] a destinos[j].
+    """
+    o = _como_puntos(origenes)
+    d = o if destinos is None else _como_puntos(destinos)
+    dx = o[:, 0, None] - d[None, :, 0]
+    dy = o[:, 1, None] - d[None, :, 1]
+    return np.hypot(dx, dy)
+
+
+def distancias_euclidianas_pares(origenes, destinos):
+    """
+    Distancias euclidianas fila a fila: origenes[i] -> destinos[i].
+
+    Returns:
+        Array (n,) de distancias.
+    """
+    o = _como_puntos(origenes)
+    d = _como_puntos(destinos)
+    return np.hypot(d[:, 0] - o[:, 0], d[:, 1] - o[:, 1])
+
+
+def distancias_haversine(origen, destinos):
+    """
+    Distancias haversine uno-a-muchos en km.
+
+    Args:
+        origen: punto (lat, lon)
+        destinos: secuencia de n puntos (lat, lon) o array (n, 2)
+
+    Returns:
+        Array (n,) con la distancia desde origen a cada destino.
+    """
+    o = np.radians(np.asarray(origen, dtype=np.float64))
+    d = np.radians(_como_puntos(destinos))
+    return _haversine_rad(o[0], o[1], d[:, 0], d[:, 1])
+
+
+def matriz_distancias_haversine(origenes, destinos=None):
+    """
+    Matriz de distancias haversine muchos-a-muchos en km.
+
+    Args:
+        origenes: n puntos (lat, lon)
+        destinos: m puntos (lat, lon); si es None se usan los orígenes
+
+    Returns:
+        Array (n, m) donde [i, j] es la distancia de origenes[i] a destinos[j].
+    """
+    o = np.radians(_como_puntos(origenes))
+    d = o if destinos is None else np.radians(_como_puntos(destinos))
+    return _haversine_rad(o[:, 0, None], o[:, 1, None], d[None, :, 0], d[None, :, 1])
+
+
+def distancias_haversine_pares(origenes, destinos):
+    """
+    Distancias haversine fila a fila en km: origenes[i] -> destinos[i].
+
+    Returns:
+        Array (n,) de distancias.
+    """
+    o = np.radians(_como_puntos(origenes))
+    d = np.radians(_como_puntos(destinos))
+    return _haversine_rad(o[:, 0], o[:, 1], d[:, 0], d[:, 1])
+
+
+def _haversine_rad(lat1, lon1, lat2, lon2):
+    """Núcleo haversine sobre arrays ya convertidos a radianes (con broadcasting)."""
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
@@ -0,0 +1,166 @@
+"""
+Libro de servicios particionado por día.
+
+Sustituye a la lista única `servicios_control`: cada día tiene su propia
+partición en memoria. Al cerrar un día su partición se sella: se serializa
+como JSONL comprimido con gzip (en `directorio` si se configura, o como
+bytes en memoria si no), se libera la lista y en el índice queda solo un
+resumen (registros, aceptados, ingresos, km y segmentos). Así la memoria de
+un despliegue largo es la de un día, y los días sellados se pueden seguir
+leyendo.
+
+Los registros que llegan tarde para un día ya sellado (un viaje que termina
+después del cierre) abren un segmento nuevo de ese día que se sella en el
+siguiente cierre.
+
+Se comporta como la lista anterior para quien solo añade e itera
+(append, len, iteración en orden de día).
+"""
+import gzip
+import json
+import os
+import threading
+
+VARIABLE_DIRECTORIO = "UNIETAXI_HISTORICO"
+ARCHIVO_INDICE = "indice.json"
+# Carpeta de la web y del motor si no se configura otra: un proceso que vive
+# días no debe acumular los sellados en memoria
+DIRECTORIO_SERVICIO = "historico_servicios"
+
+
+class LibroServicios:
+    """
+    Registros de servicios particionados por `dia`.
+
+    Args:
+        directorio: carpeta de los días sellados (None = comprimidos en memoria)
+        nivel_compresion: nivel de gzip (1-9)
+    """
+
+    def __init__(self, directorio=None, nivel_compresion=6):
+        self.directorio = directorio
+        self.nivel_compresion = nivel_compresion
+        self._abiertas = {}     # dia -> [registros] sin sellar
+        self._sellados = {}     # dia -> [bytes gzip] (solo sin directorio)
+        self.indice = {}        # dia -> resumen de lo sellado
+        self._mutex = threading.Lock()
+        if directorio is not None:
+            os.makedirs(directorio, exist_ok=True)
+            ruta = os.path.join(directorio, ARCHIVO_INDICE)
+            if os.path.exists(ruta):
+                with open(ruta, encoding="utf-8") as f:
+                    self.indice = {int(dia): resumen for dia, resumen in json.load(f).items()}
+
+    @classmethod
+    def desde_entorno(cls, defecto=None):
+        """Libro en UNIETAXI_HISTORICO, o en `defecto` (None = en memoria) si no está."""
+        return cls(os.environ.get(VARIABLE_DIRECTORIO) or defecto)
+
+    # === Interfaz de lista ===
+
+    def append(self, registro):
+        with self._mutex:
+            self._abiertas.setdefault(registro["dia"], []).append(registro)
+
+    def __len__(self):
+        with self._mutex:
+            return (sum(len(p) for p in self._abiertas.values())
+                    + sum(r["registros"] for r in self.indice.values()))
+
+    def __iter__(self):
+        """Todos los registros, día a día (los sellados se leen de nuevo)."""
+        for dia in self.dias():
+            yield from self.leer_dia(dia)
+
+    # === Días ===
+
+    def dias(self):
+        with self._mutex:
+            return sorted(set(self._abiertas) | set(self.indice))
+
+    def ultimo_dia_sellado(self):
+        """Último día con algo sellado (0 si ninguno)."""
+        with self._mutex:
+            return max(self.indice, default=0)
+
+    def en_memoria(self):
+        """Registros sin sellar (lo que ocupa memoria)."""
+        with self._mutex:
+            return sum(len(p) for p in self._abiertas.values())
+
+    def leer_dia(self, dia):
+        """Registros de un día: los sellados (descomprimidos) y los abiertos."""
+        with self._mutex:
+            segmentos = list(self._sellados.get(dia, ())) if self.directorio is None else \
+                list(self.indice.get(dia, {}).get("segmentos", ()))
+            abiertos = list(self._abiertas.get(dia, ()))
+        registros = []
+        for segmento in segmentos:
+            registros.extend(self._leer_segmento(segmento))
+        return registros + abiertos
+
+    def cerrar_dia(self, dia):
+        """
+        Sella la partición de `dia` y todos los segmentos tardíos de días
+        anteriores.
+
+        Returns:
+            resumen del índice para `dia` (None si no tenía registros)
+        """
+        with self._mutex:
+            cerrar = [d for d in self._abiertas if d <= dia]
+            particiones = {d: self._abiertas.pop(d) for d in cerrar}
+        # La compresión (lo costoso) se hace fuera del lock
+        for d, registros in sorted(particiones.items()):
+            datos = self._comprimir(registros)
+            with self._mutex:
+                resumen = self.indice.setdefault(d, {
+                    "registros": 0, "aceptados": 0, "ingresos": 0.0, "km": 0.0,
+                    "bytes": 0, "segmentos": [],
+                })
+                segmento = f"servicios_dia_{d:04d}_{len(resumen['segmentos'])}.jsonl.gz"
+                if self.directorio is not None:
+                    with open(os.path.join(self.directorio, segmento), "wb") as f:
+                        f.write(datos)
+                else:
+                    self._sellados.setdefault(d, []).append(datos)
+                resumen["segmentos"].append(segmento)
+                resumen["registros"] += len(registros)
+                resumen["aceptados"] += sum(1 for r in registros if r["aceptado"])
+                resumen["ingresos"] = round(resumen["ingresos"] + sum(r["costo"] for r in registros), 2)
+                resumen["km"] = round(resumen["km"] + sum(r["km"] for r in registros), 3)
+                resumen["bytes"] += len(datos)
+        with self._mutex:
+            if self.directorio is not None and particiones:
+                self._guardar_indice()
+            return dict(self.indice[dia]) if dia in self.indice else None
+
+    # === Serialización ===
+
+    def _comprimir(self, registros):
+        texto = "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in registros)
+        return gzip.compress(texto.encode("utf-8"), compresslevel=self.nivel_compresion)
+
+    def _leer_segmento(self, segmento):
+        if isinstance(segmento, bytes):
+            datos = segmento
+        else:
+            with open(os.path.join(self.directorio, segmento), "rb") as f:
+                datos = f.read()
+        registros = []
+        for linea in gzip.decompress(datos).decode("utf-8").splitlines():
+            registro = json.loads(linea)
+            # JSON no tiene tuplas: las coordenadas vuelven como en memoria
+            for campo in ("origen", "destino"):
+                if isinstance(registro.get(campo), list):
+                    registro[campo] = tuple(registro[campo])
+            registros.append(registro)
+        return registros
+
+    def _guardar_indice(self):
+        """Escribe el índice de forma atómica (con el lock tomado)."""
+        ruta = os.path.join(self.directorio, ARCHIVO_INDICE)
+        temporal = ruta + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(self.indice, f, indent=1)
+        os.replace(temporal, ruta)
@@ -0,0 +1,169 @@
+"""
+Registro de métricas (contadores, medidores e histogramas) con exposición
+en formato de texto de Prometheus.
+
+Actualizar una métrica cuesta una suma bajo un lock propio de la métrica
+(los histogramas, además, una búsqueda binaria en sus cubetas fijas). Los
+medidores que reflejan estado del sistema se calculan al leerlos mediante
+una función, así que no cuestan nada en el camino caliente.
+"""
+import threading
+from bisect import bisect_left
+
+# Cubetas por defecto de latencias cortas (segundos)
+CUBETAS_LATENCIA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _formatear(valor):
+    if isinstance(valor, bool):
+        return "1" if valor else "0"
+    if isinstance(valor, int):
+        return str(valor)
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor))
+
+
+class Contador:
+    """Valor que solo crece."""
+    tipo = "counter"
+
+    def __init__(self, nombre, ayuda):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.valor = 0
+        self._mutex = threading.Lock()
+
+    def inc(self, cantidad=1):
+        with self._mutex:
+            self.valor += cantidad
+
+    def muestras(self):
+        return [(self.nombre, self.valor)]
+
+    def estado(self):
+        with self._mutex:
+            return {"valor": self.valor}
+
+    def fusionar(self, estado):
+        self.inc(estado["valor"])
+
+
+class Medidor:
+    """Valor que sube y baja; con `funcion` se calcula al leerlo."""
+    tipo = "gauge"
+
+    def __init__(self, nombre, ayuda, funcion=None):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.funcion = funcion
+        self.valor = 0
+
+    def fijar(self, valor):
+        self.valor = valor
+
+    def leer(self):
+        return self.funcion() if self.funcion is not None else self.valor
+
+    def muestras(self):
+        return [(self.nombre, self.leer())]
+
+
+class Histograma:
+    """Distribución con cubetas fijas (límites superiores inclusivos)."""
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, cubetas=CUBETAS_LATENCIA):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.cubetas = tuple(sorted(cubetas))
+        self.conteos = [0] * (len(self.cubetas) + 1)  # la última es +Inf
+        self.suma = 0.0
+        self.total = 0
+        self._mutex = threading.Lock()
+
+    def observar(self, valor):
+        i = bisect_left(self.cubetas, valor)
+        with self._mutex:
+            self.conteos[i] += 1
+            self.suma += valor
+            self.total += 1
+
+    def muestras(self):
+        with self._mutex:
+            conteos = list(self.conteos)
+            suma, total = self.suma, self.total
+        resultado = []
+        acumulado = 0
+        for limite, n in zip(self.cubetas + (float("inf"),), conteos):
+            acumulado += n
+            resultado.append((f'{self.nombre}_bucket{{le="{_formatear(limite)}"}}', acumulado))
+        resultado.append((f"{self.nombre}_sum", suma))
+        resultado.append((f"{self.nombre}_count", total))
+        return resultado
+
+    def estado(self):
+        with self._mutex:
+            return {"cubetas": self.cubetas, "conteos": list(self.conteos),
+                    "suma": self.suma, "total": self.total}
+
+    def fusionar(self, estado):
+        if tuple(estado["cubetas"]) != self.cubetas:
+            raise ValueError(f"Cubetas distintas al fusionar {self.nombre}")
+        with self._mutex:
+            for i, n in enumerate(estado["conteos"]):
+                self.conteos[i] += n
+            self.suma += estado["suma"]
+            self.total += estado["total"]
+
+
+class RegistroMetricas:
+    """Conjunto de métricas con nombre único."""
+
+    def __init__(self):
+        self._metricas = {}
+        self._mutex = threading.Lock()
+
+    def _registrar(self, metrica):
+        with self._mutex:
+            if metrica.nombre in self._metricas:
+                raise ValueError(f"Métrica duplicada: {metrica.nombre}")
+            self._metricas[metrica.nombre] = metrica
+        return metrica
+
+    def contador(self, nombre, ayuda):
+        return self._registrar(Contador(nombre, ayuda))
+
+    def medidor(self, nombre, ayuda, funcion=None):
+        return self._registrar(Medidor(nombre, ayuda, funcion))
+
+    def histograma(self, nombre, ayuda, cubetas=CUBETAS_LATENCIA):
+        return self._registrar(Histograma(nombre, ayuda, cubetas))
+
+    def obtener(self, nombre):
+        return self._metricas[nombre]
+
+    def instantanea(self):
+        """
+        Estado serializable de contadores e histogramas (los medidores
+        reflejan el estado del sistema que los lee y no se copian).
+        """
+        return {metrica.nombre: metrica.estado() for metrica in list(self._metricas.values())
+                if hasattr(metrica, "estado")}
+
+    def fusionar(self, instantanea):
+        """Suma a este registro una instantánea de otro (p. ej. de otro proceso)."""
+        for nombre, estado in instantanea.items():
+            metrica = self._metricas.get(nombre)
+            if metrica is not None:
+                metrica.fusionar(estado)
+
+    def exportar_prometheus(self):
+        """Texto en el formato de exposición de Prometheus (versión 0.0.4)."""
+        lineas = []
+        for metrica in list(self._metricas.values()):
+            lineas.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+            lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+            for nombre, valor in metrica.muestras():
+                lineas.append(f"{nombre} {_formatear(valor)}")
+        return "\n".join(lineas) + "\n"
@@ -0,0 +1,122 @@
+"""
+Locks instrumentados para medir contención.
+
+`LockInstrumentado` se comporta como threading.Lock y además cuenta
+adquisiciones, tiempo de espera, tiempo retenido y los hilos que más tiempo
+lo retuvieron. Las estadísticas se actualizan mientras se tiene el propio
+lock, así que no necesitan otro mutex.
+
+Es opcional: `crear_lock` devuelve un threading.Lock normal si la
+instrumentación está desactivada, de modo que no hay coste alguno.
+"""
+import heapq
+import os
+import threading
+import time
+
+# Variable de entorno que activa la instrumentación por defecto
+VARIABLE_ENTORNO = "UNIETAXI_PERFIL_LOCKS"
+
+
+def instrumentacion_activada():
+    return os.environ.get(VARIABLE_ENTORNO, "").lower() in ("1", "true", "si", "sí")
+
+
+def crear_lock(nombre, instrumentado=False):
+    """threading.Lock normal o LockInstrumentado según `instrumentado`."""
+    return LockInstrumentado(nombre) if instrumentado else threading.Lock()
+
+
+class LockInstrumentado:
+    """
+    Lock con estadísticas de espera y retención.
+
+    Args:
+        nombre: nombre que aparece en los resúmenes
+        max_retenciones: cuántas de las retenciones más largas se guardan
+    """
+
+    def __init__(self, nombre, max_retenciones=5):
+        self.nombre = nombre
+        self.max_retenciones = max_retenciones
+        self._lock = threading.Lock()
+        self._t_adquirido = 0.0
+        self.adquisiciones = 0
+        self.contenciones = 0          # adquisiciones que tuvieron que esperar
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.retencion_total = 0.0
+        self.retencion_max = 0.0
+        self._retenciones_largas = []  # heap de (segundos, hilo)
+
+    def acquire(self, blocking=True, timeout=-1):
+        # Intento sin bloqueo primero: si sale bien no hubo contención
+        if self._lock.acquire(False):
+            espera = 0.0
+        else:
+            if not blocking:
+                return False
+            t0 = time.perf_counter()
+            if not self._lock.acquire(True, timeout):
+                return False
+            espera = time.perf_counter() - t0
+            self.contenciones += 1
+        # Desde aquí tenemos el lock: las estadísticas son nuestras
+        self.adquisiciones += 1
+        self.espera_total += espera
+        if espera > self.espera_max:
+            self.espera_max = espera
+        self._t_adquirido = time.perf_counter()
+        return True
+
+    def release(self):
+        retencion = time.perf_counter() - self._t_adquirido
+        self.retencion_total += retencion
+        if retencion > self.retencion_max:
+            self.retencion_max = retencion
+        entrada = (retencion, threading.current_thread().name)
+        if len(self._retenciones_largas) < self.max_retenciones:
+            heapq.heappush(self._retenciones_largas, entrada)
+        elif retencion > self._retenciones_largas[0][0]:
+            heapq.heapreplace(self._retenciones_largas, entrada)
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def resumen(self):
+        """Estadísticas en milisegundos (lectura sin lock: valores aproximados)."""
+        n = self.adquisiciones or 1
+        return {
+            "adquisiciones": self.adquisiciones,
+            "contenciones": self.contenciones,
+            "espera_total_ms": round(self.espera_total * 1000, 3),
+            "espera_media_ms": round(self.espera_total / n * 1000, 4),
+            "espera_max_ms": round(self.espera_max * 1000, 3),
+            "retencion_total_ms": round(self.retencion_total * 1000, 3),
+            "retencion_media_ms": round(self.retencion_total / n * 1000, 4),
+            "retencion_max_ms": round(self.retencion_max * 1000, 3),
+            "retenciones_largas": [
+                {"hilo": hilo, "ms": round(segundos * 1000, 3)}
+                for segundos, hilo in sorted(self._retenciones_largas, reverse=True)
+            ],
+        }
+
+
+def formatear_resumen(resumenes):
+    """Tabla de texto con el resumen de varios locks {nombre: resumen}."""
+    lineas = [f"{'lock':<26}{'adq.':>8}{'cont.':>8}{'espera ms':>12}{'máx':>9}"
+              f"{'retenido ms':>13}{'máx':>9}  más largo"]
+    for nombre, r in resumenes.items():
+        mas_largo = r["retenciones_largas"][0]["hilo"] if r["retenciones_largas"] else "-"
+        lineas.append(f"{nombre:<26}{r['adquisiciones']:>8}{r['contenciones']:>8}"
+                      f"{r['espera_total_ms']:>12.1f}{r['espera_max_ms']:>9.2f}"
+                      f"{r['retencion_total_ms']:>13.1f}{r['retencion_max_ms']:>9.2f}  {mas_largo}")
+    return "\n".join(lineas)
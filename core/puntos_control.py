@@ -0,0 +1,283 @@
+"""
+Puntos de control del estado de SistemaCentral y arranque en caliente.
+
+Un punto de control guarda lo que se pierde al reiniciar: estadísticas de
+la flota (calificación, viajes, viajes_hoy, ganancia, posición), ganancia
+por taxi, frecuencia y calificación de los clientes (también los
+desalojados a la base SQLite del registro, así que el punto de control no
+depende de ese archivo), contadores y resúmenes diarios de
+SistemaAsignacion y el top-K del día.
+
+La captura no retiene los locks de despacho mientras recorre a los
+clientes: bajo mutex_servicio (que serializa los finales de viaje) se copian
+la flota y los contadores y se activa un registro de deshacer. Los clientes
+se leen después sin lock; si un viaje termina mientras tanto, su valor
+anterior queda en el registro de deshacer y se usa ese, así que el
+resultado es exactamente el estado del instante de la captura.
+
+Formato: un .npz sin comprimir con columnas NumPy (flota y clientes) y el
+resto como JSON en un array de bytes. Se escribe en un temporal y se
+renombra, y se conservan los últimos `conservar` archivos.
+
+Los servicios_control no entran: tienen su propio histórico por días
+(core/libro_servicios.py, UNIETAXI_HISTORICO).
+"""
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from .cliente_mejorado import ClienteMejorado
+from .taxi import Taxi
+
+VARIABLE_DIRECTORIO = "UNIETAXI_CHECKPOINTS"
+VARIABLE_INTERVALO = "UNIETAXI_CHECKPOINT_INTERVALO"
+VERSION_FORMATO = 1
+
+# Columnas numéricas de la flota, en este orden
+CAMPOS_TAXI = ("pos_x", "pos_y", "calificacion_media", "numero_viajes", "ganancia_acumulada",
+               "viajes_hoy", "velocidad_kph", "tiempo_desde_ultimo_viaje")
+
+
+def _array_ids(ids):
+    """Ids enteros como int64 y cualquier otro tipo como texto."""
+    if all(type(i) is int for i in ids):
+        return np.array(ids, dtype=np.int64)
+    return np.array([str(i) for i in ids], dtype=str)
+
+
+def capturar_estado(sistema):
+    """
+    Estado de `sistema` en el instante en que se toma mutex_servicio.
+
+    Returns:
+        dict con arrays NumPy ("taxis_*", "clientes_*") y "estado" (JSON)
+    """
+    asignacion = sistema.sistema_asignacion
+    with sistema.mutex_servicio:
+        t0 = time.perf_counter()
+        deshacer = {}
+        sistema._deshacer_clientes = deshacer
+        taxis = sistema.turnos.todos()
+        numeros = np.array([
+            (t.posicion[0], t.posicion[1], t.calificacion_media, t.numero_viajes, t.ganancia_acumulada,
+             t.viajes_hoy, t.velocidad_kph, t.tiempo_desde_ultimo_viaje)
+            for t in taxis
+        ], dtype=np.float64).reshape(len(taxis), len(CAMPOS_TAXI))
+        conductor = asignacion.conductor_mas_viajes_hoy
+        cliente = asignacion.cliente_mas_frecuente_hoy
+        estado = {
+            "version": VERSION_FORMATO,
+            "creado": time.time(),
+            "dia_actual": sistema.dia_actual,
+            "ganancia_total_diaria": sistema.ganancia_total_diaria,
+            "ganancia_por_taxi": list(sistema.ganancia_por_taxi.items()),
+            "servicios_seguimiento": [dict(s) for s in sistema.servicios_seguimiento],
+            "version_reportes": sistema.version_reportes,
+            "asignacion": {
+                "viajes_totales_hoy": asignacion.viajes_totales_hoy,
+                "ganancias_totales_hoy": asignacion.ganancias_totales_hoy,
+                "ganancias_tarifa_alta_hoy": asignacion.ganancias_tarifa_alta_hoy,
+                "conductor_mas_viajes_hoy": [conductor[0].id_taxi, conductor[1]] if conductor else None,
+                "cliente_mas_frecuente_hoy": [cliente[0].id_cliente, cliente[1]] if cliente else None,
+                "resumen_diarios": list(asignacion.resumen_diarios),
+                "destacados": asignacion.destacados.exportar(),
+            },
+        }
+        pausa = time.perf_counter() - t0
+    try:
+        # Sin mutex_servicio: los finales de viaje siguen y anotan lo que cambian
+        clientes, desalojados = sistema.clientes_mejorados.instantanea()
+        ids = [c.id_cliente for c in clientes]
+        nombres = [c._nombre for c in clientes]
+        valores = [(c.frecuencia, c.calificacion_promedio) for c in clientes]
+    finally:
+        with sistema.mutex_servicio:
+            sistema._deshacer_clientes = None
+    for i, id_cliente in enumerate(ids):
+        anterior = deshacer.get(id_cliente)
+        if anterior is not None:
+            valores[i] = anterior
+    # Desalojados: un cliente recargado, modificado y desalojado de nuevo
+    # durante la captura también deja su valor anterior en `deshacer`
+    deshacer_texto = {str(k): v for k, v in deshacer.items()}
+    for id_cliente, nombre, frecuencia, calificacion in desalojados:
+        ids.append(id_cliente)
+        nombres.append(nombre)
+        valores.append(deshacer_texto.get(id_cliente, (frecuencia, calificacion)))
+    # Los clientes sin viajes ni nombre (recién creados) no aportan nada
+    conservar = [i for i, (frecuencia, _) in enumerate(valores) if frecuencia > 0 or nombres[i] is not None]
+    return {
+        "taxis_id": _array_ids([t.id_taxi for t in taxis]),
+        "taxis_nombre": np.array([t.nombre for t in taxis], dtype=str),
+        "taxis_placa": np.array([t.placa for t in taxis], dtype=str),
+        "taxis_numeros": numeros,
+        "clientes_id": _array_ids([ids[i] for i in conservar]),
+        "clientes_nombre": np.array([nombres[i] or "" for i in conservar], dtype=str),
+        "clientes_numeros": np.array([valores[i] for i in conservar], dtype=np.float64).reshape(-1, 2),
+        "estado": np.frombuffer(json.dumps(estado, ensure_ascii=False).encode("utf-8"), dtype=np.uint8),
+        "pausa_ms": np.float64(pausa * 1000),
+    }
+
+
+def guardar_estado(capturado, ruta):
+    """Escribe un estado capturado de forma atómica."""
+    temporal = ruta + ".tmp"
+    with open(temporal, "wb") as f:
+        np.savez(f, **capturado)
+    os.replace(temporal, ruta)
+
+
+def cargar_estado(ruta):
+    with np.load(ruta) as datos:
+        capturado = {k: datos[k] for k in datos.files}
+    capturado["estado"] = json.loads(capturado["estado"].tobytes().decode("utf-8"))
+    return capturado
+
+
+def restaurar_estado(sistema, capturado):
+    """
+    Vuelca un estado cargado en `sistema`. Los taxis que ya existen (mismo
+    id) recuperan sus estadísticas; los que faltan se crean.
+    """
+    estado = capturado["estado"]
+    asignacion = sistema.sistema_asignacion
+    with sistema.mutex_servicio:
+        por_id = {t.id_taxi: t for t in sistema.turnos.todos()}
+        for id_taxi, nombre, placa, fila in zip(capturado["taxis_id"].tolist(), capturado["taxis_nombre"].tolist(),
+                                                 capturado["taxis_placa"].tolist(), capturado["taxis_numeros"]):
+            campos = dict(zip(CAMPOS_TAXI, fila.tolist()))
+            taxi = por_id.get(id_taxi)
+            if taxi is None:
+                taxi = Taxi(id_taxi, nombre, placa, campos["velocidad_kph"], sistema)
+                sistema.taxis.append(taxi)
+                sistema.turnos.registrar(taxi)
+                por_id[id_taxi] = taxi
+            taxi.posicion = (campos["pos_x"], campos["pos_y"])
+            taxi.calificacion_media = campos["calificacion_media"]
+            taxi.numero_viajes = int(campos["numero_viajes"])
+            taxi.ganancia_acumulada = campos["ganancia_acumulada"]
+            taxi.viajes_hoy = int(campos["viajes_hoy"])
+            taxi.velocidad_kph = campos["velocidad_kph"]
+            taxi.tiempo_desde_ultimo_viaje = campos["tiempo_desde_ultimo_viaje"]
+
+        sistema.dia_actual = estado["dia_actual"]
+        sistema.ganancia_total_diaria = estado["ganancia_total_diaria"]
+        sistema.ganancia_por_taxi = {id_taxi: ganancia for id_taxi, ganancia in estado["ganancia_por_taxi"]}
+        sistema.servicios_seguimiento = [
+            {**s, "origen": tuple(s["origen"]), "destino": tuple(s["destino"])}
+            for s in estado["servicios_seguimiento"]
+        ]
+        sistema.version_reportes = estado["version_reportes"] + 1
+
+        a = estado["asignacion"]
+        asignacion.viajes_totales_hoy = a["viajes_totales_hoy"]
+        asignacion.ganancias_totales_hoy = a["ganancias_totales_hoy"]
+        asignacion.ganancias_tarifa_alta_hoy = a["ganancias_tarifa_alta_hoy"]
+        asignacion.resumen_diarios = a["resumen_diarios"]
+        asignacion.destacados.importar(a["destacados"])
+        conductor = a["conductor_mas_viajes_hoy"]
+        asignacion.conductor_mas_viajes_hoy = (
+            (por_id[conductor[0]], conductor[1]) if conductor and conductor[0] in por_id else None
+        )
+
+    clientes = [
+        ClienteMejorado(id_cliente, nombre or None, int(frecuencia), calificacion)
+        for id_cliente, nombre, (frecuencia, calificacion) in zip(
+            capturado["clientes_id"].tolist(), capturado["clientes_nombre"].tolist(),
+            capturado["clientes_numeros"].tolist())
+    ]
+    sistema.clientes_mejorados.cargar(clientes)
+    cliente = a["cliente_mas_frecuente_hoy"]
+    asignacion.cliente_mas_frecuente_hoy = (
+        (sistema.clientes_mejorados.obtener(cliente[0]), cliente[1]) if cliente else None
+    )
+    asignacion.version += 1
+    return len(clientes)
+
+
+class PuntosControl:
+    """
+    Guarda puntos de control periódicos en un directorio y restaura el último.
+
+    Args:
+        directorio: carpeta de los puntos de control (None = desactivado)
+        intervalo: segundos entre puntos de control automáticos
+        conservar: cuántos archivos se guardan (se borran los más antiguos)
+    """
+
+    def __init__(self, directorio=None, intervalo=60.0, conservar=3):
+        self.directorio = directorio
+        self.intervalo = intervalo
+        self.conservar = conservar
+        self._hilo = None
+        self._parar = threading.Event()
+        self._mutex = threading.Lock()
+        self.ultimo = None              # ruta del último punto de control escrito
+
+    @classmethod
+    def desde_entorno(cls):
+        return cls(os.environ.get(VARIABLE_DIRECTORIO) or None,
+                   float(os.environ.get(VARIABLE_INTERVALO, "60")))
+
+    @property
+    def activo(self):
+        return self.directorio is not None
+
+    def archivos(self):
+        """Puntos de control existentes, del más antiguo al más reciente."""
+        if not self.activo:
+            return []
+        return sorted(glob.glob(os.path.join(self.directorio, "checkpoint_*.npz")))
+
+    def guardar(self, sistema):
+        """Captura y escribe un punto de control; devuelve su ruta."""
+        if not self.activo:
+            return None
+        with self._mutex:
+            os.makedirs(self.directorio, exist_ok=True)
+            t0 = time.perf_counter()
+            capturado = capturar_estado(sistema)
+            nombre = f"checkpoint_{datetime.now():%Y%m%d_%H%M%S_%f}.npz"
+            ruta = os.path.join(self.directorio, nombre)
+            guardar_estado(capturado, ruta)
+            for viejo in self.archivos()[:-self.conservar]:
+                os.remove(viejo)
+            self.ultimo = ruta
+            print(f"[PuntosControl] Guardado {nombre} ({len(capturado['taxis_id'])} taxis, "
+                  f"{len(capturado['clientes_id'])} clientes) en {time.perf_counter() - t0:.2f}s, "
+                  f"pausa {float(capturado['pausa_ms']):.1f} ms")
+            return ruta
+
+    def restaurar_ultimo(self, sistema):
+        """Restaura el punto de control más reciente, si hay alguno."""
+        archivos = self.archivos()
+        if not archivos:
+            return None
+        t0 = time.perf_counter()
+        capturado = cargar_estado(archivos[-1])
+        n_clientes = restaurar_estado(sistema, capturado)
+        print(f"[PuntosControl] Restaurado {os.path.basename(archivos[-1])} "
+              f"({len(capturado['taxis_id'])} taxis, {n_clientes} clientes) en {time.perf_counter() - t0:.2f}s")
+        return archivos[-1]
+
+    def iniciar(self, sistema):
+        """Arranca el hilo de puntos de control periódicos."""
+        if not self.activo or self._hilo is not None:
+            return
+        self._hilo = threading.Thread(target=self._bucle, args=(sistema,), name="PuntosControl", daemon=True)
+        self._hilo.start()
+
+    def _bucle(self, sistema):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.guardar(sistema)
+            except OSError as e:
+                print(f"[PuntosControl] No se pudo guardar: {e}")
+
+    def detener(self):
+        self._parar.set()
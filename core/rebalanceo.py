@@ -0,0 +1,164 @@
+"""
+Reposicionamiento periódico de taxis libres hacia la demanda prevista.
+
+Al terminar un viaje el taxi se queda libre donde dejó al cliente, así que
+la oferta se acumula en las zonas de destino y las recogidas en otras zonas
+quedan lejos. Cada `intervalo` segundos el rebalanceador:
+
+1. Prevé la demanda por zona con los orígenes de las solicitudes de la
+   última `ventana` (rejilla de zonas de core/zonas.py).
+2. Reparte los taxis libres en proporción a esa demanda (objetivo) y
+   calcula el hueco por zona: objetivo - taxis libres que hay (o que ya
+   van hacia ella).
+3. Asigna taxis de las zonas con sobrante a las zonas con falta con el
+   método del menor coste del problema de transporte: se recorren los
+   pares (taxi, zona) de menor a mayor distancia y se acepta cada uno
+   mientras al taxi no se le haya dado destino, a la zona le falten taxis
+   y a la de origen le sobren. No es óptimo, pero con pocas zonas queda
+   cerca y cuesta un argsort.
+
+El taxi va hacia el centro de la demanda reciente de su zona destino y
+sigue disponible mientras se mueve; si recibe un viaje, el movimiento se
+cancela (Taxi.reposicionar).
+"""
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from .zonas import Rejilla
+
+VARIABLE_INTERVALO = "UNIETAXI_REBALANCEO"
+
+
+class Rebalanceador(Rejilla):
+    """
+    Args:
+        intervalo: segundos entre rondas (None = desactivado)
+        ventana: segundos de solicitudes recientes que forman la demanda
+        filas, columnas, ancho_km, alto_km, origen_x, origen_y: rejilla de zonas
+        distancia_max_km: no se mueve un taxi más de esta distancia
+        minimo_solicitudes: por debajo de este número en la ventana no se mueve nada
+        reloj: fuente de tiempo (segundos monotónicos)
+    """
+
+    def __init__(self, intervalo=None, ventana=300.0, filas=5, columnas=5, ancho_km=10.0, alto_km=10.0,
+                 origen_x=0.0, origen_y=0.0, distancia_max_km=5.0, minimo_solicitudes=5,
+                 reloj=time.monotonic):
+        super().__init__(filas, columnas, ancho_km, alto_km, origen_x, origen_y)
+        self.intervalo = intervalo
+        self.ventana = ventana
+        self.distancia_max_km = distancia_max_km
+        self.minimo_solicitudes = minimo_solicitudes
+        self.reloj = reloj
+        self._origenes = deque()     # (instante, x, y)
+        self._mutex = threading.Lock()
+        self._hilo = None
+        self._parar = threading.Event()
+        self.movimientos_totales = 0
+
+    @classmethod
+    def desde_entorno(cls):
+        intervalo = os.environ.get(VARIABLE_INTERVALO)
+        return cls(float(intervalo) if intervalo else None)
+
+    @property
+    def activo(self):
+        return self.intervalo is not None
+
+    def registrar_solicitud(self, origen):
+        with self._mutex:
+            self._origenes.append((self.reloj(), origen[0], origen[1]))
+
+    def demanda(self):
+        """
+        Demanda reciente por zona.
+
+        Returns:
+            (solicitudes por zona, centro (x, y) de sus orígenes por zona)
+        """
+        limite = self.reloj() - self.ventana
+        with self._mutex:
+            while self._origenes and self._origenes[0][0] < limite:
+                self._origenes.popleft()
+            origenes = np.array([(x, y) for _, x, y in self._origenes], dtype=np.float64).reshape(-1, 2)
+        zonas = self.zonas_de(origenes)
+        cuentas = np.bincount(zonas, minlength=self.num_zonas)
+        # Centro de la demanda; las zonas sin solicitudes se quedan con el centro de la celda
+        centros = self.centroides()
+        con_datos = cuentas > 0
+        for eje in (0, 1):
+            suma = np.bincount(zonas, weights=origenes[:, eje], minlength=self.num_zonas)
+            centros[con_datos, eje] = suma[con_datos] / cuentas[con_datos]
+        return cuentas, centros
+
+    def planificar(self, taxis):
+        """
+        Movimientos de una ronda.
+
+        Returns:
+            lista de (taxi, destino)
+        """
+        cuentas, centros = self.demanda()
+        total = int(cuentas.sum())
+        libres = [t for t in taxis if t.disponible]
+        if total < self.minimo_solicitudes or not libres:
+            return []
+
+        # Un taxi que ya se reposiciona cuenta en su zona destino y no se vuelve a mover
+        puntos = [t.destino_reposicion or t.posicion for t in libres]
+        zona_taxi = self.zonas_de(puntos)
+        oferta = np.bincount(zona_taxi, minlength=self.num_zonas)
+        objetivo = len(libres) * cuentas / total
+        faltan = np.floor(objetivo - oferta).clip(min=0).astype(np.int64)
+        sobran = np.floor(oferta - objetivo).clip(min=0).astype(np.int64)
+        if not faltan.any() or not sobran.any():
+            return []
+
+        moviles = [i for i, t in enumerate(libres)
+                   if sobran[zona_taxi[i]] > 0 and t.destino_reposicion is None]
+        destinos = np.flatnonzero(faltan)
+        if not moviles:
+            return []
+        posiciones = np.array([libres[i].posicion for i in moviles], dtype=np.float64)
+        distancias = np.hypot(posiciones[:, 0:1] - centros[destinos, 0],
+                              posiciones[:, 1:2] - centros[destinos, 1])
+
+        movimientos = []
+        asignado = np.zeros(len(moviles), dtype=bool)
+        for plano in np.argsort(distancias, axis=None, kind="stable"):
+            m, d = divmod(int(plano), len(destinos))
+            if distancias[m, d] > self.distancia_max_km:
+                break
+            zona_origen, zona_destino = zona_taxi[moviles[m]], destinos[d]
+            if asignado[m] or faltan[zona_destino] == 0 or sobran[zona_origen] == 0:
+                continue
+            asignado[m] = True
+            faltan[zona_destino] -= 1
+            sobran[zona_origen] -= 1
+            movimientos.append((libres[moviles[m]], tuple(centros[zona_destino].tolist())))
+        return movimientos
+
+    def rebalancear(self, sistema):
+        """Ejecuta una ronda sobre los taxis de turno de `sistema`; devuelve los taxis movidos."""
+        movidos = sum(1 for taxi, destino in self.planificar(list(sistema.taxis)) if taxi.reposicionar(destino))
+        self.movimientos_totales += movidos
+        if movidos:
+            print(f"[Rebalanceo] {movidos} taxis libres hacia zonas con más demanda")
+        return movidos
+
+    def iniciar(self, sistema):
+        """Arranca el hilo de rondas periódicas."""
+        if not self.activo or self._hilo is not None:
+            return
+        self._hilo = threading.Thread(target=self._bucle, args=(sistema,), name="Rebalanceo", daemon=True)
+        self._hilo.start()
+
+    def _bucle(self, sistema):
+        while not self._parar.wait(self.intervalo):
+            self.rebalancear(sistema)
+
+    def detener(self):
+        self._parar.set()
@@ -0,0 +1,482 @@
+"""
+Motor de rutas local sobre una red vial cargada desde archivo.
+
+Las consultas punto a punto usan A* con landmarks (ALT): se precalculan
+distancias (en tiempo) desde y hacia unos pocos nodos de referencia y la
+desigualdad triangular da una cota inferior admisible mucho más ajustada
+que la línea recta. Las rutas recientes se guardan en una caché LRU.
+
+Formato del archivo de red (una entrada por línea, separada por comas):
+    N, id, x, y                         -> nodo con coordenadas en km
+    A, origen, destino, km, velocidad   -> arista dirigida (velocidad en km/h)
+    D, origen, destino, km, velocidad   -> arista de doble sentido
+Las líneas vacías o que empiezan por '#' se ignoran.
+
+Uso como benchmark offline:
+    python -m core.red_vial --filas 60 --columnas 60 --consultas 2000
+"""
+import heapq
+import random
+import threading
+import time
+from collections import OrderedDict
+from math import inf
+
+import numpy as np
+
+from .distancias import distancia_euclidiana, distancias_euclidianas
+
+
+class RedVial:
+    """
+    Grafo dirigido de calles con pesos en km y segundos.
+
+    Atributos:
+        coords: array (n, 2) con la posición (x, y) de cada nodo.
+        ids: identificador original de cada nodo (según el archivo).
+        velocidad_acceso_kph: velocidad para el tramo entre un punto
+            arbitrario y el nodo de la red más cercano.
+    """
+
+    def __init__(self, velocidad_acceso_kph=20, tamano_cache=10000):
+        self.ids = []
+        self._indice = {}          # id original -> índice interno
+        self._xy = []
+        self.coords = np.empty((0, 2), dtype=np.float64)
+        # Listas de adyacencia: nodo -> [(vecino, km, segundos), ...]
+        self._ady = []
+        self._ady_inv = []
+        self.velocidad_acceso_kph = velocidad_acceso_kph
+
+        # Landmarks (ALT): por nodo, tupla de segundos desde/hacia cada landmark
+        self.landmarks = []
+        self._desde_lm = []
+        self._hacia_lm = []
+
+        # Caché LRU de rutas nodo -> nodo
+        self.tamano_cache = tamano_cache
+        self._cache = OrderedDict()
+        self._mutex_cache = threading.Lock()
+        self.cache_aciertos = 0
+        self.cache_fallos = 0
+
+    # === Construcción ===
+
+    def agregar_nodo(self, id_nodo, x, y):
+        """Añade un nodo y devuelve su índice interno."""
+        if id_nodo in self._indice:
+            return self._indice[id_nodo]
+        idx = len(self.ids)
+        self.ids.append(id_nodo)
+        self._indice[id_nodo] = idx
+        self._xy.append((float(x), float(y)))
+        self._ady.append([])
+        self._ady_inv.append([])
+        return idx
+
+    def agregar_arista(self, origen, destino, km, velocidad_kph, doble_sentido=False):
+        """Añade una arista entre dos nodos ya existentes (por id original)."""
+        u = self._indice[origen]
+        v = self._indice[destino]
+        segundos = km / max(velocidad_kph, 1e-6) * 3600
+        self._ady[u].append((v, km, segundos))
+        self._ady_inv[v].append((u, km, segundos))
+        if doble_sentido:
+            self._ady[v].append((u, km, segundos))
+            self._ady_inv[u].append((v, km, segundos))
+
+    def preparar(self, num_landmarks=8):
+        """
+        Finaliza la construcción: fija el array de coordenadas y precalcula
+        los landmarks. Debe llamarse tras añadir nodos/aristas.
+        """
+        self.coords = np.asarray(self._xy, dtype=np.float64).reshape(-1, 2)
+        self._limpiar_cache()
+        self._precalcular_landmarks(num_landmarks)
+        return self
+
+    @property
+    def num_nodos(self):
+        return len(self.ids)
+
+    @property
+    def num_aristas(self):
+        return sum(len(a) for a in self._ady)
+
+    # === Persistencia ===
+
+    @classmethod
+    def cargar(cls, filepath, num_landmarks=8, **kwargs):
+        """Carga una red desde archivo de texto (ver formato en el módulo)."""
+        red = cls(**kwargs)
+        aristas = []
+        with open(filepath, 'r', encoding='utf-8') as f:
+            for num_linea, linea in enumerate(f, 1):
+                linea = linea.strip()
+                if not linea or linea.startswith('#'):
+                    continue
+                partes = [p.strip() for p in linea.split(',')]
+                tipo = partes[0].upper()
+                try:
+                    if tipo == 'N':
+                        red.agregar_nodo(int(partes[1]), float(partes[2]), float(partes[3]))
+                    elif tipo in ('A', 'D'):
+                        aristas.append((int(partes[1]), int(partes[2]),
+                                        float(partes[3]), float(partes[4]), tipo == 'D'))
+                    else:
+                        raise ValueError(f"tipo de línea desconocido '{partes[0]}'")
+                except (IndexError, ValueError) as e:
+                    raise ValueError(f"[RedVial] Línea {num_linea} inválida en {filepath}: {e}") from e
+        # Las aristas se añaden al final para permitir nodos declarados después
+        for u, v, km, vel, doble in aristas:
+            red.agregar_arista(u, v, km, vel, doble_sentido=doble)
+        return red.preparar(num_landmarks)
+
+    def guardar(self, filepath):
+        """Guarda la red en el formato de texto del módulo."""
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write("# Red vial UNIETAXI: N, id, x, y / A, origen, destino, km, velocidad\n")
+            for idx, id_nodo in enumerate(self.ids):
+                x, y = self._xy[idx]
+                f.write(f"N, {id_nodo}, {x:.6f}, {y:.6f}\n")
+            for u, aristas in enumerate(self._ady):
+                for v, km, segundos in aristas:
+                    vel = km / segundos * 3600 if segundos > 0 else 0.0
+                    f.write(f"A, {self.ids[u]}, {self.ids[v]}, {km:.6f}, {vel:.3f}\n")
+
+    # === Landmarks (ALT) ===
+
+    def _dijkstra(self, fuente, adyacencia):
+        """Dijkstra completo en segundos desde un nodo. Devuelve lista de tiempos."""
+        dist = [inf] * self.num_nodos
+        dist[fuente] = 0.0
+        heap = [(0.0, fuente)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            for v, _km, seg in adyacencia[u]:
+                nd = d + seg
+                if nd < dist[v]:
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return dist
+
+    def tiempos_desde_nodo(self, fuente):
+        """
+        Árbol de caminos más rápidos desde un nodo.
+
+        Returns:
+            (segundos, km): arrays (n,) con el tiempo mínimo a cada nodo y los
+            km de ese camino (inf si no es alcanzable).
+        """
+        n = self.num_nodos
+        dist = [inf] * n
+        km = [inf] * n
+        dist[fuente] = 0.0
+        km[fuente] = 0.0
+        heap = [(0.0, fuente)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            for v, km_arista, seg in self._ady[u]:
+                nd = d + seg
+                if nd < dist[v]:
+                    dist[v] = nd
+                    km[v] = km[u] + km_arista
+                    heapq.heappush(heap, (nd, v))
+        return np.array(dist), np.array(km)
+
+    def _precalcular_landmarks(self, num_landmarks):
+        """
+        Selecciona landmarks por el criterio del más lejano (empezando por un
+        nodo aleatorio) y guarda los tiempos desde/hacia cada uno.
+        """
+        n = self.num_nodos
+        self.landmarks = []
+        self._desde_lm = [()] * n
+        self._hacia_lm = [()] * n
+        if n == 0 or num_landmarks <= 0:
+            return
+
+        desde, hacia = [], []
+        candidato = random.Random(0).randrange(n)
+        minimo = [inf] * n
+        for _ in range(min(num_landmarks, n)):
+            self.landmarks.append(candidato)
+            d_desde = self._dijkstra(candidato, self._ady)
+            d_hacia = self._dijkstra(candidato, self._ady_inv)
+            desde.append(d_desde)
+            hacia.append(d_hacia)
+            # Siguiente landmark: el nodo alcanzable más alejado de los ya elegidos
+            mejor, mejor_d = None, -1.0
+            for v in range(n):
+                if d_desde[v] < minimo[v]:
+                    minimo[v] = d_desde[v]
+                if minimo[v] != inf and minimo[v] > mejor_d and v not in self.landmarks:
+                    mejor, mejor_d = v, minimo[v]
+            if mejor is None:
+                break
+            candidato = mejor
+
+        self._desde_lm = list(zip(*desde))
+        self._hacia_lm = list(zip(*hacia))
+
+    def _heuristica(self, v, desde_t, hacia_t):
+        """Cota inferior ALT del tiempo de v al destino t."""
+        h = 0.0
+        for dv, dt in zip(self._hacia_lm[v], hacia_t):
+            # d(v, t) >= d(v, L) - d(t, L)
+            if dv != inf and dt != inf and dv - dt > h:
+                h = dv - dt
+        for dv, dt in zip(self._desde_lm[v], desde_t):
+            # d(v, t) >= d(L, t) - d(L, v)
+            if dv != inf and dt != inf and dt - dv > h:
+                h = dt - dv
+        return h
+
+    # === Consultas ===
+
+    def nodo_mas_cercano(self, punto):
+        """Índice del nodo de la red más cercano a un punto (x, y)."""
+        return int(np.argmin(distancias_euclidianas(punto, self.coords)))
+
+    def nodos_mas_cercanos(self, puntos):
+        """Índices de los nodos más cercanos a varios puntos (vectorizado)."""
+        pts = np.asarray(puntos, dtype=np.float64).reshape(-1, 2)
+        dx = pts[:, 0, None] - self.coords[None, :, 0]
+        dy = pts[:, 1, None] - self.coords[None, :, 1]
+        return np.argmin(dx * dx + dy * dy, axis=1)
+
+    def ruta_nodos(self, u, v):
+        """
+        Ruta más rápida entre dos nodos con A* + landmarks.
+
+        Returns:
+            dict con 'km', 'segundos' y 'nodos' (tupla de índices), o None
+            si el destino no es alcanzable. Es una copia: la caché guarda su
+            propio dict y los nodos son inmutables.
+        """
+        clave = (u, v)
+        with self._mutex_cache:
+            ruta = self._cache.get(clave)
+            if ruta is not None:
+                self._cache.move_to_end(clave)
+                self.cache_aciertos += 1
+                return dict(ruta)
+            self.cache_fallos += 1
+
+        ruta = self._a_estrella(u, v)
+        if ruta is not None:
+            with self._mutex_cache:
+                self._cache[clave] = ruta
+                if len(self._cache) > self.tamano_cache:
+                    self._cache.popitem(last=False)
+            return dict(ruta)
+        return ruta
+
+    def _a_estrella(self, u, v):
+        if u == v:
+            return {"km": 0.0, "segundos": 0.0, "nodos": (u,)}
+
+        desde_t = self._desde_lm[v]
+        hacia_t = self._hacia_lm[v]
+        g = {u: 0.0}
+        km = {u: 0.0}
+        previo = {u: None}
+        cerrados = set()
+        heap = [(self._heuristica(u, desde_t, hacia_t), 0.0, u)]
+
+        while heap:
+            _f, d, x = heapq.heappop(heap)
+            if x in cerrados:
+                continue
+            if x == v:
+                nodos = []
+                while x is not None:
+                    nodos.append(x)
+                    x = previo[x]
+                nodos.reverse()
+                return {"km": km[v], "segundos": g[v], "nodos": tuple(nodos)}
+            cerrados.add(x)
+            for y, km_arista, seg in self._ady[x]:
+                nd = d + seg
+                if nd < g.get(y, inf):
+                    g[y] = nd
+                    km[y] = km[x] + km_arista
+                    previo[y] = x
+                    heapq.heappush(heap, (nd + self._heuristica(y, desde_t, hacia_t), nd, y))
+        return None
+
+    def ruta(self, origen, destino):
+        """
+        Ruta entre dos puntos (x, y) arbitrarios. Añade el tramo de acceso
+        en línea recta entre cada punto y su nodo más cercano.
+
+        Returns:
+            dict con 'km' y 'segundos'. Si no hay ruta por la red, se usa la
+            línea recta a la velocidad de acceso.
+        """
+        u = self.nodo_mas_cercano(origen)
+        v = self.nodo_mas_cercano(destino)
+        ruta = self.ruta_nodos(u, v)
+        if ruta is None:
+            km = distancia_euclidiana(origen, destino)
+            return {"km": km, "segundos": km / self.velocidad_acceso_kph * 3600}
+
+        km_acceso = (distancia_euclidiana(origen, self._xy[u])
+                     + distancia_euclidiana(self._xy[v], destino))
+        return {
+            "km": ruta["km"] + km_acceso,
+            "segundos": ruta["segundos"] + km_acceso / self.velocidad_acceso_kph * 3600,
+        }
+
+    def tiempos_hacia(self, destino, origenes):
+        """
+        Tiempos y km desde varios orígenes hacia un mismo destino (p. ej.
+        taxis hacia un cliente). Hace un único Dijkstra inverso desde el
+        destino que se detiene al alcanzar todos los orígenes.
+
+        Returns:
+            (km, segundos): arrays (n,) alineados con `origenes`.
+        """
+        pts = np.asarray(origenes, dtype=np.float64).reshape(-1, 2)
+        n = len(pts)
+        if n == 0:
+            return np.zeros(0), np.zeros(0)
+
+        t = self.nodo_mas_cercano(destino)
+        nodos_origen = self.nodos_mas_cercanos(pts)
+        pendientes = set(int(x) for x in nodos_origen)
+
+        dist = {t: 0.0}
+        km = {t: 0.0}
+        cerrados = set()
+        heap = [(0.0, t)]
+        while heap and pendientes:
+            d, x = heapq.heappop(heap)
+            if x in cerrados:
+                continue
+            cerrados.add(x)
+            pendientes.discard(x)
+            for y, km_arista, seg in self._ady_inv[x]:
+                nd = d + seg
+                if nd < dist.get(y, inf):
+                    dist[y] = nd
+                    km[y] = km[x] + km_arista
+                    heapq.heappush(heap, (nd, y))
+
+        km_red = np.array([km.get(int(x), inf) for x in nodos_origen])
+        seg_red = np.array([dist.get(int(x), inf) for x in nodos_origen])
+        # Tramos de acceso: origen -> su nodo y nodo destino -> destino
+        acceso = (np.hypot(*(pts - self.coords[nodos_origen]).T)
+                  + distancia_euclidiana(self._xy[t], destino))
+        return km_red + acceso, seg_red + acceso / self.velocidad_acceso_kph * 3600
+
+    def _limpiar_cache(self):
+        with self._mutex_cache:
+            self._cache.clear()
+            self.cache_aciertos = 0
+            self.cache_fallos = 0
+
+
+def generar_ciudad_cuadricula(filas=20, columnas=20, ancho_km=10.0, alto_km=10.0,
+                              velocidad_calle=30, velocidad_avenida=60,
+                              cada_avenida=5, prob_sentido_unico=0.0,
+                              semilla=0, num_landmarks=8):
+    """
+    Genera una ciudad sintética en cuadrícula sobre el plano del simulador.
+
+    Las calles van a `velocidad_calle` y cada `cada_avenida` filas/columnas
+    hay una avenida más rápida. Con `prob_sentido_unico` > 0 algunas calles
+    (nunca avenidas) pasan a ser de sentido único alternando dirección.
+    """
+    rng = random.Random(semilla)
+    red = RedVial()
+    dx = ancho_km / max(columnas - 1, 1)
+    dy = alto_km / max(filas - 1, 1)
+
+    def nid(i, j):
+        return i * columnas + j
+
+    for i in range(filas):
+        for j in range(columnas):
+            red.agregar_nodo(nid(i, j), j * dx, i * dy)
+
+    for i in range(filas):
+        for j in range(columnas):
+            # Tramo horizontal (fila i) y vertical (columna j)
+            if j + 1 < columnas:
+                avenida = i % cada_avenida == 0
+                vel = velocidad_avenida if avenida else velocidad_calle
+                if not avenida and rng.random() < prob_sentido_unico:
+                    u, v = (nid(i, j), nid(i, j + 1)) if i % 2 else (nid(i, j + 1), nid(i, j))
+                    red.agregar_arista(u, v, dx, vel)
+                else:
+                    red.agregar_arista(nid(i, j), nid(i, j + 1), dx, vel, doble_sentido=True)
+            if i + 1 < filas:
+                avenida = j % cada_avenida == 0
+                vel = velocidad_avenida if avenida else velocidad_calle
+                if not avenida and rng.random() < prob_sentido_unico:
+                    u, v = (nid(i, j), nid(i + 1, j)) if j % 2 else (nid(i + 1, j), nid(i, j))
+                    red.agregar_arista(u, v, dy, vel)
+                else:
+                    red.agregar_arista(nid(i, j), nid(i + 1, j), dy, vel, doble_sentido=True)
+
+    return red.preparar(num_landmarks)
+
+
+def _benchmark(argv=None):
+    """Mide preparación, consultas A*+ALT frente a Dijkstra y la caché."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark del motor de rutas")
+    parser.add_argument("--filas", type=int, default=60)
+    parser.add_argument("--columnas", type=int, default=60)
+    parser.add_argument("--landmarks", type=int, default=8)
+    parser.add_argument("--consultas", type=int, default=1000)
+    parser.add_argument("--sentido-unico", type=float, default=0.3)
+    parser.add_argument("--guardar", help="Ruta donde guardar la red generada")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    red = generar_ciudad_cuadricula(args.filas, args.columnas,
+                                    prob_sentido_unico=args.sentido_unico,
+                                    num_landmarks=args.landmarks)
+    t_prep = time.perf_counter() - t0
+    print(f"Red: {red.num_nodos} nodos, {red.num_aristas} aristas, "
+          f"{len(red.landmarks)} landmarks (preparación {t_prep:.2f}s)")
+    if args.guardar:
+        red.guardar(args.guardar)
+        print(f"Red guardada en {args.guardar}")
+
+    rng = random.Random(1)
+    pares = [(rng.randrange(red.num_nodos), rng.randrange(red.num_nodos))
+             for _ in range(args.consultas)]
+
+    t0 = time.perf_counter()
+    for u, v in pares:
+        red._a_estrella(u, v)
+    t_alt = time.perf_counter() - t0
+
+    muestra = pares[:max(1, args.consultas // 20)]
+    t0 = time.perf_counter()
+    for u, _v in muestra:
+        red._dijkstra(u, red._ady)
+    t_dij = (time.perf_counter() - t0) / len(muestra) * len(pares)
+
+    for u, v in pares:
+        red.ruta_nodos(u, v)
+    t0 = time.perf_counter()
+    for u, v in pares:
+        red.ruta_nodos(u, v)
+    t_cache = time.perf_counter() - t0
+
+    print(f"A*+ALT:          {t_alt / len(pares) * 1e3:.3f} ms/consulta")
+    print(f"Dijkstra (est.): {t_dij / len(pares) * 1e3:.3f} ms/consulta")
+    print(f"Caché caliente:  {t_cache / len(pares) * 1e6:.1f} µs/consulta")
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,208 @@
+"""
+Registro de clientes con memoria acotada.
+
+Los clientes (ClienteMejorado, con __slots__) se guardan en un diccionario
+ordenado por uso reciente. Si se fija una capacidad, al superarla los
+clientes menos usados se vuelcan en una base SQLite local y se liberan de
+memoria; cuando vuelven a pedir taxi se recargan de forma transparente.
+Los clientes con un viaje en curso están fijados y no se desalojan.
+
+Los ids de texto se internan para que el registro y las solicitudes
+compartan una única copia de cada id.
+"""
+import os
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+
+from .cliente_mejorado import ClienteMejorado
+
+VARIABLE_CAPACIDAD = "UNIETAXI_CLIENTES_MAX"
+VARIABLE_RUTA = "UNIETAXI_CLIENTES_DB"
+
+
+def _internar(id_cliente):
+    return sys.intern(id_cliente) if type(id_cliente) is str else id_cliente
+
+
+class RegistroClientes:
+    """
+    Diccionario id -> ClienteMejorado con desalojo LRU a disco.
+
+    Args:
+        capacidad: clientes máximos en memoria (None = sin límite, sin disco)
+        ruta: archivo SQLite para los clientes desalojados
+        fraccion_desalojo: al superar la capacidad se desaloja hasta dejar
+            capacidad * (1 - fraccion) clientes, en una sola transacción
+    """
+
+    def __init__(self, capacidad=None, ruta="clientes.db", fraccion_desalojo=0.1):
+        self.capacidad = capacidad
+        self.ruta = ruta
+        self.fraccion_desalojo = fraccion_desalojo
+        self._clientes = OrderedDict()
+        self._fijados = {}             # id -> viajes en curso
+        self._db = None
+        self._en_disco = 0
+        self._mutex = threading.Lock()
+        self.desalojos = 0
+        self.recargas = 0
+        if capacidad is not None and os.path.exists(ruta):
+            self._conexion()  # clientes desalojados en una ejecución anterior
+
+    @classmethod
+    def desde_entorno(cls):
+        capacidad = os.environ.get(VARIABLE_CAPACIDAD)
+        return cls(int(capacidad) if capacidad else None,
+                   os.environ.get(VARIABLE_RUTA, "clientes.db"))
+
+    # === Interfaz de diccionario ===
+
+    def __contains__(self, id_cliente):
+        with self._mutex:
+            return id_cliente in self._clientes or self._leer_disco(id_cliente) is not None
+
+    def __getitem__(self, id_cliente):
+        cliente = self.get(id_cliente)
+        if cliente is None:
+            raise KeyError(id_cliente)
+        return cliente
+
+    def __setitem__(self, id_cliente, cliente):
+        id_cliente = _internar(id_cliente)
+        cliente.id_cliente = id_cliente
+        with self._mutex:
+            self._clientes[id_cliente] = cliente
+            self._clientes.move_to_end(id_cliente)
+            self._borrar_disco(id_cliente)
+            self._desalojar_si_hace_falta()
+
+    def __len__(self):
+        with self._mutex:
+            return len(self._clientes) + self._en_disco
+
+    def get(self, id_cliente, defecto=None):
+        """Cliente en memoria o recargado de disco; `defecto` si no existe."""
+        with self._mutex:
+            cliente = self._buscar(id_cliente)
+            if cliente is None:
+                return defecto
+            self._desalojar_si_hace_falta()
+            return cliente
+
+    def obtener(self, id_cliente):
+        """Cliente con ese id, creándolo (frecuencia 0) si es nuevo."""
+        with self._mutex:
+            cliente = self._buscar(id_cliente)
+            if cliente is None:
+                id_cliente = _internar(id_cliente)
+                cliente = ClienteMejorado(id_cliente, nombre=None, frecuencia=0)
+                self._clientes[id_cliente] = cliente
+            self._desalojar_si_hace_falta()
+            return cliente
+
+    def valores(self):
+        """Clientes en memoria (los desalojados ya están en disco)."""
+        with self._mutex:
+            return list(self._clientes.values())
+
+    def instantanea(self):
+        """
+        Clientes en memoria y filas (id, nombre, frecuencia, calificacion) de
+        los desalojados a disco, tomados en el mismo instante (puntos de
+        control). Los ids de disco vuelven como texto.
+        """
+        with self._mutex:
+            filas = [] if self._en_disco == 0 else self._conexion().execute(
+                "SELECT id, nombre, frecuencia, calificacion FROM clientes").fetchall()
+            return list(self._clientes.values()), filas
+
+    def cargar(self, clientes):
+        """Añade muchos clientes de una vez (restauración de un punto de control)."""
+        with self._mutex:
+            for cliente in clientes:
+                cliente.id_cliente = _internar(cliente.id_cliente)
+                self._clientes[cliente.id_cliente] = cliente
+                self._borrar_disco(cliente.id_cliente)
+            self._desalojar_si_hace_falta()
+
+    @property
+    def en_memoria(self):
+        return len(self._clientes)
+
+    # === Viajes en curso ===
+
+    def fijar(self, id_cliente):
+        """Impide desalojar al cliente mientras tenga un viaje en curso."""
+        with self._mutex:
+            self._fijados[id_cliente] = self._fijados.get(id_cliente, 0) + 1
+
+    def liberar(self, id_cliente):
+        with self._mutex:
+            n = self._fijados.get(id_cliente, 0) - 1
+            if n > 0:
+                self._fijados[id_cliente] = n
+            else:
+                self._fijados.pop(id_cliente, None)
+
+    # === Memoria y disco (con el lock tomado) ===
+
+    def _buscar(self, id_cliente):
+        cliente = self._clientes.get(id_cliente)
+        if cliente is not None:
+            self._clientes.move_to_end(id_cliente)
+            return cliente
+        fila = self._leer_disco(id_cliente)
+        if fila is None:
+            return None
+        # Recarga transparente: vuelve a memoria como el más reciente
+        id_cliente = _internar(id_cliente)
+        cliente = ClienteMejorado(id_cliente, fila[0], fila[1], fila[2])
+        self._clientes[id_cliente] = cliente
+        self._borrar_disco(id_cliente)
+        self.recargas += 1
+        return cliente
+
+    def _conexion(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.ruta, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS clientes ("
+                             "id TEXT PRIMARY KEY, nombre TEXT, frecuencia INTEGER, calificacion REAL)")
+            self._en_disco = self._db.execute("SELECT COUNT(*) FROM clientes").fetchone()[0]
+        return self._db
+
+    def _leer_disco(self, id_cliente):
+        if self.capacidad is None:
+            return None
+        return self._conexion().execute(
+            "SELECT nombre, frecuencia, calificacion FROM clientes WHERE id = ?",
+            (str(id_cliente),)).fetchone()
+
+    def _borrar_disco(self, id_cliente):
+        if self.capacidad is None or self._en_disco == 0:
+            return
+        cursor = self._conexion().execute("DELETE FROM clientes WHERE id = ?", (str(id_cliente),))
+        self._en_disco -= cursor.rowcount
+
+    def _desalojar_si_hace_falta(self):
+        if self.capacidad is None or len(self._clientes) <= self.capacidad:
+            return
+        objetivo = int(self.capacidad * (1 - self.fraccion_desalojo))
+        filas = []
+        # Como mucho una vuelta completa: los fijados vuelven al final
+        for _ in range(len(self._clientes)):
+            if len(self._clientes) <= objetivo:
+                break
+            id_cliente, cliente = self._clientes.popitem(last=False)
+            if id_cliente in self._fijados:
+                self._clientes[id_cliente] = cliente
+                continue
+            filas.append((str(id_cliente), cliente._nombre, cliente.frecuencia,
+                          cliente.calificacion_promedio))
+        if filas:
+            db = self._conexion()
+            with db:
+                db.executemany("INSERT OR REPLACE INTO clientes VALUES (?, ?, ?, ?)", filas)
+            self._en_disco += len(filas)
+            self.desalojos += len(filas)
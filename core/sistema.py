@@ -1,3 +1,4 @@
+import atexit
 import threading
 import time
 from typing import List, Dict, Tuple
@@ -5,14 +6,64 @@ import hashlib
 from .taxi import Taxi, SolicitudServicio
 from .sistema_asignacion import SistemaAsignacion
 from .cliente_mejorado import ClienteMejorado
+from .registro_clientes import RegistroClientes
 from .clientes_simulados import GestorClientesSimulados
+from .tickets import GestorTickets
+from .difusion_flota import DifusorFlota
+from .perfil_locks import crear_lock, instrumentacion_activada, formatear_resumen
+from .metricas import RegistroMetricas
+from .trazas import Trazador, marcar
+from .analitica import TablaServicios
+from .libro_servicios import LibroServicios
+from .puntos_control import PuntosControl
+from .turnos import GestorTurnos
+from .viajes_compartidos import PlanificadorCompartido
+from .rebalanceo import Rebalanceador
 
 
 class SistemaCentral:
-    def __init__(self):
+    """
+    Orquestador central. La construcción es barata: no arranca ningún hilo.
+    El monitor de hora y los clientes simulados se arrancan con iniciar(),
+    que se llama solo en el primer uso, y cada Taxi arranca su hilo al
+    recibir su primer viaje.
+
+    Args:
+        red_vial: RedVial opcional para rutas por calles
+        matriz_zonas: MatrizZonas opcional para ETAs O(1)
+        taxis_demo: añadir los 3 taxis de demostración
+        clientes_simulados: número de clientes simulados que generan tráfico
+        tarifa_zonal: TarifaZonal opcional para tarifa dinámica por zona
+        registro_clientes: RegistroClientes (None lee UNIETAXI_CLIENTES_MAX y
+            UNIETAXI_CLIENTES_DB; por defecto sin límite y sin disco)
+        instrumentar_locks: medir espera y retención de los mutex (None lee
+            la variable de entorno UNIETAXI_PERFIL_LOCKS)
+        trazador: Trazador para las trazas por solicitud (None lee
+            UNIETAXI_TRAZAS y UNIETAXI_TRAZAS_MUESTREO)
+        libro_servicios: LibroServicios para servicios_control (None lee
+            UNIETAXI_HISTORICO; sin él, los días sellados quedan comprimidos en
+            memoria). Con un histórico en disco de una ejecución anterior y sin
+            punto de control, dia_actual sigue tras el último día sellado
+        puntos_control: PuntosControl para guardar y restaurar el estado (None
+            lee UNIETAXI_CHECKPOINTS y UNIETAXI_CHECKPOINT_INTERVALO); si hay un
+            punto de control previo se restaura al crear el sistema
+        viajes_compartidos: PlanificadorCompartido para que un taxi lleve varias
+            solicitudes a la vez (None lee UNIETAXI_COMPARTIDO; por defecto desactivado)
+        rebalanceo: Rebalanceador que mueve taxis libres hacia la demanda (None
+            lee UNIETAXI_REBALANCEO, segundos entre rondas; por defecto desactivado)
+    """
+    def __init__(self, red_vial=None, matriz_zonas=None, taxis_demo=False, clientes_simulados=0,
+                 instrumentar_locks=None, trazador=None, tarifa_zonal=None,
+                 registro_clientes=None, libro_servicios=None, puntos_control=None,
+                 viajes_compartidos=None, rebalanceo=None):
         # Listas compartidas
-        self.taxis: List[Taxi] = []
-        self.servicios_control: List[Dict] = []      # Todas las solicitudes realizadas
+        self.taxis: List[Taxi] = []   # Taxis de turno (los que entran en la asignación)
+        # Flota completa y turnos por día (ver core/turnos.py)
+        self.turnos = GestorTurnos(self)
+        # Todas las solicitudes realizadas, particionadas por día (ver cerrar_dia)
+        self.servicios_control: LibroServicios = (
+            libro_servicios if libro_servicios is not None else LibroServicios.desde_entorno()
+        )
         self.servicios_seguimiento: List[Dict] = []  # Hasta 5 servicios por día
         self.ganancia_total_diaria: float = 0.0
         self.ganancia_por_taxi: Dict[int, float] = {}
@@ -22,17 +73,26 @@ class SistemaCentral:
         # Contador de servicios activos (Recurso Crítico)
         self.servicios_activos: int = 0
         
+        # Instrumentación opcional de los mutex (ver core/perfil_locks.py);
+        # desactivada son threading.Lock normales
+        if instrumentar_locks is None:
+            instrumentar_locks = instrumentacion_activada()
+        self.locks_instrumentados = instrumentar_locks
+        
         # Mutex para proteger la asignación de taxis (evitar doble asignación)
-        self.mutex_match = threading.Lock()          # "mutexMatch"
+        self.mutex_match = crear_lock("mutex_match", instrumentar_locks)          # "mutexMatch"
         
         # Mutex para proteger la verificación de fin de día y contador de servicios
-        self.mutex_findeldia = threading.Lock()      # "mutexFindelDía"
+        self.mutex_findeldia = crear_lock("mutex_findeldia", instrumentar_locks)  # "mutexFindelDía"
         
         # Mutex para proteger la actualización de datos del taxi y estadísticas (sección crítica de escritura)
-        self.mutex_servicio = threading.Lock()       # "mutexServicio"
+        self.mutex_servicio = crear_lock("mutex_servicio", instrumentar_locks)    # "mutexServicio"
         
         # Mutex para proteger la lista de control de servicios
-        self.mutex_control_servicios = threading.Lock()  # "mutexControlServicios"
+        self.mutex_control_servicios = crear_lock("mutex_control_servicios", instrumentar_locks)  # "mutexControlServicios"
+        
+        if instrumentar_locks:
+            atexit.register(self.imprimir_resumen_locks)
 
         # Semáforos / Eventos
         self.no_hay_servicios_activos = threading.Semaphore(0)  # "noHayServiciosActivos"
@@ -41,20 +101,121 @@ class SistemaCentral:
         self.dia_actual = 1
 
         # Sistema de asignación avanzado (Senafiris, tarifas dinámicas, etc.)
-        self.sistema_asignacion = SistemaAsignacion()
+        self.sistema_asignacion = SistemaAsignacion(iniciar_monitor=False)
         # Pasar referencia al sistema central para el resumen diario
         self.sistema_asignacion._sistema_central = self
+        # Red vial opcional para rutas por calles (ver core/red_vial.py)
+        self.sistema_asignacion.red_vial = red_vial
+        # Matriz zona-a-zona opcional para ETAs O(1) (ver core/zonas.py)
+        self.sistema_asignacion.matriz_zonas = matriz_zonas
+        # Tarifa dinámica por zona opcional (ver core/tarifa_zonal.py)
+        self.sistema_asignacion.tarifa_zonal = tarifa_zonal
+        # Viajes compartidos opcionales (ver core/viajes_compartidos.py)
+        self.viajes_compartidos = (
+            viajes_compartidos if viajes_compartidos is not None else PlanificadorCompartido.desde_entorno()
+        )
+        # Reposicionamiento periódico de taxis libres (arranca con iniciar())
+        self.rebalanceo = rebalanceo if rebalanceo is not None else Rebalanceador.desde_entorno()
+        
+        # Versión de los datos de reportes: se incrementa en cada viaje completado.
+        # Las instantáneas de reportes se cachean por versión.
+        self.version_reportes: int = 0
+        self._snapshot_reportes = None
+        self._mutex_snapshot = threading.Lock()
+
+        # Tickets de solicitudes web y sus eventos (asignado, recogida, completado)
+        self.tickets = GestorTickets()
         
-        # Registro de clientes mejorados (para frecuencia y estrellas)
-        self.clientes_mejorados: Dict[str, ClienteMejorado] = {}
+        # Difusión en vivo del estado de la flota (el hilo arranca con el primer suscriptor)
+        self.difusor_flota = DifusorFlota(self)
         
-        # Gestor de clientes simulados (9 clientes + tú = 10)
+        # Métricas de operación (exportables en formato Prometheus)
+        self.metricas = RegistroMetricas()
+        self._registrar_metricas()
+        
+        # Trazas del ciclo de vida de cada solicitud (muestreadas, en JSONL)
+        self.trazador = trazador if trazador is not None else Trazador.desde_entorno()
+        
+        # Registro de clientes mejorados (para frecuencia y estrellas); se usa
+        # como un dict y puede desalojar clientes inactivos a disco
+        self.clientes_mejorados: RegistroClientes = (
+            registro_clientes if registro_clientes is not None else RegistroClientes.desde_entorno()
+        )
+        
+        # Gestor de clientes simulados (opcional; en la web 9 clientes + tú = 10)
         self.gestor_clientes_simulados = GestorClientesSimulados(self)
-        self.gestor_clientes_simulados.crear_clientes_simulados(9)
-        self.gestor_clientes_simulados.iniciar_todos()
+        if clientes_simulados:
+            self.gestor_clientes_simulados.crear_clientes_simulados(clientes_simulados)
+
+        # Taxis de prueba (opcional); sus hilos arrancan con el primer viaje
+        if taxis_demo:
+            self._inicializar_taxis_demo()
 
-        # Inicializar algunos taxis de prueba
-        self._inicializar_taxis_demo()
+        # Puntos de control: arranque en caliente desde el último y guardado periódico
+        # (registro de deshacer de clientes mientras se captura; ver core/puntos_control.py)
+        self._deshacer_clientes = None
+        self.puntos_control = puntos_control if puntos_control is not None else PuntosControl.desde_entorno()
+        if self.puntos_control.restaurar_ultimo(self) is None:
+            # Los registros nuevos no deben caer en días ya sellados del histórico
+            self.dia_actual = max(self.dia_actual, self.servicios_control.ultimo_dia_sellado() + 1)
+
+        self._iniciado = False
+        self._mutex_inicio = threading.Lock()
+
+    def iniciar(self):
+        """
+        Arranca los hilos de fondo (monitor de hora y clientes simulados).
+        Es idempotente y se llama automáticamente en el primer uso.
+        """
+        if self._iniciado:
+            return
+        with self._mutex_inicio:
+            if self._iniciado:
+                return
+            self.sistema_asignacion.asegurar_monitor()
+            if self.gestor_clientes_simulados.clientes_simulados:
+                self.gestor_clientes_simulados.iniciar_todos()
+            self.puntos_control.iniciar(self)
+            self.rebalanceo.iniciar(self)
+            self._iniciado = True
+
+    def _registrar_metricas(self):
+        m = self.metricas
+        self.m_solicitudes = m.contador("unietaxi_solicitudes_total", "Solicitudes de viaje recibidas")
+        self.m_aceptadas = m.contador("unietaxi_solicitudes_aceptadas_total", "Solicitudes con taxi asignado")
+        self.m_rechazadas = m.contador("unietaxi_solicitudes_rechazadas_total", "Solicitudes sin taxi disponible")
+        self.m_ingresos = m.contador("unietaxi_ingresos_euros_total", "Importe cobrado en viajes completados")
+        self.m_latencia_match = m.histograma("unietaxi_latencia_match_segundos",
+                                             "Tiempo de _match (espera del lock incluida)")
+        self.m_duracion_viaje = m.histograma("unietaxi_duracion_viaje_segundos",
+                                             "Duración simulada del viaje origen-destino",
+                                             cubetas=(60, 120, 300, 600, 900, 1200, 1800, 2700, 3600))
+        m.medidor("unietaxi_servicios_activos", "Servicios en curso",
+                  lambda: self.servicios_activos)
+        m.medidor("unietaxi_taxis_disponibles", "Taxis libres para asignar",
+                  lambda: sum(1 for t in list(self.taxis) if t.disponible))
+        m.medidor("unietaxi_taxis_total", "Taxis en la flota", lambda: len(self.taxis))
+        m.medidor("unietaxi_tarifa_alta", "1 si la tarifa alta está activa",
+                  lambda: self.sistema_asignacion.modo_tarifa_alta)
+
+    def resumen_locks(self):
+        """
+        Estadísticas de contención de los mutex del sistema.
+        
+        Returns:
+            {nombre: resumen} o {} si la instrumentación está desactivada
+        """
+        if not self.locks_instrumentados:
+            return {}
+        locks = (self.mutex_match, self.mutex_servicio,
+                 self.mutex_findeldia, self.mutex_control_servicios)
+        return {lock.nombre: lock.resumen() for lock in locks}
+
+    def imprimir_resumen_locks(self):
+        resumenes = self.resumen_locks()
+        if resumenes:
+            print("\n[Sistema] Contención de locks:")
+            print(formatear_resumen(resumenes))
 
     def _inicializar_taxis_demo(self):
         taxi1 = Taxi(1, "Ana", "ABC123", 50, self, posicion_inicial=(0, 0))
@@ -63,20 +224,31 @@ class SistemaCentral:
 
         self.taxis.extend([taxi1, taxi2, taxi3])
 
-        for t in self.taxis:
-            t.start()
-
     def procesar_solicitud_cliente(self, solicitud: SolicitudServicio):
+        self.iniciar()
+        self.trazador.iniciar(solicitud)
+        marcar(solicitud, "procesar")
 
         with self.mutex_findeldia:
             self.servicios_activos += 1
             print(f"[Sistema] Activando servicio. Servicios activos: {self.servicios_activos}")
 
+        self.m_solicitudes.inc()
+
         # Región crítica: match (no puede haber dos clientes haciendo match a la vez)
         # Se utiliza un Lock para asegurar EXCLUSIÓN MUTUA en la asignación.
+        t0 = time.perf_counter()
         taxi_asignado = self._match(solicitud)
+        self.m_latencia_match.observar(time.perf_counter() - t0)
+
+        tarifa_zonal = self.sistema_asignacion.tarifa_zonal
+        if tarifa_zonal is not None:
+            tarifa_zonal.registrar_solicitud(solicitud.origen, rechazada=taxi_asignado is None)
+        if self.rebalanceo.activo:
+            self.rebalanceo.registrar_solicitud(solicitud.origen)
 
         if taxi_asignado is None:
+            self.m_rechazadas.inc()
             # No se pudo asignar taxi
             print(f"[Sistema] No hay taxis disponibles para cliente {solicitud.id_cliente}")
             self._registrar_servicio_control(
@@ -87,12 +259,21 @@ class SistemaCentral:
                 calificacion=None,
                 aceptado=False
             )
+            self.notificar_evento(solicitud, "rechazado", {"motivo": "sin_taxis_disponibles"})
             # Desactivamos el servicio
             self._finalizar_servicio_sin_viaje()
+            marcar(solicitud, "fin")
+            self.trazador.cerrar(solicitud, aceptado=False)
         else:
+            self.m_aceptadas.inc()
             # El taxi seguirá el flujo y al terminar llamará a registrar_final_viaje()
             print(f"[Sistema] Taxi {taxi_asignado.id_taxi} asignado al cliente {solicitud.id_cliente}")
 
+    def notificar_evento(self, solicitud: SolicitudServicio, tipo: str, datos: Dict | None = None):
+        """Publica un evento en el ticket de la solicitud, si lo tiene."""
+        if solicitud.ticket is not None:
+            self.tickets.publicar(solicitud.ticket, tipo, datos)
+
     def convertir_direccion_a_coordenadas(self, direccion: str) -> tuple[float, float]:
         """
         Convierte una dirección tipo texto en unas coordenadas (x, y) ficticias
@@ -113,25 +294,27 @@ class SistemaCentral:
         Integra distancia, Senafiris y prioridad de clientes.
         """
         with self.mutex_match:
+            marcar(solicitud, "mutex_match")
+            tarifa_zonal = self.sistema_asignacion.tarifa_zonal
+            if tarifa_zonal is not None:
+                tarifa_zonal.sincronizar_flota(self.taxis)
             # Obtener o crear cliente mejorado para frecuencia/estrellas
             cliente_mejorado = self._obtener_cliente_mejorado(solicitud.id_cliente)
-            
-            # Crear objeto temporal con posición para el sistema de asignación
-            class ClienteTemp:
-                def __init__(self, cliente_mejorado, posicion):
-                    self.id_cliente = cliente_mejorado.id_cliente
-                    self.nombre = cliente_mejorado.nombre
-                    self.frecuencia = cliente_mejorado.frecuencia
-                    self.estrellas = cliente_mejorado.estrellas
-                    self.posicion = posicion
-            
-            cliente_temp = ClienteTemp(cliente_mejorado, solicitud.origen)
+            cliente_mejorado.posicion = solicitud.origen
             
             # Usar el sistema de asignación avanzado
             resultado = self.sistema_asignacion.seleccionar_conductor_para_cliente(
-                cliente_temp, self.taxis
+                cliente_mejorado, self.taxis
             )
             
+            # Con viajes compartidos, un taxi ocupado que pasa cerca puede ser más barato
+            insercion = None
+            if self.viajes_compartidos is not None:
+                insercion = self._insertar_compartido(solicitud, resultado)
+            
+            marcar(solicitud, "seleccionado")
+            if insercion is not None:
+                return self._asignar_compartido(solicitud, insercion)
             if resultado is None:
                 return None
             
@@ -146,30 +329,97 @@ class SistemaCentral:
             solicitud.tarifa_base = resultado["tarifa_base"]
             solicitud.tarifa_km = resultado["tarifa_km"]
             solicitud.motivo_seleccion = motivo
+            solicitud.multiplicador = resultado["multiplicador"]
+            if tarifa_zonal is not None:
+                tarifa_zonal.registrar_asignacion(taxi_seleccionado.posicion)
+            # No desalojar al cliente mientras dure el viaje
+            self.clientes_mejorados.fijar(solicitud.id_cliente)
             
-            if taxi_seleccionado is not None:
+            # Publicar antes de despertar al taxi para que 'asignado' preceda a 'recogida'
+            self.notificar_evento(solicitud, "asignado", {
+                "id_taxi": taxi_seleccionado.id_taxi,
+                "nombre": taxi_seleccionado.nombre,
+                "placa": taxi_seleccionado.placa,
+                "calificacion": round(taxi_seleccionado.calificacion_media, 1),
+                "viajes_hoy": taxi_seleccionado.viajes_hoy,
+                "motivo": motivo,
+                "distancia": resultado["distancia"],
+                "eta_recogida": resultado.get("eta_recogida"),
+                "multiplicador": resultado["multiplicador"],
+            })
+            marcar(solicitud, "asignado")
+            if self.viajes_compartidos is not None:
+                # Plan de paradas para poder compartir el viaje más adelante
+                taxi_seleccionado.anadir_paradas(solicitud, 0, 0)
+            else:
                 taxi_seleccionado.asignar_viaje(solicitud)
 
             return taxi_seleccionado
+
+    def _insertar_compartido(self, solicitud, resultado):
+        """
+        Inserta la solicitud en el plan de un taxi ocupado si añade menos km
+        que mandar el taxi libre de `resultado` (en vacío más el viaje).
+        Se llama con mutex_match tomado.
+
+        Returns:
+            la inserción aplicada (ver PlanificadorCompartido) o None
+        """
+        asignacion = self.sistema_asignacion
+
+        def distancia(a, b):
+            return asignacion.estimar_recorrido(a, b)[0]
+
+        ocupados = [t for t in self.taxis if not t.disponible]
+        insercion = self.viajes_compartidos.buscar(solicitud, ocupados, distancia)
+        if insercion is None:
+            return None
+        if resultado is not None and \
+                insercion["km_extra"] >= resultado["distancia"] + distancia(solicitud.origen, solicitud.destino):
+            return None
+        insercion = self.viajes_compartidos.insertar(insercion, solicitud, distancia)
+        if insercion is None:
+            return None
+        # La tarifa se lee al dejar al pasajero, mucho después de insertar
+        solicitud.tarifa_base, solicitud.tarifa_km = asignacion.obtener_tarifas()
+        solicitud.multiplicador = asignacion.obtener_multiplicador(solicitud.origen)
+        solicitud.motivo_seleccion = "compartido"
+        self.clientes_mejorados.fijar(solicitud.id_cliente)
+        return insercion
+
+    def _asignar_compartido(self, solicitud, insercion):
+        taxi = insercion["taxi"]
+        print(f"[Sistema] Taxi {taxi.id_taxi} comparte viaje con cliente {solicitud.id_cliente} "
+              f"(+{insercion['km_extra']:.2f} km de ruta, recogida a {insercion['km_hasta_recogida']:.2f} km)")
+        self.notificar_evento(solicitud, "asignado", {
+            "id_taxi": taxi.id_taxi,
+            "nombre": taxi.nombre,
+            "placa": taxi.placa,
+            "calificacion": round(taxi.calificacion_media, 1),
+            "viajes_hoy": taxi.viajes_hoy,
+            "motivo": "compartido",
+            "distancia": round(insercion["km_hasta_recogida"], 2),
+            "eta_recogida": None,
+            "multiplicador": solicitud.multiplicador,
+        })
+        marcar(solicitud, "asignado")
+        return taxi
     
     def _obtener_cliente_mejorado(self, id_cliente: str) -> ClienteMejorado:
         """
-        Obtiene o crea un ClienteMejorado para un cliente dado.
+        Obtiene o crea un ClienteMejorado para un cliente dado (recargándolo
+        de disco si fue desalojado).
         """
-        if id_cliente not in self.clientes_mejorados:
-            self.clientes_mejorados[id_cliente] = ClienteMejorado(
-                id_cliente=id_cliente,
-                nombre=f"Cliente-{id_cliente}",
-                frecuencia=0
-            )
-        return self.clientes_mejorados[id_cliente]
+        return self.clientes_mejorados.obtener(id_cliente)
 
     def registrar_final_viaje(self, taxi: Taxi, solicitud: SolicitudServicio,
-                              km: float, costo: float, calificacion: float):
+                              km: float, costo: float, calificacion: float,
+                              segundos_viaje: float | None = None):
         # Región crítica: modificación de servicios + seguimiento
         # Aquí se modifican múltiples estructuras compartidas (ganancia, listas),
         # por lo que se requiere sincronización estricta.
         with self.mutex_servicio:
+            marcar(solicitud, "mutex_servicio")
             # Sección Crítica: Actualización de estado del taxi
             taxi.actualizar_calificacion(calificacion)
             taxi.acumular_ganancia(costo)
@@ -185,6 +435,11 @@ class SistemaCentral:
             
             # Actualizar cliente mejorado (frecuencia y estrellas)
             cliente_mejorado = self._obtener_cliente_mejorado(solicitud.id_cliente)
+            deshacer = self._deshacer_clientes
+            if deshacer is not None and cliente_mejorado.id_cliente not in deshacer:
+                # Hay un punto de control leyendo clientes: guardar el valor de su instante
+                deshacer[cliente_mejorado.id_cliente] = (cliente_mejorado.frecuencia,
+                                                         cliente_mejorado.calificacion_promedio)
             cliente_mejorado.incrementar_frecuencia()
             cliente_mejorado.actualizar_calificacion(calificacion)
             
@@ -193,7 +448,9 @@ class SistemaCentral:
                 conductor=taxi,
                 cliente=cliente_mejorado,
                 km=km,
-                tarifa=costo
+                tarifa=costo,
+                origen=solicitud.origen,
+                destino=solicitud.destino
             )
 
             # Registro en servicios_control (todas las solicitudes)
@@ -219,11 +476,40 @@ class SistemaCentral:
             while len(self.servicios_seguimiento) > 5:
                 self.servicios_seguimiento.pop(0)
 
+            self.version_reportes += 1
+
+        marcar(solicitud, "contabilizado")
+        self.clientes_mejorados.liberar(solicitud.id_cliente)
+        self.m_ingresos.inc(costo)
+        if segundos_viaje is not None:
+            self.m_duracion_viaje.observar(segundos_viaje)
+
+        # El taxi queda libre en el destino salvo que le queden paradas de un
+        # viaje compartido (la tarifa zonal tiene su propio lock)
+        tarifa_zonal = self.sistema_asignacion.tarifa_zonal
+        if tarifa_zonal is not None and not taxi.tiene_paradas():
+            tarifa_zonal.registrar_liberacion(solicitud.destino)
+
+        # Refresco incremental de la matriz de zonas (tiene su propio lock)
+        self.sistema_asignacion.registrar_tiempo_viaje(solicitud.origen, solicitud.destino, segundos_viaje)
+
+        self.notificar_evento(solicitud, "completado", {
+            "id_taxi": taxi.id_taxi,
+            "km": round(km, 2),
+            "costo": costo,
+            "calificacion": calificacion,
+        })
+
         # Desactivación de servicio
         self._finalizar_servicio_con_viaje()
+        marcar(solicitud, "fin")
+        self.trazador.cerrar(solicitud, aceptado=True, id_taxi=taxi.id_taxi)
 
     def _registrar_servicio_control(self, solicitud, taxi_id, km, costo, calificacion, aceptado: bool):
+        asignacion = self.sistema_asignacion
+        hora = asignacion.obtener_hora_virtual().hour
         with self.mutex_control_servicios:
+            marcar(solicitud, "mutex_control_servicios")
             self.servicios_control.append({
                 "dia": solicitud.dia,
                 "id_taxi": taxi_id,
@@ -236,8 +522,48 @@ class SistemaCentral:
                 "costo": costo,
                 "calificacion": calificacion,
                 "aceptado": aceptado,
+                "motivo_seleccion": getattr(solicitud, "motivo_seleccion", None),
+                "hora": hora,
+                "tarifa_alta": aceptado and asignacion.modo_tarifa_alta,
             })
 
+    def cerrar_dia(self, dia=None):
+        """
+        Cierre del día: sella su partición de servicios_control (comprimida y
+        fuera de memoria) y reinicia el seguimiento y la ganancia diaria.
+
+        Returns:
+            resumen del día en el índice del libro (None si no hubo servicios)
+        """
+        dia = self.dia_actual if dia is None else dia
+        with self.mutex_servicio:
+            self.ganancia_total_diaria = 0.0
+            self.servicios_seguimiento = []
+            self.version_reportes += 1
+        # El libro tiene su propio lock y comprime sin bloquear los registros nuevos
+        resumen = self.servicios_control.cerrar_dia(dia)
+        if resumen:
+            print(f"[Sistema] Día {dia} sellado: {resumen['registros']} servicios, "
+                  f"{resumen['bytes']} bytes comprimidos")
+        self.puntos_control.guardar(self)
+        return resumen
+
+    def avanzar_dia(self):
+        """
+        Paso de día del reloj virtual (medianoche): las solicitudes nuevas van
+        al día siguiente y el día que termina se sella con cerrar_dia.
+        """
+        with self.mutex_servicio:
+            dia = self.dia_actual
+            self.dia_actual = dia + 1
+        return self.cerrar_dia(dia)
+
+    def tabla_servicios(self):
+        """Copia columnar de servicios_control para consultas (ver core.analitica)."""
+        with self.mutex_control_servicios:
+            registros = list(self.servicios_control)
+        return TablaServicios.desde_registros(registros, zonas=self.sistema_asignacion.matriz_zonas)
+
     def _registrar_servicio_seguimiento(self, solicitud, taxi_id, km, costo, calificacion):
         self.servicios_seguimiento.append({
             "dia": solicitud.dia,
@@ -250,7 +576,9 @@ class SistemaCentral:
             "km": km,
             "costo": costo,
             "calificacion": calificacion,
+            "motivo_seleccion": getattr(solicitud, "motivo_seleccion", None),
         })
+
     def _finalizar_servicio_con_viaje(self):
         with self.mutex_findeldia:
             self.servicios_activos -= 1
@@ -267,22 +595,67 @@ class SistemaCentral:
                 self.no_hay_servicios_activos.release()
 
     def obtener_reportes(self):
-        reportes_diarios = {
-            "dia": self.dia_actual,
-            "ganancia_total": self.ganancia_total_diaria,
-            "servicios_seguimiento": self.servicios_seguimiento,
-        }
-
-        reportes_mensuales = []
-        for taxi in self.taxis:
-            total_generado = self.ganancia_por_taxi.get(taxi.id_taxi, 0.0)
-            reportes_mensuales.append({
-                "id_taxi": taxi.id_taxi,
-                "nombre": taxi.nombre,
-                "placa": taxi.placa,
-                "total_generado": total_generado,
-                "ganancia_taxista": total_generado * 0.8,
-                "importe_mensual": total_generado * 0.2,
-            })
+        # Copia consistente bajo mutex_servicio (las listas cambian al completar viajes)
+        with self.mutex_servicio:
+            reportes_diarios = {
+                "dia": self.dia_actual,
+                "ganancia_total": self.ganancia_total_diaria,
+                "servicios_seguimiento": [dict(s) for s in self.servicios_seguimiento],
+            }
+
+            reportes_mensuales = []
+            for taxi in self.turnos.todos():
+                total_generado = self.ganancia_por_taxi.get(taxi.id_taxi, 0.0)
+                reportes_mensuales.append({
+                    "id_taxi": taxi.id_taxi,
+                    "nombre": taxi.nombre,
+                    "placa": taxi.placa,
+                    "total_generado": total_generado,
+                    "ganancia_taxista": total_generado * 0.8,
+                    "importe_mensual": total_generado * 0.2,
+                })
 
         return reportes_diarios, reportes_mensuales
+
+    def _clave_version_reportes(self):
+        """Todo lo que puede cambiar el contenido de /reportes."""
+        return (self.version_reportes, self.sistema_asignacion.version,
+                self.dia_actual, len(self.taxis))
+
+    def obtener_snapshot_reportes(self):
+        """
+        Devuelve la instantánea de reportes de la versión actual.
+
+        Las instantáneas son de solo lectura y se reutilizan mientras la versión
+        no cambie. No llevan la hora virtual, que avanza sin cambiar la versión
+        (ver ServicioDespacho.hora_virtual). Si varios hilos piden una versión
+        nueva a la vez, solo uno la construye y el resto espera y recibe la misma.
+        """
+        self.iniciar()
+        clave = self._clave_version_reportes()
+        snapshot = self._snapshot_reportes
+        if snapshot is not None and snapshot["clave"] == clave:
+            return snapshot
+
+        with self._mutex_snapshot:
+            # Doble comprobación: otro hilo pudo construirla mientras esperábamos
+            clave = self._clave_version_reportes()
+            snapshot = self._snapshot_reportes
+            if snapshot is not None and snapshot["clave"] == clave:
+                return snapshot
+
+            diarios, mensuales = self.obtener_reportes()
+            asignacion = self.sistema_asignacion
+            snapshot = {
+                "clave": clave,
+                "etag": "r" + "-".join(str(c) for c in clave),
+                "diarios": diarios,
+                "mensuales": mensuales,
+                "resumenes_diarios": list(asignacion.resumen_diarios),
+                "destacados_hoy": asignacion.destacados.listas(),
+                "destacados_ventana": asignacion.destacados.listas(ventana=True),
+                "dias_ventana": asignacion.destacados.dias,
+                "modo_tarifa_alta": asignacion.modo_tarifa_alta,
+            }
+            self._snapshot_reportes = snapshot
+            return snapshot
@@ -4,7 +4,11 @@ Sistema de asignación avanzado con Senafiris, tarifas dinámicas y resumen diar
 import time
 import threading
 from datetime import datetime, time as dt_time, timedelta
-from math import sqrt
+
+import numpy as np
+
+from .distancias import distancia_euclidiana, distancias_euclidianas, distancias_euclidianas_pares
+from .top_k import DestacadosDiarios
 
 
 class SistemaAsignacion:
@@ -16,8 +20,14 @@ class SistemaAsignacion:
     - Generación de resumen diario a las 00:00
     """
 
-    def __init__(self):
-        """Inicializa el sistema de asignación."""
+    def __init__(self, iniciar_monitor=True):
+        """
+        Inicializa el sistema de asignación.
+        
+        Args:
+            iniciar_monitor: si es False, el hilo de monitoreo de hora no se
+                arranca hasta llamar a asegurar_monitor()
+        """
         self.tarifa_base_normal = 0.5  # € de arranque
         self.tarifa_km_normal = 1.0    # € por km (hora normal)
         self.tarifa_base_alta = 1.0    # € de arranque (tarifa alta)
@@ -27,6 +37,14 @@ class SistemaAsignacion:
         self.hora_activacion_tarifa_alta = 21  # 21:00 (9 PM)
         self.hora_resumen_diario = 0   # 00:00 (medianoche)
         
+        # Pesos del score de selección de conductor (menor score = mejor)
+        self.penalizacion_carga = 2.0  # por cada viaje por encima del mínimo de la flota
+        self.escala_senafiris = 50     # Senafiris (0-100) / escala se resta al score
+        self.bonus_balance = 1.0       # para los conductores con menos viajes hoy
+        
+        # Fuente de tiempo para el descanso de Senafiris (sustituible en simulaciones)
+        self.reloj = time.time
+        
         # Reloj virtual: 30x más rápido (1 min real = 2 seg virtuales)
         self.virtual_speed = 30
         self.virtual_start_time = datetime.now()
@@ -36,15 +54,31 @@ class SistemaAsignacion:
         self.ganancias_totales_hoy = 0.0
         self.ganancias_tarifa_alta_hoy = 0.0
         self.conductor_mas_viajes_hoy = None
-        self.cliente_mas_frecuente_hoy = None
+        self.cliente_mas_frecuente_hoy = None   # (cliente, viajes hoy)
+        # Top-K en flujo (conductores, clientes, zonas) del día y de los últimos días
+        self.destacados = DestacadosDiarios(k=5, dias=7)
+        
+        # Red vial opcional (core.red_vial.RedVial). Si está configurada, las
+        # distancias de recogida y de viaje se calculan por calles en vez de
+        # en línea recta.
+        self.red_vial = None
+        # Matriz zona-a-zona opcional (core.zonas.MatrizZonas) para ETAs O(1)
+        self.matriz_zonas = None
+        # Tarifa dinámica por zona opcional (core.tarifa_zonal.TarifaZonal)
+        self.tarifa_zonal = None
         
         # Históricos (nunca se resetean)
         self.resumen_diarios = []  # Lista de resúmenes diarios generados
         
+        # Versión del estado visible en reportes (cambio de tarifa, nuevo resumen)
+        self.version = 0
+        
         # Hilo para monitoreo de hora y tareas automáticas
         self.hilo_monitor = None
         self._stop_monitor = False
-        self._iniciar_monitor()
+        self._mutex_monitor = threading.Lock()
+        if iniciar_monitor:
+            self.asegurar_monitor()
     
     def obtener_hora_virtual(self):
         """Obtiene la hora virtual actual (30x más rápida)."""
@@ -53,10 +87,17 @@ class SistemaAsignacion:
         virtual_time = self.virtual_start_time + timedelta(seconds=virtual_elapsed)
         return virtual_time
 
-    def _iniciar_monitor(self):
-        """Inicia el hilo de monitoreo de hora."""
-        self.hilo_monitor = threading.Thread(target=self._monitor_hora, daemon=True)
-        self.hilo_monitor.start()
+    def asegurar_monitor(self):
+        """Inicia el hilo de monitoreo de hora si todavía no está en marcha."""
+        if self.hilo_monitor is not None:
+            return
+        with self._mutex_monitor:
+            if self.hilo_monitor is not None:
+                return
+            # Fijar el modo de tarifa ya, sin esperar a la primera vuelta del monitor
+            self.modo_tarifa_alta = self.obtener_hora_virtual().hour >= self.hora_activacion_tarifa_alta
+            self.hilo_monitor = threading.Thread(target=self._monitor_hora, daemon=True)
+            self.hilo_monitor.start()
 
     def _monitor_hora(self):
         """Monitorea la hora virtual para actualizar tarifas y generar resumen diario."""
@@ -71,12 +112,14 @@ class SistemaAsignacion:
             # Cambio a tarifa alta a las 21:00
             if hora_actual >= self.hora_activacion_tarifa_alta and ultima_tarifa_procesada != "alta":
                 self.modo_tarifa_alta = True
+                self.version += 1
                 print(f"[SistemaAsignacion] ⏰ Activada tarifa alta a las {hora_actual}:00 (hora virtual)")
                 ultima_tarifa_procesada = "alta"
             
             # Cambio a tarifa normal antes de las 21:00
             if hora_actual < self.hora_activacion_tarifa_alta and ultima_tarifa_procesada != "normal":
                 self.modo_tarifa_alta = False
+                self.version += 1
                 print(f"[SistemaAsignacion] ⏰ Activada tarifa normal a las {hora_actual}:00 (hora virtual)")
                 ultima_tarifa_procesada = "normal"
             
@@ -111,17 +154,44 @@ class SistemaAsignacion:
         Returns:
             Distancia en unidades del plano (float)
         """
-        if None in (origen, destino):
-            return float("inf")
+        return distancia_euclidiana(origen, destino)
+
+    def calcular_recorrido(self, origen, destino):
+        """
+        Calcula km y tiempo de un recorrido entre dos puntos (x, y).
+        Usa la red vial si está configurada; si no, la línea recta.
         
-        x1, y1 = origen
-        x2, y2 = destino
+        Args:
+            origen: tupla (x, y)
+            destino: tupla (x, y)
+        
+        Returns:
+            tupla (km, segundos); segundos es None sin red vial
+        """
+        if self.red_vial is None:
+            return self.calcular_distancia(origen, destino), None
         
-        dx = x2 - x1
-        dy = y2 - y1
-        distancia = sqrt(dx*dx + dy*dy)
+        ruta = self.red_vial.ruta(origen, destino)
+        return ruta["km"], ruta["segundos"]
+
+    def estimar_recorrido(self, origen, destino):
+        """
+        Estima km y tiempo de un recorrido sin calcular la ruta: consulta
+        la matriz de zonas (O(1)) para la hora virtual actual si está
+        configurada; si no, delega en calcular_recorrido.
         
-        return distancia
+        Returns:
+            tupla (km, segundos)
+        """
+        if self.matriz_zonas is not None:
+            return self.matriz_zonas.estimar(origen, destino, self.obtener_hora_virtual().hour)
+        return self.calcular_recorrido(origen, destino)
+
+    def registrar_tiempo_viaje(self, origen, destino, segundos):
+        """Refina la matriz de zonas con el tiempo real de un viaje completado."""
+        if self.matriz_zonas is not None:
+            self.matriz_zonas.registrar_viaje(origen, destino, segundos,
+                                              self.obtener_hora_virtual().hour)
 
     def calcular_puntuacion_senafiris(self, conductor):
         """
@@ -146,7 +216,7 @@ class SistemaAsignacion:
         carga_score = max(0, 100 - conductor.viajes_hoy * 10)
         
         # Tiempo de descanso: actualizar tiempo desde último viaje
-        tiempo_actual = time.time()
+        tiempo_actual = self.reloj()
         ultima_actualizacion = getattr(conductor, 'ultima_actualizacion_tiempo', tiempo_actual)
         tiempo_transcurrido = tiempo_actual - ultima_actualizacion
         # Actualizar tiempo desde último viaje si ha pasado tiempo
@@ -183,6 +253,9 @@ class SistemaAsignacion:
                 - tarifa_km: tarifa por km aplicada
                 - cliente_estrellas: estrellas del cliente
                 - motivo: 'distancia', 'senafiris' o 'balanceado'
+                - eta_recogida: segundos hasta el cliente (None sin red vial
+                  ni matriz de zonas)
+                - multiplicador: multiplicador de tarifa de la zona del cliente
         """
         if not lista_conductores:
             return None
@@ -201,12 +274,26 @@ class SistemaAsignacion:
         max_viajes = max(c.viajes_hoy for c in conductores_disponibles)
         diferencia_viajes = max_viajes - min_viajes
         
-        for conductor in conductores_disponibles:
-            pos_conductor = getattr(conductor, 'posicion', (0, 0))
-            pos_cliente = getattr(cliente, 'posicion', (0, 0))
-            
+        # Distancias de todos los conductores al cliente en una sola operación.
+        # Con matriz de zonas la ETA es una consulta O(1) por conductor; si no,
+        # por calles (un único Dijkstra inverso) si hay red vial, o en línea recta.
+        pos_cliente = getattr(cliente, 'posicion', None) or (0, 0)
+        posiciones = [getattr(c, 'posicion', (0, 0)) for c in conductores_disponibles]
+        etas = {}
+        if self.matriz_zonas is not None:
+            vector_distancias = distancias_euclidianas(pos_cliente, posiciones)
+            vector_etas = self.matriz_zonas.etas_hacia(
+                posiciones, pos_cliente, self.obtener_hora_virtual().hour
+            )
+            etas = dict(zip(conductores_disponibles, vector_etas.tolist()))
+        elif self.red_vial is not None:
+            vector_distancias, vector_etas = self.red_vial.tiempos_hacia(pos_cliente, posiciones)
+            etas = dict(zip(conductores_disponibles, vector_etas.tolist()))
+        else:
+            vector_distancias = distancias_euclidianas(pos_cliente, posiciones)
+        
+        for conductor, dist in zip(conductores_disponibles, vector_distancias.tolist()):
             # Distancia (normalizada, menor es mejor)
-            dist = self.calcular_distancia(pos_conductor, pos_cliente)
             distancias[conductor] = dist
             dist_score = dist  # Distancia directa (menor es mejor)
             
@@ -219,19 +306,19 @@ class SistemaAsignacion:
             if diferencia_viajes > 0:
                 # Penalización proporcional: si tiene más viajes que el mínimo, penalizar más
                 viajes_extra = conductor.viajes_hoy - min_viajes
-                carga_penalty = viajes_extra * 2.0  # Penalización más fuerte
+                carga_penalty = viajes_extra * self.penalizacion_carga  # Penalización más fuerte
             else:
                 carga_penalty = 0
             
             # Bonus por tener menos viajes (para balancear)
             if conductor.viajes_hoy == min_viajes and diferencia_viajes > 0:
-                bonus_balance = 1.0  # Bonus para el que tiene menos viajes
+                bonus_balance = self.bonus_balance  # Bonus para el que tiene menos viajes
             else:
                 bonus_balance = 0
             
             # Score combinado: distancia + penalización carga - bonus Senafiris - bonus balance
             # Normalizamos Senafiris para que tenga menos peso que la distancia
-            score_final = dist_score + carga_penalty - (senafiris_score / 50) - bonus_balance
+            score_final = dist_score + carga_penalty - (senafiris_score / self.escala_senafiris) - bonus_balance
             
             scores[conductor] = score_final
         
@@ -260,12 +347,7 @@ class SistemaAsignacion:
                 motivo = "distancia"
         
         # Determinar tarifa
-        if self.modo_tarifa_alta:
-            tarifa_base = self.tarifa_base_alta
-            tarifa_km = self.tarifa_km_alta
-        else:
-            tarifa_base = self.tarifa_base_normal
-            tarifa_km = self.tarifa_km_normal
+        tarifa_base, tarifa_km = self.obtener_tarifas()
         
         return {
             "conductor": conductor_seleccionado,
@@ -273,7 +355,9 @@ class SistemaAsignacion:
             "tarifa_base": tarifa_base,
             "tarifa_km": tarifa_km,
             "cliente_estrellas": cliente.estrellas,
-            "motivo": motivo
+            "motivo": motivo,
+            "eta_recogida": etas.get(conductor_seleccionado),
+            "multiplicador": self.obtener_multiplicador(pos_cliente),
         }
 
     def priorizar_clientes_para_conductor(self, conductor, lista_clientes):
@@ -299,25 +383,91 @@ class SistemaAsignacion:
         
         return cliente_priorizado
 
-    def calcular_tarifa(self, km, cliente_estrellas=1):
+    def obtener_tarifas(self, modo_tarifa_alta=None):
+        """
+        Devuelve (tarifa_base, tarifa_km) del modo indicado.
+        
+        Args:
+            modo_tarifa_alta: True/False para forzar un modo; None usa el actual
+        """
+        if modo_tarifa_alta is None:
+            modo_tarifa_alta = self.modo_tarifa_alta
+        if modo_tarifa_alta:
+            return self.tarifa_base_alta, self.tarifa_km_alta
+        return self.tarifa_base_normal, self.tarifa_km_normal
+
+    def obtener_multiplicador(self, origen):
+        """Multiplicador de tarifa dinámica en `origen` (1.0 sin tarifa zonal)."""
+        if self.tarifa_zonal is None or origen is None:
+            return 1.0
+        return self.tarifa_zonal.multiplicador(origen)
+
+    def calcular_tarifa(self, km, cliente_estrellas=1, modo_tarifa_alta=None, origen=None):
         """
         Calcula la tarifa para un viaje.
         
         Args:
             km: kilómetros del viaje
             cliente_estrellas: estrellas del cliente (posible descuento futuro)
+            modo_tarifa_alta: True/False para forzar un modo; None usa el actual
+            origen: punto de recogida; con tarifa zonal aplica su multiplicador
         
         Returns:
             Tarifa total en €
         """
-        if self.modo_tarifa_alta:
-            tarifa = self.tarifa_base_alta + self.tarifa_km_alta * km
-        else:
-            tarifa = self.tarifa_base_normal + self.tarifa_km_normal * km
+        tarifa_base, tarifa_km = self.obtener_tarifas(modo_tarifa_alta)
+        return round((tarifa_base + tarifa_km * km) * self.obtener_multiplicador(origen), 2)
+
+    def calcular_tarifas_lote(self, kms, modo_tarifa_alta=None, origenes=None):
+        """
+        Versión vectorizada de calcular_tarifa para muchos viajes.
+        
+        Args:
+            kms: secuencia o array (n,) de kilómetros
+            modo_tarifa_alta: True/False para forzar un modo; None usa el actual
+            origenes: puntos de recogida; con tarifa zonal aplica sus multiplicadores
         
-        return round(tarifa, 2)
+        Returns:
+            Array (n,) de tarifas en € redondeadas a céntimos
+        """
+        tarifa_base, tarifa_km = self.obtener_tarifas(modo_tarifa_alta)
+        tarifas = tarifa_base + tarifa_km * np.asarray(kms, dtype=np.float64)
+        if self.tarifa_zonal is not None and origenes is not None:
+            tarifas = tarifas * self.tarifa_zonal.multiplicadores_de(origenes)
+        return np.round(tarifas, 2)
+
+    def estimar_km_lote(self, origenes, destinos):
+        """
+        Km estimados para pares origen[i] -> destino[i] del plano, vectorizado.
+        Con matriz de zonas se consulta la distancia por calles entre zonas;
+        si no, la línea recta.
+        
+        Returns:
+            (km, segundos): arrays (n,); segundos es None sin matriz de zonas
+        """
+        if self.matriz_zonas is not None:
+            matriz = self.matriz_zonas
+            zo = matriz.zonas_de(origenes)
+            zd = matriz.zonas_de(destinos)
+            franja = matriz.franja(self.obtener_hora_virtual().hour)
+            return matriz.km[zo, zd].astype(np.float64), matriz.segundos[franja, zo, zd].astype(np.float64)
+        return distancias_euclidianas_pares(origenes, destinos), None
+
+    def zona_de(self, punto):
+        """
+        Zona de un punto para las estadísticas: la de la matriz o de la tarifa
+        zonal. Sin ninguna de las dos no hay rejilla que sepa la escala de las
+        coordenadas (km del plano o lat/lon), así que devuelve None y no se
+        lleva top de zonas.
+        """
+        if self.matriz_zonas is not None:
+            return f"Z{self.matriz_zonas.zona_de(punto)}"
+        if self.tarifa_zonal is not None:
+            return f"Z{self.tarifa_zonal.zona_de(punto)}"
+        return None
 
-    def registrar_viaje_completado(self, conductor, cliente, km, tarifa):
+    def registrar_viaje_completado(self, conductor, cliente, km, tarifa, origen=None, destino=None,
+                                   tarifa_alta=None):
         """
         Registra un viaje completado y actualiza contadores.
         
@@ -326,26 +476,30 @@ class SistemaAsignacion:
             cliente: cliente que solicitó el viaje
             km: kilómetros recorridos
             tarifa: tarifa cobrada
+            origen, destino: puntos del viaje (para el top de zonas)
+            tarifa_alta: si se cobró con tarifa alta (None = el modo actual)
         """
         # Actualizar contadores diarios
         self.viajes_totales_hoy += 1
         self.ganancias_totales_hoy += tarifa
         
-        if self.modo_tarifa_alta:
+        if self.modo_tarifa_alta if tarifa_alta is None else tarifa_alta:
             self.ganancias_tarifa_alta_hoy += tarifa
         
+        viajes_conductor, viajes_cliente = self.destacados.registrar_viaje(
+            getattr(conductor, 'id_taxi', conductor.nombre), conductor.nombre,
+            cliente.id_cliente, cliente.nombre, tarifa,
+            self.zona_de(origen) if origen is not None else None,
+            self.zona_de(destino) if destino is not None else None,
+        )
+        
         # Rastrear conductor con más viajes
-        viajes_conductor = getattr(conductor, 'viajes_hoy', 0)
-        if self.conductor_mas_viajes_hoy is None:
-            self.conductor_mas_viajes_hoy = (conductor, viajes_conductor + 1)
-        elif viajes_conductor + 1 > self.conductor_mas_viajes_hoy[1]:
-            self.conductor_mas_viajes_hoy = (conductor, viajes_conductor + 1)
-        
-        # Rastrear cliente más frecuente
-        if self.cliente_mas_frecuente_hoy is None:
-            self.cliente_mas_frecuente_hoy = cliente
-        elif cliente.estrellas > self.cliente_mas_frecuente_hoy.estrellas:
-            self.cliente_mas_frecuente_hoy = cliente
+        if self.conductor_mas_viajes_hoy is None or viajes_conductor > self.conductor_mas_viajes_hoy[1]:
+            self.conductor_mas_viajes_hoy = (conductor, viajes_conductor)
+        
+        # Rastrear cliente más frecuente (por viajes de hoy)
+        if self.cliente_mas_frecuente_hoy is None or viajes_cliente > self.cliente_mas_frecuente_hoy[1]:
+            self.cliente_mas_frecuente_hoy = (cliente, viajes_cliente)
 
     def generar_resumen_diario(self, sistema_central=None):
         """
@@ -353,6 +507,7 @@ class SistemaAsignacion:
         
         Args:
             sistema_central: Referencia opcional al SistemaCentral para resetear contadores de taxis
+                y pasar al día siguiente (SistemaCentral.avanzar_dia)
         """
         ahora = datetime.now()
         resumen = {
@@ -365,12 +520,15 @@ class SistemaAsignacion:
                 if self.conductor_mas_viajes_hoy else "N/A"
             ),
             "cliente_mas_frecuente": (
-                f"{self.cliente_mas_frecuente_hoy.nombre} ({self.cliente_mas_frecuente_hoy.estrellas}⭐)"
+                f"{self.cliente_mas_frecuente_hoy[0].nombre} ({self.cliente_mas_frecuente_hoy[1]} viajes)"
                 if self.cliente_mas_frecuente_hoy else "N/A"
             ),
+            "top": self.destacados.cerrar_dia(),
         }
+        resumen["top_ventana"] = self.destacados.listas(ventana=True)
         
         self.resumen_diarios.append(resumen)
+        self.version += 1
         
         print(f"\n{'='*60}")
         print(f"📊 RESUMEN DIARIO - {resumen['fecha']}")
@@ -380,6 +538,9 @@ class SistemaAsignacion:
         print(f"Ganancias tarifa alta: {resumen['ganancias_tarifa_alta']} €")
         print(f"Conductor más activo: {resumen['conductor_mas_viajes']}")
         print(f"Cliente más frecuente: {resumen['cliente_mas_frecuente']}")
+        for nombre, lista in resumen["top"].items():
+            if lista:
+                print(f"Top {nombre.replace('_', ' ')}: " + ", ".join(f"{e['nombre']} ({e['valor']})" for e in lista))
         print(f"{'='*60}\n")
         
         # Resetear contadores diarios
@@ -394,3 +555,5 @@ class SistemaAsignacion:
             for taxi in sistema_central.taxis:
                 taxi.viajes_hoy = 0
                 # No resetear tiempo_desde_ultimo_viaje, se actualiza automáticamente
+            # Nuevo día: sellar el que termina en el libro de servicios
+            sistema_central.avanzar_dia()
@@ -0,0 +1,181 @@
+"""
+Tarifa dinámica por zona a partir de oferta y demanda en ventana deslizante.
+
+La ciudad se divide en una rejilla de zonas. Para cada zona se cuentan, en
+un búfer circular de cubetas de `ancho_cubeta` segundos, las solicitudes,
+los rechazos y las liberaciones de taxis (un taxi que queda libre en la
+zona al terminar un viaje), con sumas corridas para que leer la ventana sea
+O(1). Además se lleva el número actual de taxis libres en cada zona, que se
+actualiza con cada asignación y cada liberación y se resincroniza con la
+flota de vez en cuando.
+
+El multiplicador de una zona es
+
+    presion = (solicitudes + rechazos) / (libres + 1)
+    multiplicador = 1 + sensibilidad * (presion - umbral)
+
+recortado a [1, maximo] y redondeado a `paso`; con menos de
+`minimo_solicitudes` en la ventana vale 1. La oferta es solo `libres`: un
+taxi liberado ya cuenta ahí hasta que lo asignan, así que las liberaciones
+de la ventana se llevan para los reportes (estado()) y no entran en la
+fórmula.
+"""
+import threading
+import time
+
+import numpy as np
+
+from .zonas import Rejilla
+
+# Filas del búfer circular
+SOLICITUDES, RECHAZOS, LIBERACIONES = 0, 1, 2
+
+
+class TarifaZonal(Rejilla):
+    """
+    Contadores por zona en ventana deslizante y multiplicador de tarifa.
+
+    Args:
+        filas, columnas, ancho_km, alto_km, origen_x, origen_y: rejilla de zonas
+        ventana: segundos de la ventana deslizante
+        ancho_cubeta: segundos por cubeta del búfer circular
+        resincronizar: segundos entre recuentos completos de taxis libres
+        reloj: fuente de tiempo (segundos monotónicos)
+    """
+
+    def __init__(self, filas=5, columnas=5, ancho_km=10.0, alto_km=10.0,
+                 origen_x=0.0, origen_y=0.0, ventana=300.0, ancho_cubeta=10.0,
+                 umbral=1.0, sensibilidad=0.25, maximo=2.5, paso=0.1,
+                 minimo_solicitudes=3, resincronizar=30.0, reloj=time.monotonic):
+        super().__init__(filas, columnas, ancho_km, alto_km, origen_x, origen_y)
+        self.umbral = umbral
+        self.sensibilidad = sensibilidad
+        self.maximo = maximo
+        self.paso = paso
+        self.minimo_solicitudes = minimo_solicitudes
+        self.resincronizar = resincronizar
+        self.reloj = reloj
+
+        z = filas * columnas
+        self.ancho_cubeta = ancho_cubeta
+        self.num_cubetas = max(1, int(round(ventana / ancho_cubeta)))
+        self._cubetas = np.zeros((3, z, self.num_cubetas), dtype=np.int32)
+        self._sumas = np.zeros((3, z), dtype=np.int64)
+        self._cubeta_actual = int(reloj() // ancho_cubeta)
+        self.libres = np.zeros(z, dtype=np.int32)
+        self.taxis_sincronizados = -1
+        self._ultima_sincronizacion = float("-inf")
+        self._mutex = threading.Lock()
+
+    # === Búfer circular ===
+
+    def _avanzar(self):
+        """Vacía las cubetas que han salido de la ventana (con el lock tomado)."""
+        actual = int(self.reloj() // self.ancho_cubeta)
+        pasos = actual - self._cubeta_actual
+        if pasos <= 0:
+            return
+        for c in range(self._cubeta_actual + 1, self._cubeta_actual + 1 + min(pasos, self.num_cubetas)):
+            i = c % self.num_cubetas
+            self._sumas -= self._cubetas[:, :, i]
+            self._cubetas[:, :, i] = 0
+        self._cubeta_actual = actual
+
+    def _contar(self, tipo, zona):
+        self._cubetas[tipo, zona, self._cubeta_actual % self.num_cubetas] += 1
+        self._sumas[tipo, zona] += 1
+
+    # === Eventos (O(1)) ===
+
+    def registrar_solicitud(self, origen, rechazada=False):
+        zona = self.zona_de(origen)
+        with self._mutex:
+            self._avanzar()
+            self._contar(SOLICITUDES, zona)
+            if rechazada:
+                self._contar(RECHAZOS, zona)
+
+    def registrar_asignacion(self, posicion_taxi):
+        """Un taxi libre de la zona pasa a estar ocupado."""
+        zona = self.zona_de(posicion_taxi)
+        with self._mutex:
+            if self.libres[zona] > 0:
+                self.libres[zona] -= 1
+
+    def registrar_liberacion(self, posicion_taxi):
+        """Un taxi queda libre en la zona al terminar un viaje."""
+        zona = self.zona_de(posicion_taxi)
+        with self._mutex:
+            self._avanzar()
+            self._contar(LIBERACIONES, zona)
+            self.libres[zona] += 1
+
+    def sincronizar_flota(self, taxis, forzar=False):
+        """
+        Recuenta los taxis libres por zona si cambió el tamaño de la flota o
+        pasó el intervalo de resincronización (O(n) solo en esos casos).
+        """
+        ahora = self.reloj()
+        if (not forzar and len(taxis) == self.taxis_sincronizados
+                and ahora - self._ultima_sincronizacion < self.resincronizar):
+            return
+        libres = np.zeros(self.num_zonas, dtype=np.int32)
+        for taxi in list(taxis):
+            if taxi.disponible:
+                libres[self.zona_de(taxi.posicion)] += 1
+        with self._mutex:
+            self.libres = libres
+            self.taxis_sincronizados = len(taxis)
+            self._ultima_sincronizacion = ahora
+
+    # === Multiplicador ===
+
+    def _multiplicadores(self, zonas):
+        """Multiplicador de un array de zonas (con el lock tomado)."""
+        solicitudes = self._sumas[SOLICITUDES, zonas]
+        demanda = solicitudes + self._sumas[RECHAZOS, zonas]
+        # Un taxi liberado ya está en `libres` mientras no lo asignen: contar
+        # también LIBERACIONES lo sumaría dos veces
+        oferta = self.libres[zonas] + 1
+        m = 1.0 + self.sensibilidad * (demanda / oferta - self.umbral)
+        m = np.clip(np.round(m / self.paso) * self.paso, 1.0, self.maximo)
+        return np.where(solicitudes >= self.minimo_solicitudes, m, 1.0)
+
+    def multiplicador(self, punto):
+        """Multiplicador de tarifa vigente en la zona de `punto` (sin arrays: va en cada solicitud)."""
+        zona = self.zona_de(punto)
+        with self._mutex:
+            self._avanzar()
+            solicitudes = int(self._sumas[SOLICITUDES, zona])
+            if solicitudes < self.minimo_solicitudes:
+                return 1.0
+            demanda = solicitudes + int(self._sumas[RECHAZOS, zona])
+            oferta = int(self.libres[zona]) + 1
+        m = 1.0 + self.sensibilidad * (demanda / oferta - self.umbral)
+        m = round(m / self.paso) * self.paso
+        return round(min(max(m, 1.0), self.maximo), 2)
+
+    def multiplicadores_de(self, puntos):
+        """Multiplicadores de varios puntos (vectorizado)."""
+        zonas = self.zonas_de(puntos)
+        with self._mutex:
+            self._avanzar()
+            return np.round(self._multiplicadores(zonas), 2)
+
+    def estado(self):
+        """Contadores de la ventana y multiplicador de cada zona (para reportes/depuración)."""
+        with self._mutex:
+            self._avanzar()
+            zonas = np.arange(self.num_zonas)
+            multiplicadores = self._multiplicadores(zonas)
+            return [
+                {
+                    "zona": int(z),
+                    "solicitudes": int(self._sumas[SOLICITUDES, z]),
+                    "rechazos": int(self._sumas[RECHAZOS, z]),
+                    "liberaciones": int(self._sumas[LIBERACIONES, z]),
+                    "libres": int(self.libres[z]),
+                    "multiplicador": round(float(multiplicadores[z]), 2),
+                }
+                for z in zonas
+            ]
@@ -2,12 +2,14 @@ import threading
 import time
 import random
 import hashlib
-from math import sqrt
+
+from .distancias import distancia_euclidiana
+from .trazas import marcar
 
 
 class SolicitudServicio:
     def __init__(self, id_cliente, origen, destino, dia=1,
-                 direccion_origen=None, direccion_destino=None):
+                 direccion_origen=None, direccion_destino=None, ticket=None):
         self.id_cliente = id_cliente
         self.origen = origen      # (x, y) para cálculos internos
         self.destino = destino    # (x, y)
@@ -15,7 +17,24 @@ class SolicitudServicio:
         # Direcciones legibles para mostrar en la interfaz / reportes
         self.direccion_origen = direccion_origen
         self.direccion_destino = direccion_destino
+        # Ticket de seguimiento (solicitudes web); None si nadie espera eventos
+        self.ticket = ticket
+        # Traza del ciclo de vida (core/trazas.py); traza es None si no se muestrea
+        self.id_traza = None
+        self.traza = None
+
+
+class Parada:
+    """Parada del plan de un taxi con viajes compartidos."""
+    __slots__ = ("tipo", "solicitud", "punto")
+
+    def __init__(self, tipo, solicitud, punto):
+        self.tipo = tipo            # "recogida" o "entrega"
+        self.solicitud = solicitud
+        self.punto = punto
 
+    def __repr__(self):
+        return f"Parada({self.tipo}, cliente={self.solicitud.id_cliente}, {self.punto})"
 
 
 class Taxi(threading.Thread):
@@ -23,6 +42,9 @@ class Taxi(threading.Thread):
     Representa un Taxi como un Hilo independiente (Thread).
     Cada taxi se ejecuta concurrentemente en el sistema.
     """
+    # Segundos reales de espera por cada segundo simulado de viaje
+    ESCALA_TIEMPO = 0.05
+
     def __init__(self, id_taxi, nombre, placa, velocidad_kph, sistema_central, posicion_inicial=(0, 0)):
         super().__init__(name=f"Taxi-{id_taxi}", daemon=True)
         self.id_taxi = id_taxi
@@ -47,12 +69,88 @@ class Taxi(threading.Thread):
         # Permite que el hilo "duerma" (wait) hasta que el sistema lo despierte.
         self._viaje_asignado_event = threading.Event()
         self._solicitud_actual = None
+        self._mutex_inicio = threading.Lock()
+
+        # Viajes compartidos (core/viajes_compartidos.py): paradas pendientes
+        # en orden, la parada hacia la que va y los pasajeros a bordo con sus
+        # km recorridos. version_plan cambia con cada modificación del plan.
+        self._paradas = []
+        self._parada_actual = None
+        self._a_bordo = {}
+        self._mutex_plan = threading.Lock()
+        self.version_plan = 0
+        # Reposicionamiento en vacío (core/rebalanceo.py); se cancela al recibir un viaje
+        self.destino_reposicion = None
+
+    def asegurar_iniciado(self):
+        """Arranca el hilo del taxi si aún no se ha arrancado (arranque perezoso)."""
+        if self.ident is not None:
+            return
+        with self._mutex_inicio:
+            if self.ident is None:
+                self.start()
 
     def asignar_viaje(self, solicitud: SolicitudServicio):
-        self._solicitud_actual = solicitud
-        self.disponible = False
+        # Con el lock del plan: un reposicionamiento que acaba no puede borrar este aviso
+        with self._mutex_plan:
+            self._solicitud_actual = solicitud
+            self.disponible = False
+        self.asegurar_iniciado()
         self._viaje_asignado_event.set()
 
+    def reposicionar(self, destino):
+        """
+        Manda al taxi libre hacia `destino` sin pasajero. Sigue disponible
+        mientras se mueve y, si recibe un viaje, se para donde esté.
+
+        Returns:
+            False si el taxi ya no estaba libre
+        """
+        with self._mutex_plan:
+            if not self.disponible or self._solicitud_actual is not None or self._paradas:
+                return False
+            self.destino_reposicion = destino
+        self.asegurar_iniciado()
+        self._viaje_asignado_event.set()
+        return True
+
+    def anadir_paradas(self, solicitud: SolicitudServicio, i, j, version=None):
+        """
+        Inserta en el plan la recogida de `solicitud` en la posición i y su
+        entrega en la posición j del plan resultante sin la recogida (j >= i).
+
+        Returns:
+            False si el plan cambió desde `version` (hay que recalcular)
+        """
+        with self._mutex_plan:
+            if version is not None and version != self.version_plan:
+                return False
+            solicitud.km_compartidos = 0.0
+            solicitud.km_aproximacion = 0.0
+            solicitud.segundos_a_bordo = 0.0
+            self._paradas.insert(j, Parada("entrega", solicitud, solicitud.destino))
+            self._paradas.insert(i, Parada("recogida", solicitud, solicitud.origen))
+            self.version_plan += 1
+            self.disponible = False
+        self.asegurar_iniciado()
+        self._viaje_asignado_event.set()
+        return True
+
+    def estado_plan(self):
+        """
+        Copia del plan para evaluar inserciones.
+
+        Returns:
+            (posicion, parada_actual, {solicitud: km a bordo}, paradas, version)
+        """
+        with self._mutex_plan:
+            return (self.posicion, self._parada_actual, dict(self._a_bordo),
+                    list(self._paradas), self.version_plan)
+
+    def tiene_paradas(self):
+        with self._mutex_plan:
+            return bool(self._paradas or self._parada_actual)
+
     def run(self):
         """
         Ciclo de vida del hilo Taxi.
@@ -62,21 +160,37 @@ class Taxi(threading.Thread):
             # Espera PASIVA hasta que se active el evento (ahorro de CPU)
             self._viaje_asignado_event.wait()
 
+            if self._paradas:
+                self._recorrer_plan()
+                continue
+
             solicitud = self._solicitud_actual
             if solicitud is None:
-                self._viaje_asignado_event.clear()
+                if self.destino_reposicion is not None:
+                    self._reposicionar()
+                    continue
+                with self._mutex_plan:
+                    if self._solicitud_actual is None and not self._paradas:
+                        self._viaje_asignado_event.clear()
                 continue
+            marcar(solicitud, "taxi_en_marcha")
 
             print(f"[{self.name}] Asignado al cliente {solicitud.id_cliente}. "
                   f"Origen: {solicitud.origen}, Destino: {solicitud.destino}")
 
             # Simular desplazamiento hasta el cliente
             t_llegada, km_hasta_cliente = self._simular_desplazamiento(self.posicion, solicitud.origen)
+            marcar(solicitud, "recogida")
             print(f"[{self.name}] Llega al cliente {solicitud.id_cliente} "
                   f"en {t_llegada:.2f}s, distancia {km_hasta_cliente:.2f} km")
+            self.sistema_central.notificar_evento(solicitud, "recogida", {
+                "id_taxi": self.id_taxi,
+                "km_hasta_cliente": round(km_hasta_cliente, 2),
+            })
 
             # Simular viaje origen → destino
             t_viaje, km_viaje = self._simular_desplazamiento(solicitud.origen, solicitud.destino)
+            marcar(solicitud, "destino")
             print(f"[{self.name}] Completa el viaje del cliente {solicitud.id_cliente} "
                   f"en {t_viaje:.2f}s, distancia {km_viaje:.2f} km")
 
@@ -97,6 +211,7 @@ class Taxi(threading.Thread):
                 km=km_totales,
                 costo=costo,
                 calificacion=calificacion,
+                segundos_viaje=t_viaje / self.ESCALA_TIEMPO,
             )
 
             # Prepararse para el siguiente viaje
@@ -104,23 +219,110 @@ class Taxi(threading.Thread):
             self._viaje_asignado_event.clear()
             self.disponible = True
 
-    def _simular_desplazamiento(self, origen, destino):
-        dx = destino[0] - origen[0]
-        dy = destino[1] - origen[1]
-        distancia = sqrt(dx*dx + dy*dy)  # distancia en "unidades" del plano
+    def _recorrer_plan(self):
+        """
+        Recorre las paradas del plan de viajes compartidos hasta vaciarlo. El
+        plan puede crecer mientras tanto (inserciones desde _match).
+        """
+        while True:
+            with self._mutex_plan:
+                if not self._paradas:
+                    self.disponible = True
+                    self._viaje_asignado_event.clear()
+                    return
+                parada = self._paradas.pop(0)
+                self._parada_actual = parada
+                self.version_plan += 1
+
+            t, km = self._simular_desplazamiento(self.posicion, parada.punto)
+
+            solicitud = parada.solicitud
+            with self._mutex_plan:
+                # El tramo se reparte entre quienes iban a bordo
+                for pasajero in self._a_bordo:
+                    self._a_bordo[pasajero] += km
+                    pasajero.km_compartidos += km / len(self._a_bordo)
+                    pasajero.segundos_a_bordo += t / self.ESCALA_TIEMPO
+                self.posicion = parada.punto
+                self._parada_actual = None
+                self.version_plan += 1
+                if parada.tipo == "recogida":
+                    self._a_bordo[solicitud] = 0.0
+                    solicitud.km_aproximacion = km
+                else:
+                    km_a_bordo = self._a_bordo.pop(solicitud)
+
+            if parada.tipo == "recogida":
+                marcar(solicitud, "recogida")
+                print(f"[{self.name}] Recoge al cliente {solicitud.id_cliente} "
+                      f"en {t:.2f}s, distancia {km:.2f} km")
+                self.sistema_central.notificar_evento(solicitud, "recogida", {
+                    "id_taxi": self.id_taxi,
+                    "km_hasta_cliente": round(km, 2),
+                })
+                continue
+
+            marcar(solicitud, "destino")
+            print(f"[{self.name}] Deja al cliente {solicitud.id_cliente}, "
+                  f"{km_a_bordo:.2f} km a bordo ({solicitud.km_compartidos:.2f} km cobrables)")
+            costo = self._calcular_costo(km_a_bordo, solicitud)
+            calificacion = random.randint(3, 5)
+            self.sistema_central.registrar_final_viaje(
+                taxi=self,
+                solicitud=solicitud,
+                km=solicitud.km_aproximacion + km_a_bordo,
+                costo=costo,
+                calificacion=calificacion,
+                segundos_viaje=solicitud.segundos_a_bordo,
+            )
 
-        # Consideramos estas unidades como km directamente
-        km = distancia
+    def _reposicionar(self):
+        """
+        Avanza hacia destino_reposicion actualizando la posición en pasos
+        cortos, para que el despacho vea dónde está; lo deja en cuanto recibe
+        un viaje o un destino nuevo.
+        """
+        destino = self.destino_reposicion
+        origen = self.posicion
+        km = distancia_euclidiana(origen, destino)
+        print(f"[{self.name}] Se reposiciona hacia {destino} ({km:.2f} km)")
+        duracion = max(0.2, km / max(self.velocidad_kph, 1) * 3600 * self.ESCALA_TIEMPO)
+        inicio = time.monotonic()
+        while True:
+            fraccion = min(1.0, (time.monotonic() - inicio) / duracion)
+            self.posicion = (origen[0] + (destino[0] - origen[0]) * fraccion,
+                             origen[1] + (destino[1] - origen[1]) * fraccion)
+            with self._mutex_plan:
+                cancelado = (self._solicitud_actual is not None or bool(self._paradas)
+                             or self.destino_reposicion is not destino)
+            if cancelado or fraccion >= 1.0:
+                break
+            time.sleep(min(0.05, duracion * (1.0 - fraccion)))
+        with self._mutex_plan:
+            if self.destino_reposicion is destino:
+                self.destino_reposicion = None
+            if self._solicitud_actual is None and not self._paradas and self.destino_reposicion is None:
+                self._viaje_asignado_event.clear()
 
+    def _simular_desplazamiento(self, origen, destino):
         # Velocidad en km/h (mínimo por seguridad)
         if self.velocidad_kph <= 0:
             self.velocidad_kph = 40
 
-        horas = km / self.velocidad_kph
-        segundos = horas * 3600
+        sistema_asignacion = getattr(self.sistema_central, 'sistema_asignacion', None)
+        if sistema_asignacion is not None:
+            # Por calles si hay red vial configurada, si no en línea recta
+            km, segundos_ruta = sistema_asignacion.calcular_recorrido(origen, destino)
+        else:
+            km, segundos_ruta = distancia_euclidiana(origen, destino), None
+
+        # El taxi nunca va más rápido que su propia velocidad
+        segundos = km / self.velocidad_kph * 3600
+        if segundos_ruta is not None:
+            segundos = max(segundos, segundos_ruta)
 
         # Escala para no estar esperando años
-        segundos_simulados = max(0.2, segundos * 0.05)
+        segundos_simulados = max(0.2, segundos * self.ESCALA_TIEMPO)
         time.sleep(segundos_simulados)
 
         return segundos_simulados, km
@@ -129,8 +331,14 @@ class Taxi(threading.Thread):
         """
         Calcula el costo del viaje usando tarifas dinámicas.
         Si la solicitud tiene tarifas definidas (del sistema de asignación), las usa.
-        Si no, usa tarifas por defecto.
+        Si no, usa tarifas por defecto. El multiplicador de zona se fija al
+        asignar el viaje, así que se cobra lo que se cotizó.
+        En un viaje compartido cada tramo se reparte entre los pasajeros a
+        bordo y se cobra esa parte (km_compartidos), nunca más que km_viaje.
         """
+        km_compartidos = getattr(solicitud, 'km_compartidos', None) if solicitud else None
+        if km_compartidos is not None:
+            km_viaje = min(km_viaje, km_compartidos)
         if solicitud and hasattr(solicitud, 'tarifa_base') and hasattr(solicitud, 'tarifa_km'):
             tarifa_base = solicitud.tarifa_base
             tarifa_km = solicitud.tarifa_km
@@ -149,7 +357,8 @@ class Taxi(threading.Thread):
                 tarifa_base = 0.5
                 tarifa_km = 1.0
         
-        return round(tarifa_base + tarifa_km * km_viaje, 2)
+        multiplicador = getattr(solicitud, 'multiplicador', 1.0) if solicitud else 1.0
+        return round((tarifa_base + tarifa_km * km_viaje) * multiplicador, 2)
 
 
     def actualizar_calificacion(self, nueva_nota: float):
@@ -0,0 +1,106 @@
+"""
+Tickets de solicitud y canal de eventos por viaje.
+
+Cada solicitud web recibe un ticket en cuanto se envía. El sistema central
+publica en ese ticket los eventos de su ciclo de vida ('asignado',
+'rechazado', 'recogida', 'completado') y los clientes HTTP los consumen por
+long-poll o SSE sin tener que adivinar qué servicio es el suyo.
+"""
+import threading
+import time
+import uuid
+
+# Eventos tras los cuales el ticket ya no recibirá más publicaciones
+EVENTOS_FINALES = ("rechazado", "completado")
+
+
+class Ticket:
+    """Estado de un ticket: lista ordenada de eventos publicados."""
+
+    def __init__(self, id_ticket, id_cliente):
+        self.id_ticket = id_ticket
+        self.id_cliente = id_cliente
+        self.creado = time.time()
+        self.eventos = []
+        self.cerrado = False
+
+
+class GestorTickets:
+    """
+    Registro de tickets con espera pasiva de eventos.
+
+    Una única Condition protege el registro: los publicadores hacen
+    notify_all() y los lectores esperan (wait) sin consumir CPU hasta que
+    llega un evento nuevo o vence su timeout.
+    """
+
+    def __init__(self, ttl_segundos=3600):
+        self.ttl_segundos = ttl_segundos
+        self._tickets = {}
+        self._condicion = threading.Condition()
+        self._ultima_purga = time.time()
+
+    def crear_ticket(self, id_cliente):
+        """Crea un ticket nuevo y devuelve su identificador."""
+        id_ticket = uuid.uuid4().hex
+        with self._condicion:
+            self._purgar_expirados()
+            self._tickets[id_ticket] = Ticket(id_ticket, id_cliente)
+        return id_ticket
+
+    def existe(self, id_ticket):
+        with self._condicion:
+            return id_ticket in self._tickets
+
+    def publicar(self, id_ticket, tipo, datos=None):
+        """Añade un evento al ticket y despierta a quien esté esperando."""
+        if id_ticket is None:
+            return
+        with self._condicion:
+            ticket = self._tickets.get(id_ticket)
+            if ticket is None or ticket.cerrado:
+                return
+            ticket.eventos.append({
+                "seq": len(ticket.eventos),
+                "tipo": tipo,
+                "ts": time.time(),
+                "datos": datos or {},
+            })
+            if tipo in EVENTOS_FINALES:
+                ticket.cerrado = True
+            self._condicion.notify_all()
+
+    def esperar_eventos(self, id_ticket, desde=0, timeout=25.0):
+        """
+        Devuelve los eventos con seq >= desde, esperando hasta `timeout`
+        segundos si todavía no hay ninguno.
+
+        Returns:
+            (eventos, cerrado), o (None, True) si el ticket no existe.
+        """
+        limite = time.monotonic() + timeout
+        with self._condicion:
+            while True:
+                ticket = self._tickets.get(id_ticket)
+                if ticket is None:
+                    return None, True
+                if len(ticket.eventos) > desde or ticket.cerrado:
+                    return ticket.eventos[desde:], ticket.cerrado
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    return [], False
+                self._condicion.wait(restante)
+
+    def _purgar_expirados(self):
+        """
+        Elimina tickets más antiguos que el TTL (llamar con el lock tomado).
+        Como mucho una vez por minuto para no recorrer el registro en cada alta.
+        """
+        ahora = time.time()
+        if ahora - self._ultima_purga < 60:
+            return
+        self._ultima_purga = ahora
+        limite = ahora - self.ttl_segundos
+        expirados = [t for t, tk in self._tickets.items() if tk.creado < limite]
+        for t in expirados:
+            del self._tickets[t]
@@ -0,0 +1,225 @@
+"""
+Estadísticas top-K en flujo con memoria acotada.
+
+`TopK` implementa Space-Saving: guarda como mucho `capacidad` contadores y,
+cuando llega una clave nueva con todos ocupados, sustituye a la de menor
+cuenta heredando esa cuenta como error máximo. Cualquier clave cuya cuenta
+real supere total / capacidad está garantizada en el resumen, y la cuenta
+estimada nunca es menor que la real (ni la supera en más de `error`).
+Admite pesos, así que sirve igual para viajes que para ingresos.
+
+`DestacadosDiarios` agrupa los resúmenes de un día (conductores por viajes
+e ingresos, clientes por frecuencia, zonas de origen y destino) y guarda los
+de los últimos días para combinarlos en una ventana móvil.
+"""
+import heapq
+import threading
+from collections import deque
+
+
+class TopK:
+    """
+    Resumen Space-Saving de las claves más pesadas de un flujo.
+
+    Args:
+        k: cuántas claves devuelve top()
+        capacidad: contadores guardados (por defecto 10 * k); más contadores,
+            menos error
+    """
+
+    def __init__(self, k=5, capacidad=None):
+        self.k = k
+        self.capacidad = max(k, capacidad or 10 * k)
+        self.total = 0
+        self._contadores = {}  # clave -> [cuenta, error, etiqueta]
+        self._heap = []        # (cuenta, clave) con entradas caducadas, limpieza perezosa
+
+    def __len__(self):
+        return len(self._contadores)
+
+    def anadir(self, clave, peso=1, etiqueta=None):
+        """Suma `peso` a la clave y devuelve su cuenta estimada."""
+        self.total += peso
+        contador = self._contadores.get(clave)
+        if contador is None:
+            if len(self._contadores) < self.capacidad:
+                contador = [0, 0, etiqueta]
+            else:
+                minimo = self._extraer_minimo()
+                contador = [minimo, minimo, etiqueta]
+            self._contadores[clave] = contador
+        elif etiqueta is not None:
+            contador[2] = etiqueta
+        contador[0] += peso
+        heapq.heappush(self._heap, (contador[0], clave))
+        if len(self._heap) > 4 * self.capacidad:
+            self._heap = [(c[0], clave) for clave, c in self._contadores.items()]
+            heapq.heapify(self._heap)
+        return contador[0]
+
+    def _extraer_minimo(self):
+        """Quita la clave de menor cuenta y devuelve esa cuenta."""
+        while True:
+            cuenta, clave = heapq.heappop(self._heap)
+            contador = self._contadores.get(clave)
+            if contador is not None and contador[0] == cuenta:
+                del self._contadores[clave]
+                return cuenta
+
+    def cuenta(self, clave):
+        contador = self._contadores.get(clave)
+        return contador[0] if contador is not None else 0
+
+    def top(self, n=None):
+        """Lista [(clave, cuenta, error, etiqueta)] de mayor a menor cuenta."""
+        return heapq.nlargest(n or self.k,
+                              ((clave, c[0], c[1], c[2]) for clave, c in self._contadores.items()),
+                              key=lambda t: t[1])
+
+    def exportar(self):
+        """Estado serializable en JSON (para los puntos de control)."""
+        return {"k": self.k, "capacidad": self.capacidad, "total": self.total,
+                "contadores": [[clave, *contador] for clave, contador in self._contadores.items()]}
+
+    @classmethod
+    def importar(cls, estado):
+        resumen = cls(estado["k"], estado["capacidad"])
+        resumen.total = estado["total"]
+        resumen._contadores = {clave: [cuenta, error, etiqueta]
+                               for clave, cuenta, error, etiqueta in estado["contadores"]}
+        resumen._heap = [(c[0], clave) for clave, c in resumen._contadores.items()]
+        heapq.heapify(resumen._heap)
+        return resumen
+
+    def fusionar(self, otro):
+        """
+        Nuevo TopK con la suma de dos resúmenes (para varios días). Se
+        conservan los `capacidad` contadores mayores.
+        """
+        resultado = TopK(self.k, self.capacidad)
+        combinados = {}
+        for resumen in (self, otro):
+            for clave, (cuenta, error, etiqueta) in resumen._contadores.items():
+                previo = combinados.get(clave)
+                if previo is None:
+                    combinados[clave] = [cuenta, error, etiqueta]
+                else:
+                    previo[0] += cuenta
+                    previo[1] += error
+                    previo[2] = etiqueta if etiqueta is not None else previo[2]
+        for clave, contador in heapq.nlargest(resultado.capacidad, combinados.items(),
+                                              key=lambda item: item[1][0]):
+            resultado._contadores[clave] = contador
+        resultado._heap = [(c[0], clave) for clave, c in resultado._contadores.items()]
+        heapq.heapify(resultado._heap)
+        resultado.total = self.total + otro.total
+        return resultado
+
+
+# Resúmenes que se llevan por día: nombre -> (título, unidad)
+CATEGORIAS = {
+    "conductores_viajes": ("Conductores por viajes", "viajes"),
+    "conductores_ingresos": ("Conductores por ingresos", "€"),
+    "clientes_frecuencia": ("Clientes más frecuentes", "viajes"),
+    "zonas_origen": ("Zonas de origen", "viajes"),
+    "zonas_destino": ("Zonas de destino", "viajes"),
+}
+
+
+class DestacadosDiarios:
+    """
+    Top-K del día en curso y de los últimos `dias` días.
+
+    Args:
+        k: entradas por lista
+        dias: días de la ventana móvil, contando el día en curso (se guardan
+            dias - 1 días cerrados)
+        capacidad: contadores por resumen (ver TopK)
+    """
+
+    def __init__(self, k=5, dias=7, capacidad=None):
+        self.k = k
+        self.dias = dias
+        self.capacidad = capacidad
+        self._hoy = self._nuevo_dia()
+        self._anteriores = deque(maxlen=self._cerrados_ventana())
+        self._mutex = threading.Lock()
+
+    def _cerrados_ventana(self):
+        return max(self.dias - 1, 0)
+
+    def _nuevo_dia(self):
+        return {nombre: TopK(self.k, self.capacidad) for nombre in CATEGORIAS}
+
+    def registrar_viaje(self, id_conductor, nombre_conductor, id_cliente, nombre_cliente,
+                        tarifa, zona_origen=None, zona_destino=None):
+        """
+        Anota un viaje completado.
+
+        Returns:
+            (viajes del conductor hoy, viajes del cliente hoy), estimados
+        """
+        with self._mutex:
+            hoy = self._hoy
+            viajes_conductor = hoy["conductores_viajes"].anadir(id_conductor, 1, nombre_conductor)
+            hoy["conductores_ingresos"].anadir(id_conductor, tarifa, nombre_conductor)
+            viajes_cliente = hoy["clientes_frecuencia"].anadir(id_cliente, 1, nombre_cliente)
+            if zona_origen is not None:
+                hoy["zonas_origen"].anadir(zona_origen)
+            if zona_destino is not None:
+                hoy["zonas_destino"].anadir(zona_destino)
+        return viajes_conductor, viajes_cliente
+
+    def cerrar_dia(self):
+        """Cierra el día en curso y devuelve sus listas top-K (ver listas())."""
+        with self._mutex:
+            dia = self._hoy
+            self._anteriores.append(dia)
+            self._hoy = self._nuevo_dia()
+        return self._listas(dia)
+
+    def exportar(self):
+        """Estado serializable en JSON: día en curso y días guardados."""
+        with self._mutex:
+            return {
+                "hoy": {nombre: resumen.exportar() for nombre, resumen in self._hoy.items()},
+                "anteriores": [{nombre: resumen.exportar() for nombre, resumen in dia.items()}
+                               for dia in self._anteriores],
+            }
+
+    def importar(self, estado):
+        """Sustituye el estado por uno exportado con exportar()."""
+        def dia(resumenes):
+            return {nombre: TopK.importar(r) for nombre, r in resumenes.items()}
+        with self._mutex:
+            self._hoy = dia(estado["hoy"])
+            self._anteriores = deque((dia(d) for d in estado["anteriores"]), maxlen=self._cerrados_ventana())
+
+    def listas(self, ventana=False):
+        """
+        Listas top-K del día en curso o, con `ventana`, de los últimos `dias`
+        días (el día en curso más los dias - 1 últimos cerrados).
+
+        Returns:
+            {categoría: [{"clave", "nombre", "valor", "error"}, ...]}
+        """
+        with self._mutex:
+            resumenes = dict(self._hoy)
+            if ventana:
+                for dia in self._anteriores:
+                    resumenes = {nombre: resumenes[nombre].fusionar(dia[nombre]) for nombre in CATEGORIAS}
+            return self._listas(resumenes)
+
+    def _listas(self, resumenes):
+        return {
+            nombre: [
+                {
+                    "clave": clave,
+                    "nombre": etiqueta if etiqueta is not None else str(clave),
+                    "valor": round(cuenta, 2),
+                    "error": round(error, 2),
+                }
+                for clave, cuenta, error, etiqueta in resumenes[nombre].top()
+            ]
+            for nombre in CATEGORIAS
+        }
@@ -0,0 +1,184 @@
+"""
+Trazas del ciclo de vida de cada solicitud.
+
+Cada SolicitudServicio recibe un id de traza. Si la solicitud sale en el
+muestreo, los puntos por los que pasa (hilo Cliente, procesar, lock de
+match, selección, taxi, recogida, destino, locks de contabilidad...) se
+anotan con un instante monotónico. Al terminar la solicitud la traza se
+escribe como una línea JSON. El intervalo entre dos marcas consecutivas es
+una etapa; las esperas de lock son los intervalos que acaban en la marca
+del lock (p. ej. procesar -> mutex_match).
+
+Sin muestreo, marcar() se reduce a leer un atributo que vale None.
+
+Análisis de un archivo de trazas:
+    python -m core.trazas trazas.jsonl
+"""
+import atexit
+import itertools
+import json
+import os
+import random
+import threading
+import time
+
+VARIABLE_RUTA = "UNIETAXI_TRAZAS"
+VARIABLE_MUESTREO = "UNIETAXI_TRAZAS_MUESTREO"
+
+
+def marcar(solicitud, nombre):
+    """Anota que la solicitud pasa por `nombre` (solo si está trazada)."""
+    traza = solicitud.traza
+    if traza is not None:
+        traza.marcas.append((nombre, time.perf_counter()))
+
+
+class Traza:
+    """Marcas (nombre, instante perf_counter) de una solicitud."""
+    __slots__ = ("inicio_epoch", "marcas")
+
+    def __init__(self):
+        self.inicio_epoch = time.time()
+        self.marcas = []
+
+
+class Trazador:
+    """
+    Asigna ids de traza, decide el muestreo y escribe las trazas en JSONL.
+
+    Args:
+        ruta: archivo JSONL de salida; None desactiva el trazado
+        muestreo: fracción de solicitudes que se trazan (0-1)
+
+    El archivo se abre con la primera traza y se cierra con finalizar(), al
+    salir de un bloque `with` o al terminar el intérprete (atexit).
+    """
+
+    def __init__(self, ruta=None, muestreo=1.0):
+        self.ruta = ruta
+        self.muestreo = muestreo if ruta else 0.0
+        self._ids = itertools.count(1)
+        self._prefijo = f"{os.getpid():x}"
+        self._rng = random.Random()
+        self._archivo = None
+        self._mutex = threading.Lock()
+        self.escritas = 0
+        if ruta:
+            atexit.register(self.finalizar)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.finalizar()
+
+    @classmethod
+    def desde_entorno(cls):
+        ruta = os.environ.get(VARIABLE_RUTA) or None
+        return cls(ruta, float(os.environ.get(VARIABLE_MUESTREO, "1.0")))
+
+    def iniciar(self, solicitud):
+        """Da id de traza a la solicitud (una sola vez) y decide si se traza."""
+        if solicitud.id_traza is not None:
+            return
+        solicitud.id_traza = f"{self._prefijo}-{next(self._ids):x}"
+        if self.muestreo and (self.muestreo >= 1.0 or self._rng.random() < self.muestreo):
+            solicitud.traza = Traza()
+
+    def cerrar(self, solicitud, aceptado, id_taxi=None):
+        """Escribe la traza de una solicitud terminada (si estaba trazada)."""
+        traza = solicitud.traza
+        if traza is None:
+            return
+        solicitud.traza = None
+        t0 = traza.marcas[0][1]
+        registro = {
+            "id_traza": solicitud.id_traza,
+            "id_cliente": solicitud.id_cliente,
+            "id_taxi": id_taxi,
+            "aceptado": aceptado,
+            "inicio": round(traza.inicio_epoch, 6),
+            "marcas": [[nombre, round((t - t0) * 1000, 4)] for nombre, t in traza.marcas],
+        }
+        linea = json.dumps(registro, separators=(",", ":")) + "\n"
+        with self._mutex:
+            if self._archivo is None:
+                self._archivo = open(self.ruta, "a", encoding="utf-8")
+            self._archivo.write(linea)
+            self._archivo.flush()  # main_terminal sale con os._exit
+            self.escritas += 1
+
+    def finalizar(self):
+        """Cierra el archivo de trazas; una traza posterior lo vuelve a abrir."""
+        with self._mutex:
+            if self._archivo is not None:
+                self._archivo.close()
+                self._archivo = None
+
+
+# === Análisis ===
+
+def leer_trazas(ruta):
+    with open(ruta, encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+
+def desglose_etapas(trazas):
+    """
+    Duración de cada etapa (par de marcas consecutivas) en todas las trazas.
+
+    Returns:
+        {"origen -> destino": [ms, ...]} en orden de primera aparición,
+        más "total" con la duración de cada traza
+    """
+    etapas = {}
+    totales = []
+    for traza in trazas:
+        marcas = traza["marcas"]
+        for (a, ta), (b, tb) in zip(marcas, marcas[1:]):
+            etapas.setdefault(f"{a} -> {b}", []).append(tb - ta)
+        if marcas:
+            totales.append(marcas[-1][1] - marcas[0][1])
+    etapas["total"] = totales
+    return etapas
+
+
+def _percentil(ordenados, p):
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))]
+
+
+def formatear_desglose(etapas):
+    """Tabla por etapa: n, media, p50, p95, p99 y peso en el tiempo total."""
+    total = sum(etapas.get("total", [])) or 1.0
+    lineas = [f"{'etapa':<44}{'n':>7}{'media ms':>11}{'p50':>9}{'p95':>9}{'p99':>9}{'% total':>9}"]
+    for etapa, valores in etapas.items():
+        ordenados = sorted(valores)
+        media = sum(ordenados) / len(ordenados) if ordenados else 0.0
+        peso = "" if etapa == "total" else f"{sum(ordenados) / total:>9.1%}"
+        lineas.append(f"{etapa:<44}{len(ordenados):>7}{media:>11.3f}{_percentil(ordenados, 50):>9.3f}"
+                      f"{_percentil(ordenados, 95):>9.3f}{_percentil(ordenados, 99):>9.3f}{peso}")
+    return "\n".join(lineas)
+
+
+def _analizar(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Desglose por etapas de un archivo de trazas")
+    parser.add_argument("ruta", help="Archivo JSONL escrito por el Trazador")
+    parser.add_argument("--aceptadas", action="store_true", help="Solo solicitudes con taxi")
+    parser.add_argument("--rechazadas", action="store_true", help="Solo solicitudes rechazadas")
+    args = parser.parse_args(argv)
+
+    trazas = leer_trazas(args.ruta)
+    if args.aceptadas:
+        trazas = [t for t in trazas if t["aceptado"]]
+    if args.rechazadas:
+        trazas = [t for t in trazas if not t["aceptado"]]
+    print(f"{len(trazas)} trazas")
+    print(formatear_desglose(desglose_etapas(trazas)))
+
+
+if __name__ == "__main__":
+    _analizar()
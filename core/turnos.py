@@ -0,0 +1,104 @@
+"""
+Turnos de la flota: qué taxis trabajan cada día.
+
+`GestorTurnos` conoce todos los taxis que han pasado por el sistema,
+identificados por su cédula (id_taxi), y en `sistema.taxis` deja solo los
+que están de turno, que son los únicos que entran en la asignación. Un taxi
+que vuelve otro día se reutiliza (mismo objeto y mismo hilo, con sus
+estadísticas); los que no vienen o vienen como no disponibles salen de la
+asignación, y si estaban en un viaje lo terminan con normalidad.
+
+Los hilos de los taxis siguen arrancando con su primer viaje, así que un
+taxi que nunca está disponible no llega a tener hilo.
+"""
+import threading
+
+from .taxi import Taxi
+
+
+class GestorTurnos:
+    """
+    Registro de la flota completa y del turno en curso.
+
+    Args:
+        sistema: SistemaCentral cuyo `taxis` se ajusta al turno
+    """
+
+    def __init__(self, sistema):
+        self.sistema = sistema
+        self._flota = {}   # id_taxi -> Taxi (de turno o no)
+        self._mutex = threading.Lock()
+
+    def registrar(self, taxi):
+        """Da de alta un taxi creado fuera del gestor (demo, punto de control...)."""
+        with self._mutex:
+            self._flota.setdefault(taxi.id_taxi, taxi)
+
+    def obtener(self, id_taxi):
+        with self._mutex:
+            self._incorporar_sueltos()
+            return self._flota.get(id_taxi)
+
+    def todos(self):
+        """Todos los taxis conocidos, de turno o no (para reportes y puntos de control)."""
+        with self._mutex:
+            self._incorporar_sueltos()
+            return list(self._flota.values())
+
+    def en_turno(self):
+        return list(self.sistema.taxis)
+
+    def _incorporar_sueltos(self):
+        """Taxis añadidos directamente a sistema.taxis (con el lock tomado)."""
+        for taxi in list(self.sistema.taxis):
+            self._flota.setdefault(taxi.id_taxi, taxi)
+
+    def aplicar_turno(self, registros):
+        """
+        Aplica el turno de un día a partir de las líneas del archivo de taxis
+        (diccionarios de DataLoader.leer_archivo_taxis).
+
+        Returns:
+            {"en_turno", "nuevos", "reutilizados", "desactivados"}: ids de taxi
+        """
+        sistema = self.sistema
+        nuevos, reutilizados, turno = [], [], []
+        with self._mutex:
+            self._incorporar_sueltos()
+            for datos in registros:
+                id_taxi = int(datos["cedula"])
+                taxi = self._flota.get(id_taxi)
+                if taxi is None:
+                    taxi = Taxi(
+                        id_taxi=id_taxi,
+                        nombre=f"{datos['nombre']} {datos['apellido']}",
+                        placa=datos["placa"],
+                        velocidad_kph=datos["velocidad"],
+                        sistema_central=sistema,
+                    )
+                    self._flota[id_taxi] = taxi
+                    nuevos.append(id_taxi)
+                else:
+                    # Los datos del archivo mandan (puede cambiar de coche)
+                    taxi.nombre = f"{datos['nombre']} {datos['apellido']}"
+                    taxi.placa = datos["placa"]
+                    taxi.velocidad_kph = datos["velocidad"]
+                    reutilizados.append(id_taxi)
+                # Atributos extra requeridos para el reporte mensual
+                taxi.marca = datos["marca"]
+                taxi.modelo = datos["modelo"]
+                # Día nuevo: el balance de carga de Senafiris empieza de cero
+                taxi.viajes_hoy = 0
+                if datos["disponible"] and taxi not in turno:
+                    turno.append(taxi)
+
+        # Cambio del conjunto de asignación de una vez, sin que un match lo vea a medias
+        with sistema.mutex_match:
+            anteriores = {t.id_taxi for t in sistema.taxis}
+            sistema.taxis[:] = turno
+        en_turno = [t.id_taxi for t in turno]
+        desactivados = sorted(anteriores - set(en_turno))
+        with sistema.mutex_servicio:
+            sistema.version_reportes += 1
+        return {"en_turno": en_turno, "nuevos": nuevos, "reutilizados": reutilizados,
+                "desactivados": desactivados}
@@ -0,0 +1,212 @@
+"""
+Viajes compartidos con planificación por inserción.
+
+Con el modo compartido un taxi lleva un plan ordenado de paradas (recogidas
+y entregas, ver Taxi.anadir_paradas) y puede aceptar solicitudes nuevas
+mientras recorre el plan. Para una solicitud se prueba, en cada taxi
+ocupado que pasa cerca, cada par de posiciones (recogida i, entrega j >= i)
+y se queda la inserción más barata (menos km añadidos a la ruta) que
+cumple las restricciones:
+
+- nunca más de `capacidad` pasajeros a bordo a la vez;
+- ningún pasajero, ni los ya asignados ni el nuevo, recorre más de
+  (1 + desvio_maximo) * km directos + holgura_km desde que sube;
+- el taxi llega a la nueva recogida en menos de recogida_max_km de ruta
+  (sin esto los planes crecen encadenando viajes y la espera se dispara).
+
+SistemaCentral compara esa inserción con mandar un taxi libre (km en vacío
+hasta la recogida más el viaje) y elige la opción con menos km. La tarifa
+se reparte en Taxi._calcular_costo: cada tramo se divide entre los
+pasajeros que iban a bordo.
+"""
+import os
+
+from .distancias import distancia_euclidiana
+from .taxi import Parada
+
+VARIABLE_CAPACIDAD = "UNIETAXI_COMPARTIDO"
+VARIABLE_DESVIO = "UNIETAXI_COMPARTIDO_DESVIO"
+
+
+class PlanificadorCompartido:
+    """
+    Búsqueda de la inserción más barata de una solicitud en los planes de
+    los taxis ocupados.
+
+    Args:
+        capacidad: pasajeros a bordo a la vez como máximo
+        desvio_maximo: recorrido extra permitido a cada pasajero, relativo a
+            su viaje directo (0.5 = hasta un 50 % más)
+        holgura_km: km extra permitidos siempre (para viajes muy cortos)
+        recogida_max_km: km de ruta máximos hasta la nueva recogida
+        max_candidatos: taxis más cercanos que se evalúan como mucho
+    """
+
+    def __init__(self, capacidad=3, desvio_maximo=0.5, holgura_km=0.5, recogida_max_km=3.0, max_candidatos=10):
+        self.capacidad = capacidad
+        self.desvio_maximo = desvio_maximo
+        self.holgura_km = holgura_km
+        self.recogida_max_km = recogida_max_km
+        self.max_candidatos = max_candidatos
+
+    @classmethod
+    def desde_entorno(cls):
+        """Planificador configurado por entorno, o None si el modo está desactivado."""
+        capacidad = int(os.environ.get(VARIABLE_CAPACIDAD, "0") or 0)
+        if capacidad < 2:
+            return None
+        return cls(capacidad, float(os.environ.get(VARIABLE_DESVIO, "0.5")))
+
+    def limite_km(self, solicitud, distancia):
+        """Km máximos a bordo para `solicitud` (calcula y guarda sus km directos)."""
+        directo = getattr(solicitud, "km_directo", None)
+        if directo is None:
+            directo = solicitud.km_directo = distancia(solicitud.origen, solicitud.destino)
+        return (1 + self.desvio_maximo) * directo + self.holgura_km
+
+    def _recorrer(self, inicio, a_bordo, paradas, distancia, nueva=None):
+        """
+        Simula una ruta.
+
+        Returns:
+            (km totales, km hasta la recogida de `nueva`) o None si incumple
+            capacidad o desvío
+        """
+        posicion = inicio
+        recorrido = dict(a_bordo)
+        total = 0.0
+        hasta_recogida = None
+        for parada in paradas:
+            tramo = distancia(posicion, parada.punto)
+            total += tramo
+            for pasajero in recorrido:
+                recorrido[pasajero] += tramo
+            if parada.tipo == "recogida":
+                if len(recorrido) >= self.capacidad:
+                    return None
+                recorrido[parada.solicitud] = 0.0
+                if parada.solicitud is nueva:
+                    if total > self.recogida_max_km:
+                        return None
+                    hasta_recogida = total
+            else:
+                if recorrido.pop(parada.solicitud) > self.limite_km(parada.solicitud, distancia):
+                    return None
+            posicion = parada.punto
+        return total, hasta_recogida
+
+    def mejor_insercion(self, taxi, solicitud, distancia):
+        """
+        Inserción más barata de `solicitud` en el plan de `taxi`.
+
+        Returns:
+            dict con taxi, i, j, km_extra, km_hasta_recogida y version, o None
+        """
+        inicio, a_bordo, paradas, version = self._punto_de_partida(taxi, distancia)
+
+        # Distancias memorizadas: cada par se pide muchas veces
+        memoria = {}
+
+        def distancia_memo(a, b):
+            clave = (a, b)
+            if clave not in memoria:
+                memoria[clave] = distancia(a, b)
+            return memoria[clave]
+
+        base = self._recorrer(inicio, a_bordo, paradas, distancia_memo)
+        if base is None:
+            return None
+        recogida = Parada("recogida", solicitud, solicitud.origen)
+        entrega = Parada("entrega", solicitud, solicitud.destino)
+        mejor = None
+        n = len(paradas)
+        puntos = [inicio] + [p.punto for p in paradas]
+        hasta = 0.0   # km de ruta hasta la parada i-1: cota inferior de la espera
+        for i in range(n + 1):
+            if i > 0:
+                hasta += distancia_memo(puntos[i - 1], puntos[i])
+            if hasta > self.recogida_max_km:
+                break
+            for j in range(i, n + 1):
+                ruta = paradas[:j] + [entrega] + paradas[j:]
+                ruta.insert(i, recogida)
+                evaluada = self._recorrer(inicio, a_bordo, ruta, distancia_memo, nueva=solicitud)
+                if evaluada is None:
+                    continue
+                km_extra = evaluada[0] - base[0]
+                if mejor is None or km_extra < mejor["km_extra"]:
+                    mejor = {"taxi": taxi, "i": i, "j": j, "km_extra": km_extra,
+                             "km_hasta_recogida": evaluada[1], "version": version}
+        return mejor
+
+    @staticmethod
+    def _punto_de_partida(taxi, distancia):
+        """
+        El plan visto desde el final del tramo en curso.
+
+        Returns:
+            (inicio, {solicitud: km a bordo en inicio}, paradas, version)
+        """
+        posicion, actual, a_bordo, paradas, version = taxi.estado_plan()
+        if actual is None:
+            return posicion, a_bordo, paradas, version
+        tramo = distancia(posicion, actual.punto)
+        a_bordo = {pasajero: km + tramo for pasajero, km in a_bordo.items()}
+        if actual.tipo == "recogida":
+            a_bordo[actual.solicitud] = 0.0
+        else:
+            a_bordo.pop(actual.solicitud)
+        return actual.punto, a_bordo, paradas, version
+
+    def candidatos(self, solicitud, taxis):
+        """
+        Taxis con plan que pueden llegar a la recogida dentro de
+        recogida_max_km, más cercanos primero (la línea recta desde donde
+        acaba su tramo en curso es una cota inferior de la espera).
+        """
+        cercanos = []
+        for taxi in taxis:
+            posicion, actual, _, paradas, _ = taxi.estado_plan()
+            if actual is None and not paradas:
+                continue
+            inicio = actual.punto if actual is not None else posicion
+            minima = distancia_euclidiana(inicio, solicitud.origen)
+            if minima <= self.recogida_max_km:
+                cercanos.append((minima, taxi))
+        cercanos.sort(key=lambda c: c[0])
+        return [taxi for _, taxi in cercanos[:self.max_candidatos]]
+
+    def buscar(self, solicitud, taxis, distancia):
+        """
+        Mejor inserción de `solicitud` entre los taxis ocupados de `taxis`.
+
+        Args:
+            distancia: función (a, b) -> km
+
+        Returns:
+            dict de mejor_insercion o None
+        """
+        mejor = None
+        for taxi in self.candidatos(solicitud, taxis):
+            insercion = self.mejor_insercion(taxi, solicitud, distancia)
+            if insercion is not None and (mejor is None or insercion["km_extra"] < mejor["km_extra"]):
+                mejor = insercion
+        return mejor
+
+    def insertar(self, insercion, solicitud, distancia):
+        """
+        Aplica una inserción; si el plan del taxi cambió entretanto la
+        recalcula una vez sobre el plan nuevo.
+
+        Returns:
+            la inserción aplicada o None si ya no es posible
+        """
+        taxi = insercion["taxi"]
+        if taxi.anadir_paradas(solicitud, insercion["i"], insercion["j"], insercion["version"]):
+            return insercion
+        insercion = self.mejor_insercion(taxi, solicitud, distancia)
+        if insercion is not None and taxi.anadir_paradas(solicitud, insercion["i"], insercion["j"],
+                                                         insercion["version"]):
+            return insercion
+        return None
+
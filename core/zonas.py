@@ -0,0 +1,231 @@
+"""
+Matriz precalculada de tiempos y distancias entre zonas de la ciudad.
+
+El plano del simulador se divide en una rejilla de zonas rectangulares.
+Para cada par (zona origen, zona destino) se guarda la distancia en km y el
+tiempo de viaje en segundos, opcionalmente por franja horaria (24 horas).
+Las consultas de ETA son un acceso directo a un array NumPy (O(1)), y la
+matriz se refina de forma incremental con los viajes que se completan.
+"""
+import threading
+
+import numpy as np
+
+from .distancias import matriz_distancias_euclidianas
+
+# Factor de congestión por hora del día (1.0 = tráfico fluido de referencia)
+PERFIL_HORARIO_DEFECTO = (
+    0.8, 0.8, 0.8, 0.8, 0.8, 0.9,     # 00-05
+    1.0, 1.2, 1.4, 1.3, 1.1, 1.0,     # 06-11
+    1.1, 1.2, 1.1, 1.0, 1.1, 1.3,     # 12-17
+    1.4, 1.3, 1.1, 1.0, 0.9, 0.8,     # 18-23
+)
+
+
+class Rejilla:
+    """
+    Rejilla de zonas rectangulares sobre el plano del simulador. La comparten
+    la matriz de zonas, la tarifa zonal y el rebalanceo.
+
+    Args:
+        filas, columnas: zonas por lado
+        ancho_km, alto_km: tamaño de la zona cubierta
+        origen_x, origen_y: esquina inferior izquierda
+    """
+
+    def __init__(self, filas=10, columnas=10, ancho_km=10.0, alto_km=10.0, origen_x=0.0, origen_y=0.0):
+        self.filas = filas
+        self.columnas = columnas
+        self.origen_x = origen_x
+        self.origen_y = origen_y
+        self.ancho_zona = ancho_km / columnas
+        self.alto_zona = alto_km / filas
+
+    @property
+    def num_zonas(self):
+        return self.filas * self.columnas
+
+    def zona_de(self, punto):
+        """Índice de la zona que contiene un punto (x, y); los bordes se recortan."""
+        col = int((punto[0] - self.origen_x) / self.ancho_zona)
+        fila = int((punto[1] - self.origen_y) / self.alto_zona)
+        col = min(max(col, 0), self.columnas - 1)
+        fila = min(max(fila, 0), self.filas - 1)
+        return fila * self.columnas + col
+
+    def zonas_de(self, puntos):
+        """Índices de zona de varios puntos (vectorizado)."""
+        pts = np.asarray(puntos, dtype=np.float64).reshape(-1, 2)
+        col = np.clip(((pts[:, 0] - self.origen_x) / self.ancho_zona).astype(np.int64),
+                      0, self.columnas - 1)
+        fila = np.clip(((pts[:, 1] - self.origen_y) / self.alto_zona).astype(np.int64),
+                       0, self.filas - 1)
+        return fila * self.columnas + col
+
+    def centroides(self):
+        """Array (Z, 2) con el centro de cada zona."""
+        fila, col = np.divmod(np.arange(self.num_zonas), self.columnas)
+        x = self.origen_x + (col + 0.5) * self.ancho_zona
+        y = self.origen_y + (fila + 0.5) * self.alto_zona
+        return np.column_stack([x, y])
+
+
+class MatrizZonas(Rejilla):
+    """
+    Rejilla de zonas con matrices zona-a-zona de km y segundos.
+
+    Atributos:
+        km: array float32 (Z, Z) con la distancia entre zonas.
+        segundos: array float32 (F, Z, Z), F = 24 franjas horarias o 1 si
+            la matriz no depende de la hora.
+        observaciones: array uint32 (Z, Z) con viajes reales registrados.
+    """
+
+    def __init__(self, filas=10, columnas=10, ancho_km=10.0, alto_km=10.0,
+                 origen_x=0.0, origen_y=0.0, por_hora=True, alfa=0.2):
+        super().__init__(filas, columnas, ancho_km, alto_km, origen_x, origen_y)
+        self.por_hora = por_hora
+        self.alfa = alfa  # peso de cada viaje observado en la media móvil
+
+        z = filas * columnas
+        franjas = 24 if por_hora else 1
+        self.km = np.zeros((z, z), dtype=np.float32)
+        self.segundos = np.zeros((franjas, z, z), dtype=np.float32)
+        self.observaciones = np.zeros((z, z), dtype=np.uint32)
+        self._mutex = threading.Lock()
+
+    # === Franjas horarias ===
+
+    def franja(self, hora):
+        """Índice de franja horaria (0 si la matriz no depende de la hora)."""
+        if not self.por_hora or hora is None:
+            return 0
+        return int(hora) % 24
+
+    # === Construcción ===
+
+    def construir(self, red_vial=None, velocidad_kph=30, factor_desvio=1.3,
+                  perfil_horario=PERFIL_HORARIO_DEFECTO):
+        """
+        Rellena las matrices.
+
+        Con `red_vial` se hace un Dijkstra desde el nodo más cercano al centro
+        de cada zona. Sin red se usa la línea recta entre centros multiplicada
+        por `factor_desvio` a `velocidad_kph`. El perfil horario escala los
+        tiempos base de cada franja.
+
+        Dentro de una zona (diagonal) no hay ruta entre centros: se usa la
+        distancia media entre dos puntos de la zona con el desvío y la
+        velocidad de la red hacia sus zonas vecinas, o `factor_desvio` y
+        `velocidad_kph` sin red (o si la zona no tiene vecinas alcanzables).
+        """
+        centros = self.centroides()
+        if red_vial is not None:
+            nodos = red_vial.nodos_mas_cercanos(centros)
+            km = np.empty((self.num_zonas, self.num_zonas))
+            seg = np.empty((self.num_zonas, self.num_zonas))
+            for zo, nodo in enumerate(nodos):
+                seg_arbol, km_arbol = red_vial.tiempos_desde_nodo(int(nodo))
+                km[zo] = km_arbol[nodos]
+                seg[zo] = seg_arbol[nodos]
+        else:
+            km = matriz_distancias_euclidianas(centros) * factor_desvio
+            seg = km / velocidad_kph * 3600
+
+        # Dentro de una misma zona: distancia media entre dos puntos al azar
+        # de un rectángulo (~0.52 veces su diagonal)
+        km_recta_intra = 0.52 * np.hypot(self.ancho_zona, self.alto_zona)
+        desvio, velocidad = factor_desvio, velocidad_kph
+        if red_vial is not None:
+            desvio, velocidad = self._desvio_y_velocidad_vecinas(centros, km, seg, factor_desvio, velocidad_kph)
+        km_intra = km_recta_intra * desvio
+        np.fill_diagonal(km, km_intra)
+        np.fill_diagonal(seg, km_intra / velocidad * 3600)
+
+        perfil = np.asarray(perfil_horario if self.por_hora else (1.0,), dtype=np.float32)
+        with self._mutex:
+            self.km[:] = km
+            self.segundos[:] = seg[None, :, :] * perfil[:, None, None]
+            self.observaciones[:] = 0
+        return self
+
+    def _desvio_y_velocidad_vecinas(self, centros, km, seg, factor_desvio, velocidad_kph):
+        """
+        Por zona, desvío (km por red / km en línea recta) y velocidad media de
+        las rutas de la red hacia sus hasta 8 zonas vecinas.
+
+        Returns:
+            (desvio, velocidad_kph): arrays (Z,); las zonas sin vecinas
+            alcanzables se quedan con los valores por defecto
+        """
+        fila, col = np.divmod(np.arange(self.num_zonas), self.columnas)
+        vecinas = ((np.abs(fila[:, None] - fila[None, :]) <= 1)
+                   & (np.abs(col[:, None] - col[None, :]) <= 1))
+        np.fill_diagonal(vecinas, False)
+        recta = matriz_distancias_euclidianas(centros)
+        validas = vecinas & np.isfinite(km) & (km > 0) & (seg > 0) & (recta > 0)
+        n = validas.sum(axis=1)
+        km_red = np.where(validas, km, 0.0)
+        desvio = np.where(n > 0, (km_red / np.where(validas, recta, 1.0)).sum(axis=1) / np.maximum(n, 1),
+                          factor_desvio)
+        segundos = np.where(validas, seg, 0.0).sum(axis=1)
+        velocidad = np.where(n > 0, km_red.sum(axis=1) / np.where(n > 0, segundos, 1.0) * 3600, velocidad_kph)
+        return desvio, velocidad
+
+    # === Consultas O(1) ===
+
+    def eta(self, origen, destino, hora=None):
+        """Segundos estimados de origen a destino (puntos x, y)."""
+        return float(self.segundos[self.franja(hora), self.zona_de(origen), self.zona_de(destino)])
+
+    def estimar(self, origen, destino, hora=None):
+        """(km, segundos) estimados de origen a destino (puntos x, y)."""
+        zo = self.zona_de(origen)
+        zd = self.zona_de(destino)
+        return float(self.km[zo, zd]), float(self.segundos[self.franja(hora), zo, zd])
+
+    def etas_hacia(self, origenes, destino, hora=None):
+        """Array (n,) de segundos desde varios orígenes a un destino (vectorizado)."""
+        return self.segundos[self.franja(hora), self.zonas_de(origenes), self.zona_de(destino)]
+
+    # === Refresco incremental ===
+
+    def registrar_viaje(self, origen, destino, segundos, hora=None):
+        """
+        Incorpora el tiempo real de un viaje completado con una media móvil
+        exponencial sobre la celda (franja, zona origen, zona destino).
+        """
+        if segundos is None or segundos <= 0:
+            return
+        f = self.franja(hora)
+        zo = self.zona_de(origen)
+        zd = self.zona_de(destino)
+        with self._mutex:
+            actual = self.segundos[f, zo, zd]
+            self.segundos[f, zo, zd] = actual + self.alfa * (segundos - actual)
+            self.observaciones[zo, zd] += 1
+
+    # === Persistencia ===
+
+    def guardar(self, filepath):
+        """Guarda la matriz en formato .npz comprimido."""
+        with self._mutex:
+            np.savez_compressed(
+                filepath,
+                geometria=np.array([self.filas, self.columnas, self.origen_x, self.origen_y,
+                                    self.ancho_zona, self.alto_zona, self.alfa]),
+                km=self.km, segundos=self.segundos, observaciones=self.observaciones,
+            )
+
+    @classmethod
+    def cargar(cls, filepath):
+        """Carga una matriz guardada con `guardar`."""
+        with np.load(filepath) as datos:
+            filas, columnas, ox, oy, ancho, alto, alfa = datos["geometria"].tolist()
+            filas, columnas = int(filas), int(columnas)
+            matriz = cls(filas, columnas, ancho * columnas, alto * filas, ox, oy,
+                         por_hora=datos["segundos"].shape[0] == 24, alfa=alfa)
+            matriz.km[:] = datos["km"]
+            matriz.segundos[:] = datos["segundos"]
+            matriz.observaciones[:] = datos["observaciones"]
+        return matriz
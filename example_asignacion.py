@@ -110,7 +110,7 @@ def main():
     print(f"  - Total viajes hoy: {sistema.viajes_totales_hoy}")
     print(f"  - Ganancias totales: {sistema.ganancias_totales_hoy} €")
     print(f"  - Conductor más activo: {sistema.conductor_mas_viajes_hoy[0].nombre} ({sistema.conductor_mas_viajes_hoy[1]} viajes)")
-    print(f"  - Cliente más frecuente: {sistema.cliente_mas_frecuente_hoy.nombre} ({sistema.cliente_mas_frecuente_hoy.estrellas}⭐)")
+    print(f"  - Cliente más frecuente: {sistema.cliente_mas_frecuente_hoy[0].nombre} ({sistema.cliente_mas_frecuente_hoy[1]} viajes)")
     print()
     
     # TEST 5: Algoritmo Senafiris
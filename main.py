@@ -1,14 +1,37 @@
 # app.py
-from flask import Flask, render_template, request, redirect, url_for
-from core.sistema import SistemaCentral
-from core.cliente import Cliente
-import requests
+from flask import Flask, render_template, request, redirect, url_for, jsonify, Response, abort
+from core.despacho import ServicioDespacho, DespachoPerezoso, conectar
+from core.difusion_flota import suscribir
+from core.top_k import CATEGORIAS as CATEGORIAS_DESTACADOS
+import json
 import math
+import os
+import threading
 
 app = Flask(__name__)
 
-# Instancia única del sistema
-sistema = SistemaCentral()
+def crear_despacho():
+    """
+    Instancia única del sistema. Con UNIETAXI_MOTOR=<socket> la web se conecta
+    a un proceso motor compartido (motor.py) en lugar de crear su propia flota,
+    de modo que varios trabajadores WSGI ven el mismo estado.
+    """
+    if os.environ.get("UNIETAXI_MOTOR"):
+        return conectar(os.environ["UNIETAXI_MOTOR"])
+
+    from core.sistema import SistemaCentral
+    from core.libro_servicios import LibroServicios, DIRECTORIO_SERVICIO
+    from core.tarifa_zonal import TarifaZonal
+    # La web de demostración usa la flota demo y 9 clientes simulados (+ tú = 10)
+    sistema = SistemaCentral(taxis_demo=True, clientes_simulados=9,
+                             tarifa_zonal=TarifaZonal() if os.environ.get("UNIETAXI_TARIFA_ZONAL") else None,
+                             libro_servicios=LibroServicios.desde_entorno(DIRECTORIO_SERVICIO))
+    sistema.iniciar()
+    return ServicioDespacho(sistema)
+
+
+# Se crea con la primera petición, no al importar el módulo
+despacho = DespachoPerezoso(crear_despacho)
 
 
 def geocode_address(address: str):
@@ -24,6 +47,7 @@ def geocode_address(address: str):
     headers = {
         "User-Agent": "UnieUber-student-project/1.0 (tu-email@ejemplo.com)"
     }
+    import requests  # diferido: solo se necesita al geocodificar
     try:
         resp = requests.get(url, params=params, headers=headers, timeout=5)
         data = resp.json()
@@ -37,24 +61,6 @@ def geocode_address(address: str):
         return None, None
 
 
-def haversine_km(lat1, lon1, lat2, lon2):
-    """
-    Distancia aproximada en km entre dos puntos lat/lon.
-    """
-    if None in (lat1, lon1, lat2, lon2):
-        return None
-
-    R = 6371.0  # radio de la tierra en km
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lon2 - lon1)
-    dlambda = math.radians(lon2 - lon1)
-
-    a = math.sin(dphi/2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
-
-
 @app.route("/")
 def index():
     return render_template("index.html")
@@ -65,7 +71,9 @@ def solicitar_taxi():
     direccion_origen = direccion_destino = None
     orig_lat = orig_lon = dest_lat = dest_lon = None
     dist_km = precio = None
-    taxi_info = None
+    multiplicador = 1.0
+    modo_tarifa_alta = despacho.modo_tarifa_alta()
+    ticket = None
     cliente_info = None
 
     if request.method == "POST":
@@ -91,64 +99,27 @@ def solicitar_taxi():
             # Si Nominatim no devuelve resultados, usar las coordenadas
             # deterministas del sistema (convertir_direccion_a_coordenadas)
             if orig_lat is None or orig_lon is None:
-                ox, oy = sistema.convertir_direccion_a_coordenadas(direccion_origen)
+                ox, oy = despacho.convertir_direccion(direccion_origen)
                 orig_lat, orig_lon = ox, oy
             if dest_lat is None or dest_lon is None:
-                dx_c, dy_c = sistema.convertir_direccion_a_coordenadas(direccion_destino)
+                dx_c, dy_c = despacho.convertir_direccion(direccion_destino)
                 dest_lat, dest_lon = dx_c, dy_c
 
+            from core.distancias import haversine_km
             dist_km = haversine_km(orig_lat, orig_lon, dest_lat, dest_lon)
             if dist_km is not None:
                 dist_km = round(dist_km, 2)
-                # Usar tarifas dinámicas del sistema de asignación
-                precio = sistema.sistema_asignacion.calcular_tarifa(dist_km)
+                # Mismo cobro que Taxi._calcular_costo: el multiplicador zonal se
+                # toma en el punto del plano donde el hilo Cliente pide el taxi
+                origen_plano = despacho.convertir_direccion(direccion_origen)
+                multiplicador = despacho.multiplicador(origen_plano)
+                precio = despacho.calcular_tarifa(dist_km, modo_tarifa_alta, origen_plano)
 
         # Obtener información del cliente mejorado
-        cliente_mejorado = sistema._obtener_cliente_mejorado(cliente_id)
-        cliente_info = {
-            "id": cliente_mejorado.id_cliente,
-            "nombre": cliente_mejorado.nombre,
-            "frecuencia": cliente_mejorado.frecuencia,
-            "estrellas": cliente_mejorado.estrellas
-        }
-
-        # Lanzamos el hilo Cliente (para la simulación interna)
-        cliente = Cliente(
-            id_cliente=cliente_id,
-            sistema_central=sistema,
-            direccion_origen=direccion_origen,
-            direccion_destino=direccion_destino,
-            dia=sistema.dia_actual
-        )
-        cliente.start()
-        
-        # Esperar un momento para que se procese la solicitud y obtener info del taxi
-        import time
-        time.sleep(0.3)  # Pequeña espera para que se procese la asignación
-        
-        # Buscar el último servicio en servicios_control para obtener info del taxi asignado
-        # También buscar en servicios_seguimiento que se actualiza más rápido
-        servicios_recientes = sistema.servicios_seguimiento[-1:] if sistema.servicios_seguimiento else []
-        if not servicios_recientes and sistema.servicios_control:
-            servicios_recientes = sistema.servicios_control[-1:]
-        
-        for servicio in servicios_recientes:
-            if servicio.get("aceptado") and servicio.get("id_taxi"):
-                taxi_id = servicio["id_taxi"]
-                # Buscar el taxi en la lista
-                for taxi in sistema.taxis:
-                    if taxi.id_taxi == taxi_id:
-                        taxi_info = {
-                            "id": taxi.id_taxi,
-                            "nombre": taxi.nombre,
-                            "placa": taxi.placa,
-                            "calificacion": round(taxi.calificacion_media, 1),
-                            "viajes_hoy": taxi.viajes_hoy,
-                            "motivo": servicio.get("motivo_seleccion", "distancia")
-                        }
-                        break
-                if taxi_info:
-                    break
+        cliente_info = despacho.info_cliente(cliente_id)
+
+        # Lanzamos el hilo Cliente con un ticket: la asignación llega por SSE
+        ticket = lanzar_solicitud(cliente_id, direccion_origen, direccion_destino)
 
     return render_template(
         "solicitar_taxi.html",
@@ -160,32 +131,250 @@ def solicitar_taxi():
         dest_lon=dest_lon,
         dist_km=dist_km,
         precio=precio,
-        taxi_info=taxi_info,
+        ticket=ticket,
         cliente_info=cliente_info,
-        modo_tarifa_alta=sistema.sistema_asignacion.modo_tarifa_alta,
+        modo_tarifa_alta=modo_tarifa_alta,
+        multiplicador=multiplicador,
     )
 
 
+def lanzar_solicitud(cliente_id, direccion_origen=None, direccion_destino=None,
+                     origen=None, destino=None):
+    """Crea un ticket y lanza la solicitud sin esperar a la asignación."""
+    return despacho.solicitar_viaje(cliente_id, direccion_origen, direccion_destino,
+                                    origen, destino)
+
+
+def _coordenadas(valor):
+    """Par [x, y] de dos números finitos (el JSON admite NaN e Infinity)."""
+    if (isinstance(valor, (list, tuple)) and len(valor) == 2
+            and all(isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v)
+                    for v in valor)):
+        return float(valor[0]), float(valor[1])
+    raise ValueError(f"se esperaban dos números finitos: {valor!r}")
+
+
+@app.route("/api/solicitudes", methods=["POST"])
+def api_crear_solicitud():
+    """
+    Envía una solicitud de taxi y devuelve su ticket inmediatamente (202).
+    Cuerpo JSON: cliente_id y origen/destino como [x, y] o como dirección.
+    Un punto que no sea texto ni dos números finitos devuelve 400.
+    """
+    datos = request.get_json(silent=True) or {}
+    extremos = {}
+    # Validar antes de lanzar el hilo: un punto mal formado fallaría dentro de él
+    for campo in ("origen", "destino"):
+        valor = datos.get(campo)
+        if valor is None or isinstance(valor, str):
+            extremos[campo] = (valor, None)
+            continue
+        try:
+            extremos[campo] = (None, _coordenadas(valor))
+        except ValueError as e:
+            return jsonify({"error": f"'{campo}' inválido: {e}"}), 400
+    ticket = lanzar_solicitud(
+        datos.get("cliente_id", "cliente-api"),
+        direccion_origen=extremos["origen"][0],
+        direccion_destino=extremos["destino"][0],
+        origen=extremos["origen"][1],
+        destino=extremos["destino"][1],
+    )
+    return jsonify({
+        "ticket": ticket,
+        "estado_url": url_for("api_estado_solicitud", ticket=ticket),
+        "eventos_url": url_for("api_eventos_solicitud", ticket=ticket),
+    }), 202
+
+
+@app.route("/api/solicitudes/<ticket>")
+def api_estado_solicitud(ticket):
+    """Long-poll: devuelve los eventos desde `desde`, esperando hasta `timeout` s."""
+    desde = request.args.get("desde", 0, type=int)
+    timeout = min(request.args.get("timeout", 25.0, type=float), 60.0)
+    eventos, cerrado = despacho.esperar_eventos(ticket, desde, timeout)
+    if eventos is None:
+        abort(404)
+    return jsonify({"ticket": ticket, "eventos": eventos, "cerrado": cerrado})
+
+
+@app.route("/api/solicitudes/<ticket>/eventos")
+def api_eventos_solicitud(ticket):
+    """Server-Sent Events con los eventos del ticket hasta que se cierra."""
+    if not despacho.existe_ticket(ticket):
+        abort(404)
+    desde = request.headers.get("Last-Event-ID", type=int)
+    desde = 0 if desde is None else desde + 1
+
+    def stream(desde):
+        while True:
+            eventos, cerrado = despacho.esperar_eventos(ticket, desde, 15.0)
+            if eventos is None:
+                return
+            if not eventos and not cerrado:
+                yield ": keep-alive\n\n"
+                continue
+            for evento in eventos:
+                yield (f"id: {evento['seq']}\n"
+                       f"event: {evento['tipo']}\n"
+                       f"data: {json.dumps(evento['datos'])}\n\n")
+                desde = evento["seq"] + 1
+            if cerrado:
+                return
+
+    return Response(stream(desde), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/api/flota/stream")
+def api_flota_stream():
+    """
+    Server-Sent Events con el estado de la flota: un evento 'completo' al
+    conectar y después eventos 'delta' con solo los campos que cambian,
+    agrupados como mucho cada `intervalo` segundos.
+    """
+    intervalo = request.args.get("intervalo", type=float)
+
+    def stream():
+        tick = despacho.tick_flota()
+        for mensaje in suscribir(despacho.esperar_flota, max(intervalo or tick, tick)):
+            if mensaje is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield (f"id: {mensaje['seq']}\n"
+                   f"event: {mensaje['tipo']}\n"
+                   f"data: {json.dumps(mensaje, separators=(',', ':'))}\n\n")
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# Máximo de pares por petición de cotización
+MAX_COTIZACIONES_LOTE = 10000
+
+
+def _punto_cotizacion(valor):
+    """Coordenadas de un extremo de cotización: par [x, y] o dirección (texto)."""
+    if isinstance(valor, str):
+        return despacho.convertir_direccion(valor)
+    return _coordenadas(valor)
+
+
+@app.route("/api/cotizaciones", methods=["POST"])
+def api_cotizaciones():
+    """
+    Cotiza un lote de viajes sin despachar ningún taxi.
+
+    Cuerpo JSON:
+        pares: [{"origen": [x, y] | "dirección", "destino": ...}, ...]
+        coordenadas: "plano" (por defecto) o "latlon"
+        tarifa: "actual" (por defecto), "normal" o "alta"
+
+    "plano" cotiza como cobra el taxi: km en el plano del simulador (las
+    direcciones se convierten con convertir_direccion_a_coordenadas) y con
+    el multiplicador zonal del origen. "latlon" usa km haversine, como la
+    distancia que enseña el formulario web, y sin multiplicador zonal; no
+    es lo que se cobrará por un viaje pedido con esas direcciones.
+    """
+    datos = request.get_json(silent=True) or {}
+    pares = datos.get("pares")
+    if not isinstance(pares, list) or not pares:
+        return jsonify({"error": "'pares' debe ser una lista no vacía"}), 400
+    if len(pares) > MAX_COTIZACIONES_LOTE:
+        return jsonify({"error": f"máximo {MAX_COTIZACIONES_LOTE} pares por petición"}), 413
+
+    modos = {"actual": None, "normal": False, "alta": True}
+    tarifa = datos.get("tarifa", "actual")
+    if tarifa not in modos:
+        return jsonify({"error": "'tarifa' debe ser 'actual', 'normal' o 'alta'"}), 400
+    coordenadas = datos.get("coordenadas", "plano")
+    if coordenadas not in ("plano", "latlon"):
+        return jsonify({"error": "'coordenadas' debe ser 'plano' o 'latlon'"}), 400
+
+    try:
+        if coordenadas == "latlon":
+            # Las direcciones solo se pueden resolver en el plano del simulador
+            origenes = [_coordenadas(p["origen"]) for p in pares]
+            destinos = [_coordenadas(p["destino"]) for p in pares]
+        else:
+            origenes = [_punto_cotizacion(p["origen"]) for p in pares]
+            destinos = [_punto_cotizacion(p["destino"]) for p in pares]
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        return jsonify({"error": f"par inválido: {e}"}), 400
+
+    resultado = despacho.cotizar_lote(origenes, destinos, coordenadas, modos[tarifa])
+    cotizaciones = [{"km": km, "precio": precio}
+                    for km, precio in zip(resultado["km"], resultado["precios"])]
+    if resultado["segundos"] is not None:
+        for cotizacion, seg in zip(cotizaciones, resultado["segundos"]):
+            cotizacion["segundos"] = seg
+
+    return jsonify({
+        "tarifa": resultado["tarifa"],
+        "tarifa_base": resultado["tarifa_base"],
+        "tarifa_km": resultado["tarifa_km"],
+        "total": len(cotizaciones),
+        "cotizaciones": cotizaciones,
+    })
+
+
+@app.route("/metrics")
+def metrics():
+    """Métricas del sistema central en formato de texto de Prometheus."""
+    return Response(despacho.metricas_prometheus(),
+                    mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.route("/api/locks")
+def api_locks():
+    """
+    Contención de los mutex del sistema central. Solo hay datos si el motor
+    arrancó con UNIETAXI_PERFIL_LOCKS=1.
+    """
+    locks = despacho.resumen_locks()
+    return jsonify({"instrumentado": bool(locks), "locks": locks})
+
+
+# Última página de reportes renderizada: (etag, html)
+_reportes_html = (None, None)
+_mutex_reportes_html = threading.Lock()
+
+
 @app.route("/reportes")
 def reportes():
-    diarios, mensuales = sistema.obtener_reportes()
-    # Agregar información del sistema de asignación
-    resumenes_diarios = sistema.sistema_asignacion.resumen_diarios
-    modo_tarifa_alta = sistema.sistema_asignacion.modo_tarifa_alta
-    # Calcular hora virtual para mostrar en reportes
-    from datetime import datetime, timedelta
-    start_time = datetime.now()
-    virtual_speed = 30
-    virtual_elapsed = (datetime.now() - start_time).total_seconds() * virtual_speed
-    virtual_time = start_time + timedelta(seconds=virtual_elapsed)
-    return render_template(
-        "reportes.html", 
-        diarios=diarios, 
-        mensuales=mensuales,
-        resumenes_diarios=resumenes_diarios,
-        modo_tarifa_alta=modo_tarifa_alta,
-        hora_virtual=virtual_time.strftime("%H:%M:%S")
-    )
+    snapshot = despacho.snapshot_reportes()
+    # La hora virtual no entra en la instantánea (cambia sin nueva versión):
+    # se añade a la ETag para que un 304 no sirva una hora vieja
+    hora_virtual = despacho.hora_virtual()
+    etag = f"{snapshot['etag']}-{hora_virtual.replace(':', '')}"
+    if request.if_none_match.contains(etag):
+        respuesta = Response(status=304)
+        respuesta.set_etag(etag)
+        return respuesta
+
+    global _reportes_html
+    with _mutex_reportes_html:
+        # Solo se renderiza una vez por versión y minuto virtual aunque haya muchos visitantes
+        if _reportes_html[0] != etag:
+            html = render_template(
+                "reportes.html",
+                diarios=snapshot["diarios"],
+                mensuales=snapshot["mensuales"],
+                resumenes_diarios=snapshot["resumenes_diarios"],
+                destacados=[
+                    (titulo, snapshot["destacados_hoy"][nombre], snapshot["destacados_ventana"][nombre], unidad)
+                    for nombre, (titulo, unidad) in CATEGORIAS_DESTACADOS.items()
+                ],
+                dias_ventana=snapshot["dias_ventana"],
+                modo_tarifa_alta=snapshot["modo_tarifa_alta"],
+                hora_virtual=hora_virtual
+            )
+            _reportes_html = (etag, html)
+        html = _reportes_html[1]
+
+    respuesta = Response(html, mimetype="text/html", headers={"Cache-Control": "no-cache"})
+    respuesta.set_etag(etag)
+    return respuesta
 
 
 if __name__ == "__main__":
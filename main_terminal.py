@@ -1,4 +1,6 @@
 # main_batch.py
+import argparse
+import random
 import time
 import threading
 import sys
@@ -6,139 +8,110 @@ import os
 from core.sistema import SistemaCentral
 from core.data_loader import DataLoader
 from core.report_generator import ReportGenerator
-from core.taxi import Taxi
-from core.cliente import Cliente
-from core.cliente_mejorado import ClienteMejorado
+from core.dias_paralelos import afiliar_clientes, generar_solicitudes, ejecutar_dias_en_paralelo
 
-def main():
-    print("=== UNIETAXI - Modo Batch (Examen) ===")
-    
+def preparar_lote(**opciones_sistema):
+    """
+    Arranque del modo batch hasta estar listo para simular: archivos de
+    entrada, SistemaCentral y afiliación de clientes.
+
+    Returns:
+        (sistema, datos_taxis, lista_clientes), o None si no hay datos de taxis
+    """
     # 1. Generar/Cargar archivos de entrada
     DataLoader.generar_archivos_ejemplo()
     
     datos_taxis = DataLoader.leer_archivo_taxis("taxis_input.txt")
     if not datos_taxis:
         print("No se pudieron cargar los datos de taxis. Saliendo.")
-        return
+        return None
 
     lista_clientes = DataLoader.leer_archivo_clientes("clientes_input.txt")
     
     # Instanciar Sistema Central
-    # Nota: El sistema central inicia por defecto con algunos taxis demo y clientes simulados.
-    # Para el modo batch, podríamos querer limpiar eso o adaptarlo, pero por ahora lo usaremos así
-    # y añadiremos los taxis del archivo.
-    sistema = SistemaCentral()
-    
-    # Detener el gestor de clientes simulados automático para tener control total
-    sistema.gestor_clientes_simulados.detener_todos()
+    # Sin taxis demo ni clientes simulados: en modo batch solo cuentan los datos
+    # de los archivos de entrada, así que tenemos control total del tráfico.
+    sistema = SistemaCentral(**opciones_sistema)
     
     # Registrar clientes del archivo ("Afiliación")
     print(f"\n[Batch] Afiliando {len(lista_clientes)} clientes del archivo...")
-    for c_data in lista_clientes:
-        # Registrar en el sistema (usamos ClienteMejorado para persistencia)
-        c_mejorado = ClienteMejorado(
-            id_cliente=c_data["cedula"],
-            nombre=f"{c_data['nombre']} {c_data['apellido']}",
-            frecuencia=0
-        )
-        sistema.clientes_mejorados[c_data["cedula"]] = c_mejorado
-        print(f"  - Cliente afiliado: {c_mejorado.nombre} (ID: {c_mejorado.id_cliente})")
+    afiliar_clientes(sistema, lista_clientes)
+    return sistema, datos_taxis, lista_clientes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UNIETAXI - Modo Batch")
+    parser.add_argument("--metricas", metavar="RUTA",
+                        help="Volcar las métricas finales en formato Prometheus ('-' = pantalla)")
+    parser.add_argument("--procesos", type=int, default=1, metavar="N",
+                        help="Simular los días en N procesos en paralelo (1 = secuencial)")
+    parser.add_argument("--semilla", type=int, default=None,
+                        help="Semilla de las solicitudes generadas (se combina con el día)")
+    args = parser.parse_args()
+
+    print("=== UNIETAXI - Modo Batch (Examen) ===")
+    
+    lote = preparar_lote()
+    if lote is None:
+        return
+    sistema, datos_taxis, lista_clientes = lote
 
     # Ejecución por días
     total_dias = datos_taxis["dias"]
     print(f"\n[Batch] Iniciando simulación de {total_dias} días.")
     
-    for dia in range(1, total_dias + 1):
-        print(f"\n--- INICIO DÍA {dia} ---")
-        sistema.dia_actual = dia
+    if args.procesos > 1:
+        # Cada día en su proceso; el estado entre días se arregla al integrarlos
+        ejecutar_dias_en_paralelo(sistema, datos_taxis, lista_clientes, args.procesos,
+                                  filepath_diario="reportes_examen.txt", semilla=args.semilla)
+    else:
+        for dia in range(1, total_dias + 1):
+            print(f"\n--- INICIO DÍA {dia} ---")
+            sistema.dia_actual = dia
+            if args.semilla is not None:
+                random.seed(f"{args.semilla}-{dia}")
         
-        # 2. Registrar/Cargar taxistas del día (Turno)
-        taxis_del_dia_data = datos_taxis["registros_por_dia"].get(dia, [])
-        nuevos_taxis = []
+            # 2. Turno del día: los taxis se resuelven por cédula y se reutilizan
+            # entre días; solo los disponibles entran en la asignación
+            taxis_del_dia_data = datos_taxis["registros_por_dia"].get(dia, [])
+            print(f"[Batch] Registrando {len(taxis_del_dia_data)} taxis para el día {dia}...")
+            turno = sistema.turnos.aplicar_turno(taxis_del_dia_data)
+            print(f"[Batch] De turno: {turno['en_turno']} (nuevos: {turno['nuevos']}, "
+                  f"reutilizados: {turno['reutilizados']}, fuera de turno: {turno['desactivados']})")
         
-        print(f"[Batch] Registrando {len(taxis_del_dia_data)} taxis para el día {dia}...")
-        for t_data in taxis_del_dia_data:
-            # Crear instancia de Taxi
-            # Usamos la cédula como ID para simplificar
-            nuevo_taxi = Taxi(
-                id_taxi=int(t_data["cedula"]),
-                nombre=f"{t_data['nombre']} {t_data['apellido']}",
-                placa=t_data["placa"],
-                velocidad_kph=t_data["velocidad"],
-                sistema_central=sistema
-            )
-            # Añadimos atributos extra requeridos para el reporte mensual
-            nuevo_taxi.marca = t_data["marca"]
-            nuevo_taxi.modelo = t_data["modelo"]
-            nuevo_taxi.disponible = t_data["disponible"]
-            
-            nuevos_taxis.append(nuevo_taxi)
-            nuevo_taxi.start()
-        
-        # Agregamos al sistema (podríamos limpiar los anteriores si fuera rotación estricta)
-        sistema.taxis.extend(nuevos_taxis)
-        
-        # 3. Generar tráfico de clientes (Solicitudes)
-        # Usamos los clientes afiliados para generar solicitudes aleatorias este día
-        num_solicitudes = 5  # Por ejemplo, 5 solicitudes por día
+            # 3. Generar tráfico de clientes (Solicitudes)
+            # Usamos los clientes afiliados para generar solicitudes aleatorias este día
+            num_solicitudes = 5  # Por ejemplo, 5 solicitudes por día
         
-        print(f"[Batch] Generando {num_solicitudes} solicitudes de servicio...")
-        
-        hilos_clientes = []
-        import random
-        
-        for _ in range(num_solicitudes):
-            if not lista_clientes:
-                break
-                
-            c_data = random.choice(lista_clientes)
-            cliente_id = c_data["cedula"]
-            
-            # Crear hilo Cliente para solicitar servicio
-            # Usamos coordenadas aleatorias (0-20 km aprox)
-            origen = (random.uniform(0, 10), random.uniform(0, 10))
-            destino = (random.uniform(0, 10), random.uniform(0, 10))
+            print(f"[Batch] Generando {num_solicitudes} solicitudes de servicio...")
+            generar_solicitudes(sistema, dia, lista_clientes, num_solicitudes)
             
-            cliente_thread = Cliente(
-                id_cliente=cliente_id,
-                sistema_central=sistema,
-                origen=origen,
-                destino=destino,
-                dia=dia
-            )
-            hilos_clientes.append(cliente_thread)
-            cliente_thread.start()
-            
-            # Pequeña pausa entre solicitudes
-            time.sleep(0.5)
-            
-        # Esperar a que se procesen (simulado)
-        # En un sistema real de hilos, esperaríamos a que terminen o usaríamos un tiempo límite
-        print("[Batch] Esperando procesamiento de viajes...")
-        time.sleep(5) 
+            # Esperar a que se procesen (simulado)
+            # En un sistema real de hilos, esperaríamos a que terminen o usaríamos un tiempo límite
+            print("[Batch] Esperando procesamiento de viajes...")
+            time.sleep(5) 
         
-        # for c in hilos_clientes:
-        #     c.join() # Los hilos cliente terminan rápido (al enviar solicitud), lo que tarda es el Taxi
+            # for c in hilos_clientes:
+            #     c.join() # Los hilos cliente terminan rápido (al enviar solicitud), lo que tarda es el Taxi
         
-        # 4. Generar Reporte Diario (Parte I)
-        print(f"[Batch] Generando reporte diario del día {dia}...")
-        ReportGenerator.generar_reporte_diario(
-            dia=dia,
-            ganancia_total=sistema.ganancia_total_diaria,
-            servicios_seguimiento=sistema.servicios_seguimiento,
-            filepath="reportes_examen.txt" # Un solo archivo acumulativo como pide el ejemplo
-        )
+            # 4. Generar Reporte Diario (Parte I)
+            print(f"[Batch] Generando reporte diario del día {dia}...")
+            ReportGenerator.generar_reporte_diario(
+                dia=dia,
+                ganancia_total=sistema.ganancia_total_diaria,
+                servicios_seguimiento=sistema.servicios_seguimiento,
+                filepath="reportes_examen.txt" # Un solo archivo acumulativo como pide el ejemplo
+            )
         
-        # Limpieza fin de día
-        sistema.ganancia_total_diaria = 0.0
-        sistema.servicios_seguimiento = [] # Resetear los 5 de seguimiento
+            # Cierre del día: sella sus servicios y resetea los 5 de seguimiento
+            sistema.cerrar_dia(dia)
         
-        print(f"--- FIN DÍA {dia} ---")
+            print(f"--- FIN DÍA {dia} ---")
 
     # 5. Generar Reporte Mensual (Parte II)
     print("\n[Batch] Generando reporte mensual...")
     ReportGenerator.generar_reporte_mensual(
-        taxis=sistema.taxis,
+        taxis=sistema.turnos.todos(),
         ganancia_por_taxi=sistema.ganancia_por_taxi,
         filepath="reporte_mensual_examen.txt"
     )
@@ -153,8 +126,20 @@ def main():
     print("\n=== EJECUCIÓN FINALIZADA ===")
     print("Revise los archivos generados: reportes_examen.txt, reporte_mensual_examen.txt, control_servicios_examen.txt")
     
+    # Métricas finales (mismo formato que /metrics en la web)
+    if args.metricas == "-":
+        print(sistema.metricas.exportar_prometheus())
+    elif args.metricas:
+        with open(args.metricas, "w", encoding="utf-8") as f:
+            f.write(sistema.metricas.exportar_prometheus())
+        print(f"Métricas guardadas en {args.metricas}")
+    
+    # Contención de locks (solo con UNIETAXI_PERFIL_LOCKS=1; os._exit salta atexit)
+    sistema.imprimir_resumen_locks()
+    
     # Detener monitor de sistema de asignación
     sistema.sistema_asignacion.detener_monitor()
+    sistema.trazador.finalizar()
     
     # Forzar salida (hilos daemon morirán)
     os._exit(0)
@@ -0,0 +1,32 @@
+# motor.py
+"""
+Proceso motor de despacho: un único SistemaCentral (flota, clientes y
+contabilidad) servido por socket Unix a los trabajadores web.
+
+    python motor.py --socket /tmp/unietaxi.sock
+    UNIETAXI_MOTOR=/tmp/unietaxi.sock gunicorn -w 4 main:app
+"""
+import argparse
+import os
+
+from core.sistema import SistemaCentral
+from core.despacho import ServicioDespacho, servir
+from core.libro_servicios import LibroServicios, DIRECTORIO_SERVICIO
+from core.tarifa_zonal import TarifaZonal
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Motor de despacho UNIETAXI")
+    parser.add_argument("--socket", default=os.environ.get("UNIETAXI_MOTOR", "/tmp/unietaxi.sock"),
+                        help="Ruta del socket Unix donde escuchar")
+    args = parser.parse_args()
+
+    sistema = SistemaCentral(taxis_demo=True, clientes_simulados=9,
+                             tarifa_zonal=TarifaZonal() if os.environ.get("UNIETAXI_TARIFA_ZONAL") else None,
+                             libro_servicios=LibroServicios.desde_entorno(DIRECTORIO_SERVICIO))
+    sistema.iniciar()
+    servir(ServicioDespacho(sistema), args.socket)
+
+
+if __name__ == "__main__":
+    main()